@@ -0,0 +1,77 @@
+#! /usr/bin/python
+"""
+bench_checksum.py
+
+Microbenchmarks for APIFrame checksum computation and verification.
+
+Compares the current whole-buffer implementation against the previous
+per-byte Python loop for 8, 72 and 256 byte frames. Run it against
+an installed xbee package, or from the root of the source tree with:
+
+    PYTHONPATH=. python benchmarks/bench_checksum.py
+"""
+import timeit
+
+from xbee.frame import APIFrame
+from xbee.python2to3 import byteToInt, intToByte
+
+SIZES = (8, 72, 256)
+NUMBER = 20000
+
+
+def loop_checksum(data):
+    """
+    Per-byte checksum, as implemented before bulk summing
+    """
+    total = 0
+    for byte in data:
+        total += byteToInt(byte)
+    return intToByte(0xFF - (total & 0xFF))
+
+
+def loop_parse(raw, length):
+    """
+    Slice the payload first, then verify it one byte at a time
+    """
+    data = raw[3:3 + length]
+    total = 0
+    for byte in data:
+        total += byteToInt(byte)
+    total += byteToInt(raw[-1])
+    if total & 0xFF != 0xFF:
+        raise ValueError("Invalid checksum")
+    return data
+
+
+def best_of(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER * 1e6
+
+
+def main():
+    print("{0:>6} {1:>20} {2:>10} {3:>10} {4:>8}".format(
+        "bytes", "operation", "loop (us)", "bulk (us)", "speedup"))
+
+    for size in SIZES:
+        payload = bytes(bytearray(i & 0xFF for i in range(size)))
+        frame = APIFrame(payload)
+        raw = frame.output()
+
+        cases = (
+            ("checksum",
+             lambda: loop_checksum(payload),
+             lambda: frame.checksum()),
+            ("verify+slice",
+             lambda: loop_parse(raw, size),
+             lambda: APIFrame.verified_payload(raw, 3, size)),
+        )
+
+        for name, old, new in cases:
+            assert old() == new()
+            old_us = best_of(old)
+            new_us = best_of(new)
+            print("{0:>6} {1:>20} {2:>10.3f} {3:>10.3f} {4:>7.1f}x".format(
+                size, name, old_us, new_us, old_us / new_us))
+
+
+if __name__ == '__main__':
+    main()
@@ -27,7 +27,7 @@ setup(
         'Programming Language :: Python :: 3',
     ],
     packages=find_packages(exclude=['tests', '*.tests']),
-    install_requires=['pyserial'],
+    install_requires=['pyserial', 'futures; python_version < "3"'],
     extras_require={
         'tornado': ['tornado~=4.5']
     }
@@ -0,0 +1,13 @@
+"""
+XBee package initalization file
+
+info@n.io
+"""
+
+try:
+    from xbee.asyncio.ieee import XBee
+    from xbee.asyncio.zigbee import ZigBee
+    from xbee.asyncio.digimesh import DigiMesh
+    has_asyncio = True
+except (ImportError, SyntaxError):
+    has_asyncio = False
@@ -0,0 +1,256 @@
+"""
+base.py
+
+asyncio XBee superclass module
+
+This class defines data and methods common to all XBee modules.
+This class should be subclassed in order to provide
+series-specific functionality.
+"""
+import asyncio
+from collections import deque
+from xbee.backend.base import XBeeBase as _XBeeBase
+from xbee.backend.base import TimeoutException as _TimeoutException
+
+
+class XBeeBase(_XBeeBase, asyncio.Protocol):
+    """
+    Abstract base class providing command generation and response
+    parsing methods for XBee modules.
+
+    Instances are asyncio protocols: connect one to a serial port or
+    socket with a protocol factory which returns it, for example
+
+        xbee = ZigBee()
+        await serial_asyncio.create_serial_connection(
+            loop, lambda: xbee, '/dev/ttyUSB0', baudrate=9600)
+
+    (using the pyserial-asyncio package), or
+    loop.create_connection(lambda: xbee, sock=sock). Every frame is
+    decoded as soon as its data is received, so responses awaited with
+    send() are resolved whether or not frames are being read.
+
+    Constructor arguments:
+        transport: the transport to use, if already connected; otherwise
+                   it is given to connection_made() when connected.
+
+        shorthand: boolean flag which determines whether shorthand command
+                   calls (i.e. xbee.at(...) instead of xbee.send("at",...)
+                   are allowed.
+
+        callback: function which should be called with frame data
+                  whenever a frame arrives. If it returns a coroutine,
+                  the coroutine is run as a task. When a callback is
+                  given, frames are not queued for wait_read_frame().
+
+        escaped: boolean flag which determines whether the library should
+                 operate in escaped mode. In this mode, certain data bytes
+                 in the output and input streams will be escaped and unescaped
+                 in accordance with the XBee API. This setting must match
+                 the appropriate api_mode setting of an XBee device; see your
+                 XBee device's documentation for more information.
+
+        error_callback: function which should be called with an Exception
+                 whenever an exception is raised while parsing a frame.
+                 This will only take affect if the callback argument is
+                 also used.
+
+        zero_copy, response_format, columnar_samples: see
+                 xbee.backend.base.XBeeBase.
+
+        queue_size, queue_policy, shed_types: bound the queue of frames
+                 received but not yet read with wait_read_frame(); see
+                 xbee.backend.base.XBeeBase. Under the 'block' policy,
+                 the transport is paused while the queue is full.
+
+        loop: the event loop to use; by default, the current event loop
+              at the time it is first needed.
+    """
+
+    def __init__(self, transport=None, *args, **kwargs):
+        self._loop = kwargs.pop('loop', None)
+
+        super(XBeeBase, self).__init__(transport, *args, **kwargs)
+
+        # Received responses (or the exceptions raised parsing them) not
+        # yet returned by wait_read_frame() are kept in receive_queue;
+        # these are the futures of calls to wait_read_frame() waiting
+        # for one
+        self._waiters = deque()
+
+        self._closed = False
+        self._paused = False
+        self._writable = None
+
+    def _get_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    def connection_made(self, transport):
+        self.serial = transport
+        self._closed = False
+
+    def connection_lost(self, exc):
+        self._closed = True
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(ConnectionError("Connection lost"))
+
+        self._fail_pending(ConnectionError("Connection lost"))
+
+        if self._writable is not None and not self._writable.done():
+            self._writable.set_result(None)
+        self._writable = None
+
+    def pause_writing(self):
+        if self._writable is None:
+            self._writable = self._create_future()
+
+    def resume_writing(self):
+        if self._writable is not None and not self._writable.done():
+            self._writable.set_result(None)
+        self._writable = None
+
+    def data_received(self, data):
+        """
+        data_received: binary data -> None
+
+        Decodes every frame completed by the given data, and passes the
+        response parsed from each to the callback or, without one, to
+        wait_read_frame()
+        """
+        for frame in self._decoder.feed(data):
+            try:
+                info = self._read_response(frame.data)
+            except Exception as e:
+                if self._callback:
+                    if self._error_callback:
+                        self._error_callback(e)
+                else:
+                    self._deliver(e)
+                continue
+
+            if self._callback:
+                self._call_back(info)
+            else:
+                self._deliver(info)
+
+        if self.receive_queue.policy == 'block' and \
+                self.receive_queue.full() and not self._paused:
+            # Leave further data with the transport until frames are read
+            self._paused = True
+            self.serial.pause_reading()
+
+    def _call_back(self, info):
+        try:
+            result = self._callback(info)
+            if asyncio.iscoroutine(result):
+                self._get_loop().create_task(result)
+        except Exception as e:
+            if self._error_callback:
+                self._error_callback(e)
+
+    def _deliver(self, item):
+        """
+        _deliver: response or Exception -> None
+
+        Hands a received response to the longest waiting call to
+        wait_read_frame(), or queues it if none is waiting
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(item)
+                return
+
+        name = None if isinstance(item, Exception) else item['id']
+        self.receive_queue.put(item, name, wait=False)
+
+    def halt(self):
+        """
+        halt: None -> None
+
+        Closes the transport; once it is closed, requests still awaiting
+        a response fail with a ConnectionError
+        """
+        if self.serial is not None:
+            self.serial.close()
+
+    async def wait_read_frame(self, timeout=None):
+        """
+        wait_read_frame: float -> frame info dictionary
+
+        Waits until a frame arrives, or for at most timeout seconds (if
+        not None), and returns the parsed response. Raises a
+        TimeoutException if no frame arrives in time, and
+        ConnectionError once the connection has been lost and every
+        received frame has been read.
+        """
+        item = self.receive_queue.take()
+        if item is not None:
+            if self._paused and not self.receive_queue.full():
+                self._paused = False
+                self.serial.resume_reading()
+        elif self._closed:
+            raise ConnectionError("Connection lost")
+        else:
+            waiter = self._create_future()
+            self._waiters.append(waiter)
+            try:
+                item = await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                raise _TimeoutException()
+            finally:
+                # A frame received since the waiter was cancelled will
+                # have removed it already
+                if waiter.cancelled() and waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.wait_read_frame()
+        except ConnectionError:
+            raise StopAsyncIteration
+
+    def send(self, cmd, await_response=False, response_timeout=None,
+             **kwargs):
+        """
+        send: string param=binary data ... -> future
+
+        Writes a command as XBeeBase.send() does, and returns a future
+        to await. With await_response, it is resolved with the response
+        to the command; otherwise, it is resolved once the transport is
+        ready for more data to be written.
+        """
+        future = super(XBeeBase, self).send(
+            cmd, await_response=await_response,
+            response_timeout=response_timeout, **kwargs)
+
+        if await_response:
+            return future
+
+        if self._writable is not None:
+            return self._writable
+
+        future = self._create_future()
+        future.set_result(None)
+        return future
+
+    def _create_future(self):
+        return self._get_loop().create_future()
+
+    def _call_later(self, delay, callback):
+        return self._get_loop().call_later(delay, callback)
+
+    def _cancel_call(self, handle):
+        handle.cancel()
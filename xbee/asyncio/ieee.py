@@ -0,0 +1,6 @@
+from xbee.asyncio.base import XBeeBase
+import xbee.backend as _xbee
+
+
+class XBee(_xbee.XBee, XBeeBase):
+    pass
@@ -0,0 +1,226 @@
+"""
+test_base.py
+
+Tests the asyncio XBeeBase superclass module.
+"""
+import socket
+import unittest
+
+from xbee.asyncio import has_asyncio
+
+if not has_asyncio:
+    raise unittest.SkipTest("Requires asyncio")
+
+import asyncio  # noqa
+from xbee.asyncio import ZigBee  # noqa
+from xbee.backend.base import TimeoutException  # noqa
+from xbee.frame import APIFrame  # noqa
+
+AT_RESPONSE = b'\x88\x01MY\x00\x12\x34'
+RX = b'\x90\x00\x13\xa2\x00@oG\xe4\x12\x34\x01hello'
+
+
+class AsyncioTestCase(unittest.TestCase):
+    """
+    Connects a ZigBee instance to one end of a socket pair, the other
+    end of which stands in for the device
+    """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.device, self.sock = socket.socketpair()
+        self.device.setblocking(False)
+        self.xbee = None
+
+    def tearDown(self):
+        if self.xbee is not None:
+            self.xbee.halt()
+            self.loop.run_until_complete(asyncio.sleep(0))
+        self.device.close()
+        self.sock.close()
+        self.loop.close()
+
+    def connect(self, **kwargs):
+        xbee = ZigBee(loop=self.loop, **kwargs)
+        self.loop.run_until_complete(self.loop.create_connection(
+            lambda: xbee, sock=self.sock))
+        self.xbee = xbee
+        return xbee
+
+    def respond(self, *frames):
+        self.device.send(b''.join(APIFrame(data).output() for data in frames))
+
+    def received(self):
+        return self.loop.run_until_complete(
+            self.loop.sock_recv(self.device, 1024))
+
+
+class TestReadFrames(AsyncioTestCase):
+    """
+    Frames received on the transport must be returned by
+    wait_read_frame() in order
+    """
+
+    def test_wait_read_frame(self):
+        xbee = self.connect()
+        self.respond(RX, AT_RESPONSE)
+
+        frame = self.loop.run_until_complete(xbee.wait_read_frame())
+        self.assertEqual(frame['id'], 'rx')
+        self.assertEqual(frame['rf_data'], b'hello')
+
+        frame = self.loop.run_until_complete(xbee.wait_read_frame())
+        self.assertEqual(frame['id'], 'at_response')
+
+    def test_split_frame(self):
+        """
+        A frame split across reads should be returned once complete
+        """
+        xbee = self.connect()
+        data = APIFrame(RX).output()
+        waiting = self.loop.create_task(xbee.wait_read_frame())
+
+        self.device.send(data[:5])
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(waiting.done())
+
+        self.device.send(data[5:])
+        frame = self.loop.run_until_complete(waiting)
+        self.assertEqual(frame['rf_data'], b'hello')
+
+    def test_timeout(self):
+        xbee = self.connect()
+
+        self.assertRaises(TimeoutException, self.loop.run_until_complete,
+                          xbee.wait_read_frame(timeout=0.01))
+        self.assertEqual(len(xbee._waiters), 0)
+
+    def test_frame_after_timeout(self):
+        """
+        A frame received after a waiter times out, but before its call
+        returns, should be queued and the call still time out
+        """
+        xbee = self.connect()
+        create_future = xbee._create_future
+
+        def create_waiter():
+            waiter = create_future()
+            waiter.add_done_callback(
+                lambda waiter: waiter.cancelled() and
+                xbee.data_received(APIFrame(RX).output()))
+            return waiter
+
+        xbee._create_future = create_waiter
+        self.assertRaises(TimeoutException, self.loop.run_until_complete,
+                          xbee.wait_read_frame(timeout=0.01))
+        del xbee._create_future
+
+        frame = self.loop.run_until_complete(xbee.wait_read_frame())
+        self.assertEqual(frame['id'], 'rx')
+
+    def test_iterate(self):
+        """
+        Iterating asynchronously should yield frames until the
+        connection is lost
+        """
+        xbee = self.connect()
+        self.respond(RX)
+
+        frame = self.loop.run_until_complete(xbee.__anext__())
+        self.assertEqual(frame['id'], 'rx')
+
+        waiting = self.loop.create_task(xbee.__anext__())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.device.close()
+        self.assertRaises(StopAsyncIteration, self.loop.run_until_complete,
+                          waiting)
+
+    def test_callback(self):
+        """
+        With a callback, each frame should be given to it instead
+        """
+        frames = []
+        xbee = self.connect(callback=frames.append)
+        self.respond(RX, AT_RESPONSE)
+
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual([frame['id'] for frame in frames],
+                         ['rx', 'at_response'])
+        self.assertEqual(len(xbee.receive_queue), 0)
+
+    def test_full_queue_pauses_reading(self):
+        """
+        Under the 'block' policy, the transport should be paused while
+        the receive queue is full
+        """
+        xbee = self.connect(queue_size=1)
+        self.respond(RX)
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(xbee.serial.is_reading())
+
+        self.respond(AT_RESPONSE)
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(len(xbee.receive_queue), 1)
+
+        frame = self.loop.run_until_complete(xbee.wait_read_frame())
+        self.assertEqual(frame['id'], 'rx')
+
+        # Reading resumes once a frame is taken
+        frame = self.loop.run_until_complete(xbee.wait_read_frame())
+        self.assertEqual(frame['id'], 'at_response')
+
+
+class TestSend(AsyncioTestCase):
+    """
+    Commands must be written to the transport, and their responses
+    resolve the futures of awaited commands
+    """
+
+    def test_send(self):
+        xbee = self.connect()
+
+        self.loop.run_until_complete(xbee.at(frame_id=b'\x01', command=b'MY'))
+        self.assertEqual(self.received(),
+                         APIFrame(b'\x08\x01MY').output())
+
+    def test_await_response(self):
+        xbee = self.connect()
+
+        future = xbee.send('at', await_response=True, command=b'MY')
+        self.assertEqual(self.received(),
+                         APIFrame(b'\x08\x01MY').output())
+
+        self.respond(AT_RESPONSE)
+        response = self.loop.run_until_complete(future)
+        self.assertEqual(response['parameter'], b'\x12\x34')
+
+        # The response is also returned by wait_read_frame
+        frame = self.loop.run_until_complete(xbee.wait_read_frame())
+        self.assertEqual(frame['id'], 'at_response')
+
+    def test_await_response_timeout(self):
+        xbee = self.connect()
+
+        future = xbee.send('at', await_response=True, response_timeout=0.01,
+                           command=b'MY')
+        self.assertRaises(TimeoutException, self.loop.run_until_complete,
+                          future)
+        self.assertEqual(len(xbee._pending), 0)
+
+    def test_connection_lost(self):
+        """
+        Requests awaiting a response should fail once the connection is
+        lost
+        """
+        xbee = self.connect()
+
+        future = xbee.send('at', await_response=True, response_timeout=5,
+                           command=b'MY')
+        self.device.close()
+        self.assertRaises(ConnectionError, self.loop.run_until_complete,
+                          future)
+        self.assertEqual(len(xbee._pending), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
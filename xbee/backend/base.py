@@ -11,8 +11,17 @@ This class defines data and methods common to all XBee modules.
 This class should be subclassed in order to provide
 series-specific functionality.
 """
-from xbee.frame import APIFrame
-from xbee.python2to3 import byteToInt, stringToBytes
+import array
+import struct
+import threading
+from xbee.frame import APIFrame, FrameDecoder
+from xbee.backend.codec import compiled, compile_command, \
+    compile_record, compile_response, compile_spans
+from xbee.backend.response import LazyResponse
+from xbee.backend.correlation import PendingRequests, RESPONSE_TYPES, \
+    FrameIdExhaustedException
+from xbee.backend.receive import ReceiveQueue
+from xbee.python2to3 import byteToInt, intToByte
 
 
 class CommandFrameException(KeyError):
@@ -22,6 +31,65 @@ class TimeoutException(Exception):
     pass
 
 
+class HaltedException(Exception):
+    pass
+
+
+RESPONSE_FORMATS = ('dict', 'lazy', 'record')
+
+
+# (dio channels, aio channels) -> sample layout; see _sample_layout()
+_sample_layouts = {}
+
+# (XBee class, channel mask bytes) -> (header size, sample layout); see
+# XBeeBase._samples_layout(). Mask bytes may carry unused bits, so any
+# number of them could be seen; the cache is emptied once it holds
+# _SAMPLES_LAYOUTS_SIZE layouts.
+_samples_layouts = {}
+_SAMPLES_LAYOUTS_SIZE = 1024
+
+# XBee class -> size of its IO data header, as returned by
+# _parse_samples_header
+_samples_header_sizes = {}
+
+
+def _mask_bytes(io_bytes, header_size):
+    """
+    _mask_bytes: binary data in XBee IO data format, int -> bytes
+
+    Returns the channel mask bytes of an IO data header of the given
+    size, which follow the sample count
+    """
+    masks = io_bytes[1:header_size]
+    if isinstance(masks, memoryview):
+        masks = masks.tobytes()
+    return masks
+
+
+def _sample_layout(dio_chans, aio_chans):
+    """
+    _sample_layout: (int ...), (int ...) ->
+                    (((str, int) ...), (str ...), int, {int: function})
+
+    Returns the (key, bit) pairs of the enabled digital channels, the
+    keys of the enabled analog channels, the number of 16-bit words in
+    each sample and a cache of unpackers by total word count. Layouts
+    are computed once for each combination of enabled channels.
+    """
+    try:
+        return _sample_layouts[(dio_chans, aio_chans)]
+    except KeyError:
+        pass
+
+    dio_bits = tuple(('dio-{0}'.format(i), 1 << i) for i in dio_chans)
+    aio_keys = tuple('adc-{0}'.format(i) for i in aio_chans)
+    stride = len(aio_keys) + (1 if dio_bits else 0)
+
+    layout = (dio_bits, aio_keys, stride, {})
+    _sample_layouts[(dio_chans, aio_chans)] = layout
+    return layout
+
+
 class XBeeBase(object):
     """
     Abstract base class providing command generation and response
@@ -48,15 +116,76 @@ class XBeeBase(object):
                  whenever an exception is raised while waiting for data from
                  the serial port. This will only take affect if the callback
                  argument is also used.
+
+        zero_copy: boolean flag which determines whether the variable-length
+                 field of a received frame (such as 'rf_data' or 'samples')
+                 is returned as a memoryview into the receive buffer instead
+                 of a copy. Call bytes() or tobytes() on the field to obtain
+                 a copy which outlives the buffer.
+
+        response_format: how received frames are returned. 'dict' (the
+                 default) returns a dictionary of binary data. 'lazy'
+                 returns a read-only mapping with the same contents whose
+                 fields are only decoded when first accessed (see
+                 xbee.backend.response.LazyResponse). 'record' returns a
+                 compact record object per frame whose fixed fields are
+                 attributes, with integers for addresses, frame ids and
+                 status codes (see xbee.backend.response.ResponseRecord).
+
+        columnar_samples: boolean flag which determines whether IO sample
+                 data is returned as a dictionary of one array of values
+                 per channel instead of a list of one dictionary per
+                 sample (see _parse_samples).
+
+        queue_size: the most received frames held while waiting to be
+                 handled (0, the default, for no limit). Frames which
+                 arrive while the queue is full are handled according
+                 to queue_policy.
+
+        queue_policy: 'block' (the default) to stop reading from the
+                 serial port until there is room, 'drop_oldest' or
+                 'drop_newest' to drop a frame, or 'shed' to drop frames
+                 of the types named in shed_types first (see
+                 xbee.backend.receive). Dropped frames are counted by
+                 receive_queue.dropped and receive_queue.dropped_types.
+
+        shed_types: the names of the frame types the 'shed' policy may
+                 drop, such as ('rx_io_data_long_addr',).
     """
 
+    # Seconds for which the frame id of a command sent without
+    # await_response is kept from awaited requests, unless its response
+    # arrives first (see send)
+    held_response_timeout = 10
+
     def __init__(self, ser, shorthand=True, callback=None,
-                 escaped=False, error_callback=None):
+                 escaped=False, error_callback=None, zero_copy=False,
+                 response_format='dict', columnar_samples=False,
+                 queue_size=0, queue_policy='block', shed_types=()):
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError("Unknown response format '{}'; expected one "
+                             "of {}".format(response_format,
+                                            ', '.join(RESPONSE_FORMATS)))
+
         self.serial = ser
         self.shorthand = shorthand
         self._callback = None
         self._escaped = escaped
         self._error_callback = error_callback
+        self._zero_copy = zero_copy
+        self._response_format = response_format
+        self._columnar_samples = columnar_samples
+
+        # Incoming bytes are decoded into frames here by the backends
+        self._decoder = FrameDecoder(escaped, zero_copy=zero_copy)
+
+        # Requests sent with await_response, by frame id
+        self._pending = PendingRequests()
+
+        # Received frames waiting to be handled; how each backend fills
+        # and drains it is described by its documentation
+        self.receive_queue = ReceiveQueue(queue_size, queue_policy,
+                                          shed_types)
 
         if callback:
             self._callback = callback
@@ -81,6 +210,20 @@ class XBeeBase(object):
         frame = APIFrame(data, self._escaped).output()
         self.serial.write(frame)
 
+    def _read_available(self):
+        """
+        _read_available: None -> binary data
+
+        Reads every byte currently waiting on the serial port, or a
+        single byte if none are reported, with one call to read()
+        """
+        try:
+            waiting = self.serial.in_waiting
+        except AttributeError:
+            waiting = self.serial.inWaiting()
+
+        return self.serial.read(max(waiting, 1))
+
     def _build_command(self, cmd, **kwargs):
         """
         _build_command: string (binary data) ... -> binary data
@@ -91,7 +234,8 @@ class XBeeBase(object):
         value or a length of 'None'.
 
         Each field will be written out in the order they are defined
-        in the command definition.
+        in the command definition. Each specification is compiled into
+        an encoder the first time it is used (see xbee.backend.codec).
         """
         try:
             cmd_spec = self.api_commands[cmd]
@@ -100,49 +244,7 @@ class XBeeBase(object):
                                       "found; use a derived class which defines"
                                       " 'api_commands'.")
 
-        packet = b''
-
-        for field in cmd_spec:
-            try:
-                # Read this field's name from the function arguments dict
-                data = kwargs[field['name']]
-                if isinstance(data, str):
-                    data = stringToBytes(data)
-
-            except KeyError:
-                # Data wasn't given
-                # Only a problem if the field has a specific length
-                if field['len'] is not None:
-                    # Was a default value specified?
-                    default_value = field['default']
-                    if default_value:
-                        # If so, use it
-                        data = default_value
-                    else:
-                        # Otherwise, fail
-                        raise KeyError(
-                            "The expected field {} of length {} "
-                            "was not provided".format(
-                                field['name'], field['len']
-                            )
-                        )
-                else:
-                    # No specific length, ignore it
-                    data = None
-
-            # Ensure that the proper number of elements will be written
-            if field['len'] and len(data) != field['len']:
-                raise ValueError(
-                    "The data provided for '{}' was not {} "
-                    "bytes long".format(field['name'], field['len'])
-                )
-
-            # Add the data to the packet, if it has been specified.
-            # Otherwise, the parameter was of variable length, and not given.
-            if data:
-                packet += data
-
-        return packet
+        return compiled(cmd_spec, compile_command)(kwargs)
 
     def _split_response(self, data):
         """
@@ -153,11 +255,24 @@ class XBeeBase(object):
         _split_response takes a data packet received from an XBee device
         and converts it into a dictionary. This dictionary provides
         names for each segment of binary data as specified in the
-        api_responses spec.
+        api_responses spec. Each response specification is compiled into
+        a decoder the first time it is used (see xbee.backend.codec).
+
+        If this instance was created with response_format='lazy' or
+        'record', a LazyResponse or a ResponseRecord is returned instead.
+
+        In zero-copy mode, or when given a memoryview, the variable-length
+        field of the response is a view into the given data; all other
+        fields are bytes.
         """
+        if self._zero_copy and not isinstance(data, memoryview):
+            data = memoryview(data)
+
         # Fetch the first byte, identify the packet
         # If the spec doesn't exist, raise exception
         packet_id = data[0:1]
+        if isinstance(packet_id, memoryview):
+            packet_id = packet_id.tobytes()
         try:
             packet = self.api_responses[packet_id]
         except AttributeError:
@@ -167,7 +282,7 @@ class XBeeBase(object):
         except KeyError:
             # Check to see if this ID can be found among transmittable packets
             for cmd_name, cmd in list(self.api_commands.items()):
-                if cmd[0]['default'] == data[0:1]:
+                if cmd[0]['default'] == packet_id:
                     raise CommandFrameException("Incoming frame with id {} "
                                                 "looks like a command frame of "
                                                 "type '{}' (these should not be"
@@ -180,68 +295,14 @@ class XBeeBase(object):
             raise KeyError(
                 "Unrecognized response packet with id byte {0}".format(data[0]))
 
-        # Current byte index in the data stream
-        index = 1
-
-        # Result info
-        info = {'id': packet['name']}
-        packet_spec = packet['structure']
-
-        # Parse the packet in the order specified
-        for field in packet_spec:
-            if field['len'] == 'null_terminated':
-                field_data = b''
-
-                while data[index:index+1] != b'\x00':
-                    field_data += data[index:index+1]
-                    index += 1
-
-                index += 1
-                info[field['name']] = field_data
-            elif field['len'] is not None:
-                # Store the number of bytes specified
-
-                # Are we trying to read beyond the last data element?
-                expected_len = index + field['len']
-                if expected_len > len(data):
-                    raise ValueError("Response packet was shorter than "
-                                     "expected; expected: {}, got: {} "
-                                     "bytes".format(expected_len, len(data))
-                                     )
-
-                field_data = data[index:index + field['len']]
-                info[field['name']] = field_data
-
-                index += field['len']
-            # If the data field has no length specified, store any
-            #  leftover bytes and quit
-            else:
-                field_data = data[index:]
-
-                # Were there any remaining bytes?
-                if field_data:
-                    # If so, store them
-                    info[field['name']] = field_data
-                    index += len(field_data)
-                break
-
-        # If there are more bytes than expected, raise an exception
-        if index < len(data):
-            raise ValueError("Response packet was longer than expected; "
-                             "expected: {}, got: {} bytes".format(
-                                 index, len(data))
-                             )
-
-        # Apply parsing rules if any exist
-        if 'parsing' in packet:
-            for parse_rule in packet['parsing']:
-                # Only apply a rule if it is relevant (raw data is available)
-                if parse_rule[0] in info:
-                    # Apply the parse function to the indicated field and
-                    # replace the raw data with the result
-                    info[parse_rule[0]] = parse_rule[1](self, info)
+        if self._response_format == 'lazy':
+            spans = compiled(packet, compile_spans)(data)
+            return LazyResponse(self, packet, data, spans)
 
-        return info
+        if self._response_format == 'record':
+            return compiled(packet, compile_record)(self, data)
+
+        return compiled(packet, compile_response)(self, data)
 
     def _parse_samples_header(self, io_bytes):
         """
@@ -283,6 +344,39 @@ class XBeeBase(object):
 
         return (sample_count, dio_chans, aio_chans, dio_mask, header_size)
 
+    def _samples_layout(self, io_bytes):
+        """
+        _samples_layout: binary data in XBee IO data format ->
+                         (int, sample layout)
+
+        Returns the size of the IO data header and the layout of the
+        samples which follow it (see _sample_layout). Both only depend
+        on the channel masks in the header, so they are computed with
+        _parse_samples_header once per class and combination of masks
+        and then looked up in a dictionary. The size of the header is
+        the one _parse_samples_header last returned for the class.
+        """
+        cls = self.__class__
+        header_size = _samples_header_sizes.get(cls)
+        if header_size is not None:
+            try:
+                return _samples_layouts[
+                    (cls, _mask_bytes(io_bytes, header_size))]
+            except KeyError:
+                pass
+
+        _, dio_chans, aio_chans, _, header_size = \
+            self._parse_samples_header(io_bytes)
+        _samples_header_sizes[cls] = header_size
+
+        result = (header_size,
+                  _sample_layout(tuple(dio_chans), tuple(aio_chans)))
+        if len(_samples_layouts) >= _SAMPLES_LAYOUTS_SIZE:
+            _samples_layouts.clear()
+        key = (cls, _mask_bytes(io_bytes, header_size))
+        _samples_layouts[key] = result
+        return result
+
     def _parse_samples(self, io_bytes):
         """
         _parse_samples: binary data in XBee IO data format ->
@@ -293,41 +387,202 @@ class XBeeBase(object):
         _parse_samples reads binary data from an XBee device in the IO
         data format specified by the API. It will then return a
         dictionary indicating the status of each enabled IO port.
+
+        All samples are unpacked with a single struct call, and the key
+        of each channel is taken from a table shared by every frame with
+        the same channels enabled (see _samples_layout).
+
+        If this instance was created with columnar_samples=True, a
+        single dictionary is returned instead, mapping the key of each
+        enabled channel to an array of its values in chronological
+        order: array('B') of 0 or 1 for digital channels, array('H')
+        for analog channels.
         """
 
-        sample_count, dio_chans, aio_chans, dio_mask, header_size = \
-            self._parse_samples_header(io_bytes)
+        # number of samples is the first byte
+        sample_count = byteToInt(io_bytes[0])
+        header_size, layout = self._samples_layout(io_bytes)
+        dio_bits, aio_keys, stride, unpackers = layout
 
-        samples = []
+        # one 16-bit word per analog channel, plus one for digital data
+        count = sample_count * stride
+        try:
+            unpack_from = unpackers[count]
+        except KeyError:
+            unpack_from = unpackers[count] = \
+                struct.Struct('>{0}H'.format(count)).unpack_from
 
-        # split the sample data into a list, so it can be pop()'d
-        sample_bytes = [byteToInt(c) for c in io_bytes[header_size:]]
+        try:
+            words = unpack_from(io_bytes, header_size)
+        except struct.error:
+            raise ValueError("IO sample data was shorter than expected; "
+                             "expected: {}, got: {} bytes".format(
+                                 header_size + 2 * count, len(io_bytes)))
+
+        analog_start = 1 if dio_bits else 0
+
+        if self._columnar_samples:
+            columns = {}
+            if dio_bits:
+                digital = words[0::stride]
+                for key, bit in dio_bits:
+                    columns[key] = array.array(
+                        'B', [1 if value & bit else 0 for value in digital])
+            for offset, key in enumerate(aio_keys, analog_start):
+                columns[key] = array.array('H', words[offset::stride])
+            return columns
+
+        if not stride:
+            # No channels are enabled, so each sample is empty
+            return [{} for i in range(sample_count)]
+
+        samples = []
 
         # repeat for every sample provided
-        for sample_ind in range(0, sample_count):
+        for start in range(0, count, stride):
             tmp_samples = {}
 
-            if dio_chans:
+            if dio_bits:
                 # we have digital data
-                digital_data_set = (sample_bytes.pop(0) << 8 |
-                                    sample_bytes.pop(0))
-                digital_values = dio_mask & digital_data_set
-
-                for i in dio_chans:
-                    tmp_samples['dio-{0}'.format(i)] = True \
-                        if (digital_values >> i) & 1 else False
+                digital_values = words[start]
+                for key, bit in dio_bits:
+                    tmp_samples[key] = bool(digital_values & bit)
 
-            for i in aio_chans:
-                analog_sample = (sample_bytes.pop(0) << 8 | sample_bytes.pop(0))
-                tmp_samples['adc-{0}'.format(i)] = analog_sample
+            tmp_samples.update(
+                zip(aio_keys, words[start + analog_start:start + stride]))
 
             samples.append(tmp_samples)
 
         return samples
 
-    def send(self, cmd, **kwargs):
+    def _read_response(self, data):
+        """
+        _read_response: binary data -> response
+
+        Splits a frame received from the device (see _split_response)
+        and, if it answers a request sent with await_response, resolves
+        that request's future with the result. The response is returned
+        either way, so that it is also delivered as usual.
         """
-        send: string param=binary data ... -> None
+        info = self._split_response(data)
+        self._pending.resolve(info)
+        return info
+
+    def create_future(self):
+        """
+        create_future: None -> future
+
+        Returns a new, unresolved future of the kind this backend returns
+        from send(await_response=True), for helpers built on top of it
+        """
+        return self._create_future()
+
+    def call_later(self, delay, callback):
+        """
+        call_later: float, function -> handle
+
+        Arranges for the given function to be called with no arguments
+        after the given number of seconds, on the thread or event loop
+        which handles received frames. Returns a handle which can be
+        given to cancel_call().
+        """
+        return self._call_later(delay, callback)
+
+    def cancel_call(self, handle):
+        """
+        cancel_call: handle -> None
+
+        Cancels a call arranged by call_later(), if it has not happened
+        """
+        self._cancel_call(handle)
+
+    def _create_future(self):
+        """
+        _create_future: None -> future
+
+        Returns a new, unresolved future of the kind used by this backend
+        """
+        raise NotImplementedError("This backend does not support "
+                                  "await_response.")
+
+    def _call_later(self, delay, callback):
+        """
+        _call_later: float, function -> handle
+
+        Arranges for the given function to be called with no arguments
+        after the given number of seconds, and returns a handle which
+        can be given to _cancel_call
+        """
+        raise NotImplementedError("This backend does not support timers.")
+
+    def _cancel_call(self, handle):
+        """
+        _cancel_call: handle -> None
+
+        Cancels a call arranged by _call_later, if it has not happened
+        """
+        raise NotImplementedError("This backend does not support timers.")
+
+    def _send_request(self, cmd, timeout, kwargs):
+        """
+        _send_request: string, float, {string: binary data} -> future
+
+        Sends a command with a frame id which is awaiting no other
+        response and returns a future resolved with the response which
+        carries the same frame id and is of the type which answers the
+        command (see RESPONSE_TYPES). If the given timeout (in seconds) is
+        not None and passes first, the future fails with a
+        TimeoutException and the frame id is released.
+        """
+        fields = [field['name'] for field in self.api_commands[cmd]]
+        if 'frame_id' not in fields:
+            raise ValueError("Command '{}' has no frame_id field, so no "
+                             "response can be awaited".format(cmd))
+
+        future = self._create_future()
+        response_type = RESPONSE_TYPES.get(cmd)
+
+        if kwargs.get('frame_id') is None:
+            frame_id = self._pending.allocate(future, response_type)
+            kwargs['frame_id'] = intToByte(frame_id)
+            try:
+                data = self._build_command(cmd, **kwargs)
+            except Exception:
+                self._pending.pop(frame_id, future)
+                raise
+        else:
+            data = self._build_command(cmd, **kwargs)
+            frame_id = byteToInt(kwargs['frame_id'][0])
+            self._pending.add(frame_id, future, response_type)
+
+        def expire():
+            if self._pending.pop(frame_id, future) is not None and \
+                    not future.done():
+                future.set_exception(TimeoutException())
+
+        handle = None
+        if timeout is not None:
+            handle = self._call_later(timeout, expire)
+
+        def release(done):
+            self._pending.pop(frame_id, done)
+            if handle is not None:
+                self._cancel_call(handle)
+
+        future.add_done_callback(release)
+
+        try:
+            self._write(data)
+        except Exception:
+            release(future)
+            raise
+
+        return future
+
+    def send(self, cmd, await_response=False, response_timeout=None,
+             **kwargs):
+        """
+        send: string param=binary data ... -> None or future
 
         When send is called with the proper arguments, an API command
         will be written to the serial port for this XBee device
@@ -338,9 +593,206 @@ class XBeeBase(object):
         field names other than those in reserved_names (like 'id' and
         'order') should be given, unless they are of variable length
         (of 'None' in the specification. Those are optional).
+
+        If await_response is True, the command must have a frame_id
+        field. Unless one is given, a frame id which is not awaiting
+        another response is allocated, and a future is returned which
+        is resolved with the response carrying that frame id (such as
+        the 'tx_status' of a 'tx' command). The response is also
+        delivered as usual. If response_timeout (in seconds) is given
+        and passes first, the future fails with a TimeoutException.
+        Responses are only matched as they are read, either by the
+        callback of this instance or by calls to wait_read_frame().
+
+        Without await_response, the default frame id of the command is
+        kept from awaited requests until its response arrives, or for
+        response_timeout seconds if given (held_response_timeout
+        otherwise). If an awaited request is waiting on that id, the
+        command is sent with another.
+        """
+        if await_response:
+            return self._send_request(cmd, response_timeout, kwargs)
+
+        release = None
+        if 'frame_id' not in kwargs:
+            release = self._hold_frame_id(cmd, response_timeout, kwargs)
+
+        try:
+            # Pass through the keyword arguments
+            self._write(self._build_command(cmd, **kwargs))
+        except Exception:
+            if release is not None:
+                release()
+            raise
+
+    def _fail_pending(self, exception):
+        """
+        _fail_pending: Exception -> None
+
+        Fails the future of every request awaiting a response with the
+        given exception, once no more responses will be read
+        """
+        for future in self._pending.clear():
+            if not future.done():
+                future.set_exception(exception)
+
+    def _hold_frame_id(self, cmd, timeout, kwargs):
+        """
+        _hold_frame_id: string, float, {string: binary data} -> function
+                        or None
+
+        Holds the default frame id of a command sent without
+        await_response until its response arrives, or for timeout
+        seconds (held_response_timeout if None), so that the id is not
+        allocated to an awaited request whose response could be taken
+        for it. If an awaited request is waiting on the default id, the
+        command is given a free frame id to hold instead. Returns a
+        function which releases the id, or None if none is held.
+        """
+        response_type = RESPONSE_TYPES.get(cmd)
+        if response_type is None:
+            return None
+
+        try:
+            spec = self.api_commands[cmd]
+        except (AttributeError, KeyError, NotImplementedError):
+            # Reported by _build_command
+            return None
+
+        default = None
+        for field in spec:
+            if field['name'] == 'frame_id':
+                default = field.get('default')
+        if not default or default == b'\x00':
+            # No response will be sent
+            return None
+
+        frame_id = byteToInt(default[0])
+        token = self._pending.hold(frame_id, response_type)
+        if token is None:
+            try:
+                frame_id, token = self._pending.hold_next(response_type)
+            except FrameIdExhaustedException:
+                return None
+            kwargs['frame_id'] = intToByte(frame_id)
+
+        if timeout is None:
+            timeout = self.held_response_timeout
+
+        try:
+            handle = self._call_later(
+                timeout, lambda: self._pending.pop(frame_id, token))
+        except NotImplementedError:
+            # Without timers, the id could be held for good
+            self._pending.pop(frame_id, token)
+            return None
+
+        def release():
+            self._pending.pop(frame_id, token)
+            self._cancel_call(handle)
+
+        return release
+
+    def send_batch(self, cmd, batch, window=8, response_timeout=None,
+                   callback=None):
+        """
+        send_batch: string, [{string: binary data} ...] -> future
+
+        Sends the given command once with each dictionary of named
+        arguments in the batch, keeping up to window of them awaiting a
+        response at once (see send() with await_response). As each
+        response arrives, the next command is sent.
+
+        Returns a future resolved, once every command has completed,
+        with a list holding the response to each command in batch order.
+        A command which failed or timed out has the exception instead of
+        a response. If callback is given, it is called with the index of
+        each command and its response (or exception) as it completes.
+        Raises ValueError if window is less than 1.
+        """
+        if window < 1:
+            raise ValueError("The batch window must be at least 1")
+
+        results = [None] * len(batch)
+        finished = self._create_future()
+        lock = threading.Lock()
+        state = {'next': 0, 'left': len(batch)}
+
+        def complete(index, result):
+            results[index] = result
+            if callback:
+                callback(index, result)
+
+            with lock:
+                state['left'] -= 1
+                left = state['left']
+
+            if left == 0:
+                finished.set_result(results)
+
+        def received(index, future):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+
+            complete(index, result)
+            send_next()
+
+        def send_next():
+            # Commands which fail to send complete immediately, so carry
+            # on until one has been sent or none are left
+            while True:
+                with lock:
+                    index = state['next']
+                    if index >= len(batch):
+                        return
+                    state['next'] += 1
+
+                try:
+                    future = self.send(cmd, await_response=True,
+                                       response_timeout=response_timeout,
+                                       **batch[index])
+                except Exception as e:
+                    complete(index, e)
+                    continue
+
+                future.add_done_callback(
+                    lambda future, index=index: received(index, future))
+                return
+
+        if not batch:
+            finished.set_result(results)
+
+        for i in range(min(window, len(batch))):
+            send_next()
+
+        return finished
+
+    def remote_at_batch(self, requests, window=8, response_timeout=None,
+                        callback=None, **kwargs):
+        """
+        remote_at_batch: [(binary data, binary data[, binary data]) ...]
+                         -> future
+
+        Sends a 'remote_at' command for each (dest_addr_long, command)
+        or (dest_addr_long, command, parameter) tuple, pipelining them
+        as send_batch() does, and returns a future resolved with the
+        list of responses. Any other named arguments (such as options)
+        are given to every command.
         """
-        # Pass through the keyword arguments
-        self._write(self._build_command(cmd, **kwargs))
+        batch = []
+        for request in requests:
+            fields = dict(kwargs)
+            fields['dest_addr_long'] = request[0]
+            fields['command'] = request[1]
+            if len(request) > 2:
+                fields['parameter'] = request[2]
+            batch.append(fields)
+
+        return self.send_batch('remote_at', batch, window=window,
+                               response_timeout=response_timeout,
+                               callback=callback)
 
     def __getattr__(self, name):
         """
@@ -0,0 +1,465 @@
+"""
+codec.py
+
+Compiles the api_commands and api_responses specifications of an XBee
+class into specialized encoder and decoder functions.
+
+Each specification is compiled the first time it is used and cached
+for as long as the specification object itself exists, so the generic
+interpretation of field lists only happens once per command or response
+type instead of once per frame.
+"""
+import struct
+from xbee.backend.response import record_class
+from xbee.python2to3 import stringToBytes
+
+# struct formats of the fixed field lengths which records hold as integers
+INTEGER_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+# Fixed fields which remain bytes in records even when their length is
+# listed in INTEGER_FORMATS, since they hold text
+BINARY_FIELDS = frozenset(['command'])
+
+# (id(spec), compiler) -> (spec, compiled function); the spec is kept
+# so that a recycled id can never return a stale function
+_compiled = {}
+
+
+def compiled(spec, compiler):
+    """
+    compiled: specification, function -> function
+
+    Returns the result of compiler(spec), compiling the specification
+    only on the first call for any given specification object.
+    """
+    key = (id(spec), compiler)
+    try:
+        cached_spec, function = _compiled[key]
+        if cached_spec is spec:
+            return function
+    except KeyError:
+        pass
+
+    function = compiler(spec)
+    _compiled[key] = (spec, function)
+    return function
+
+
+def compile_command(spec):
+    """
+    compile_command: api_commands entry -> function: dict -> bytes
+
+    Builds an encoder for a single command specification. Fields of a
+    fixed length which precede the first field of no particular length
+    are written at precomputed offsets into a copy of a template buffer
+    which already holds every default value. Any remaining fields are
+    appended in order.
+
+    The encoder raises the same KeyError and ValueError as the generic
+    implementation when a required field is missing or has the wrong
+    length.
+    """
+    prefix = []
+    tail = []
+    template = bytearray()
+
+    for field in spec:
+        name, length = field['name'], field['len']
+        default = field.get('default')
+
+        if tail or length is None:
+            tail.append((name, length, default))
+            continue
+
+        start = len(template)
+        missing = None
+        if not default:
+            missing = (KeyError, "The expected field {} of length {} "
+                                 "was not provided".format(name, length))
+        elif len(default) != length:
+            missing = (ValueError, "The data provided for '{}' was not {} "
+                                   "bytes long".format(name, length))
+
+        if missing:
+            template += b'\x00' * length
+        else:
+            template += default
+        prefix.append((name, start, start + length, length, missing))
+
+    def encode(kwargs):
+        packet = bytearray(template)
+
+        for name, start, end, length, missing in prefix:
+            data = kwargs.get(name)
+
+            if data is None:
+                if name not in kwargs:
+                    # The template already holds the default value
+                    if missing:
+                        raise missing[0](missing[1])
+                    continue
+            elif isinstance(data, str):
+                data = stringToBytes(data)
+
+            if len(data) != length:
+                raise ValueError(
+                    "The data provided for '{}' was not {} "
+                    "bytes long".format(name, length)
+                )
+
+            packet[start:end] = data
+
+        for name, length, default in tail:
+            data = _tail_field(kwargs, name, length, default)
+            if data:
+                packet += data
+
+        return bytes(packet)
+
+    return encode
+
+
+def _tail_field(kwargs, name, length, default):
+    """
+    Reads a field which follows a field of no particular length,
+    exactly as the generic command builder does.
+    """
+    try:
+        data = kwargs[name]
+        if isinstance(data, str):
+            data = stringToBytes(data)
+    except KeyError:
+        if length is None:
+            return None
+        if not default:
+            raise KeyError(
+                "The expected field {} of length {} "
+                "was not provided".format(name, length)
+            )
+        data = default
+
+    if length and len(data) != length:
+        raise ValueError(
+            "The data provided for '{}' was not {} "
+            "bytes long".format(name, length)
+        )
+
+    return data
+
+
+def compile_response(packet):
+    """
+    compile_response: api_responses entry -> function: xbee, data -> dict
+
+    Builds a decoder for a single response specification. Each run of
+    fixed-length fields is read with a single precompiled
+    struct.Struct.unpack_from() call; null-terminated fields are found
+    with find() and a field of no particular length takes the rest of
+    the data. The decoder produces exactly the dictionary the generic
+    implementation did, including the 'id' key, and then applies the
+    packet's parsing rules. Parsing rules are read from the packet on
+    every call, so they may be replaced at run time.
+    """
+    name = packet['name']
+    segments = _segments(packet)
+
+    def parse(xbee, info):
+        for parse_rule in packet.get('parsing', ()):
+            # Only apply a rule if it is relevant (raw data is available)
+            if parse_rule[0] in info:
+                info[parse_rule[0]] = parse_rule[1](xbee, info)
+        return info
+
+    # Without null-terminated fields there is at most one run of fixed
+    # fields, optionally followed by the variable-length field
+    if 'null' not in [segment[0] for segment in segments]:
+        return _simple_decoder(name, segments, parse)
+    return _generic_decoder(name, segments, parse)
+
+
+def _segments(packet, typed=False):
+    """
+    Groups the fields of a response specification into segments
+
+    When typed is True, fixed fields which hold an integer (see
+    INTEGER_FORMATS) are unpacked as unsigned integers instead of bytes.
+    """
+    # Segments are ('fixed', Struct, field names, field ends relative
+    # to the segment start), ('null', field name) or ('tail', field name)
+    segments = []
+    fixed = None
+
+    for field in packet['structure']:
+        length = field['len']
+        if length == 'null_terminated' or length is None:
+            if fixed:
+                segments.append(_fixed_segment(*fixed))
+                fixed = None
+            if length is None:
+                segments.append(('tail', field['name']))
+                break
+            segments.append(('null', field['name']))
+        else:
+            if fixed is None:
+                fixed = ([], [], [])
+            formats, names, ends = fixed
+            if typed and field['name'] not in BINARY_FIELDS and \
+                    length in INTEGER_FORMATS:
+                formats.append(INTEGER_FORMATS[length])
+            else:
+                formats.append('{0}s'.format(length))
+            names.append(field['name'])
+            ends.append((ends[-1] if ends else 0) + length)
+
+    if fixed:
+        segments.append(_fixed_segment(*fixed))
+    return segments
+
+
+def _fixed_segment(formats, names, ends):
+    return ('fixed', struct.Struct('>' + ''.join(formats)), tuple(names),
+            tuple(ends))
+
+
+def _short(expected, got):
+    return ValueError("Response packet was shorter than expected; "
+                      "expected: {}, got: {} bytes".format(expected, got))
+
+
+def _long(expected, got):
+    return ValueError("Response packet was longer than expected; "
+                      "expected: {}, got: {} bytes".format(expected, got))
+
+
+def _check_fixed(ends, index, size):
+    """
+    Raises the error for the first fixed field which extends past the
+    end of the data
+    """
+    for end in ends:
+        if index + end > size:
+            raise _short(index + end, size)
+
+
+def _simple_decoder(name, segments, parse):
+    """
+    Decoder for the common layout of fixed fields optionally followed by
+    a single field of no particular length
+    """
+    unpack_from, names, ends, tail = None, (), (), None
+    for segment in segments:
+        if segment[0] == 'fixed':
+            _, fixed, names, ends = segment
+            unpack_from = fixed.unpack_from
+        else:
+            tail = segment[1]
+
+    end = 1 + (ends[-1] if ends else 0)
+
+    def decode(xbee, data):
+        size = len(data)
+        if size < end:
+            _check_fixed(ends, 1, size)
+
+        info = {'id': name}
+        if unpack_from is not None:
+            info.update(zip(names, unpack_from(data, 1)))
+
+        if size > end:
+            if tail is None:
+                raise _long(end, size)
+            info[tail] = data[end:]
+
+        return parse(xbee, info)
+
+    return decode
+
+
+def _generic_decoder(name, segments, parse):
+    """
+    Decoder for layouts which include null-terminated fields
+    """
+    def decode(xbee, data):
+        size = len(data)
+        # memoryview has no find(); only null-terminated fields need it
+        searchable = data.tobytes() if isinstance(data, memoryview) else data
+
+        info = {'id': name}
+        index = 1
+
+        for segment in segments:
+            kind = segment[0]
+            if kind == 'fixed':
+                _, fixed, names, ends = segment
+                if index + fixed.size > size:
+                    _check_fixed(ends, index, size)
+                info.update(zip(names, fixed.unpack_from(data, index)))
+                index += fixed.size
+            elif kind == 'null':
+                end = searchable.find(b'\x00', index)
+                if end < 0:
+                    raise _short(size + 1, size)
+                info[segment[1]] = searchable[index:end]
+                index = end + 1
+            else:
+                if index < size:
+                    info[segment[1]] = data[index:]
+                    index = size
+
+        if index < size:
+            raise _long(index, size)
+
+        return parse(xbee, info)
+
+    return decode
+
+
+def compile_spans(packet):
+    """
+    compile_spans: api_responses entry -> function: data -> dict
+
+    Builds a function which locates every field of a response without
+    copying any data. It returns a dictionary mapping the name of each
+    field present in the data to its (start, end) indices; the end of
+    the variable-length field is None. The same ValueErrors as the
+    decoder are raised for data of the wrong length. The dictionary
+    may be shared between calls and must not be modified.
+    """
+    segments = _segments(packet)
+
+    if 'null' not in [segment[0] for segment in segments]:
+        fixed = {}
+        index = 1
+        ends = ()
+        tail = None
+        for segment in segments:
+            if segment[0] == 'fixed':
+                _, _, names, ends = segment
+                for field_name, end in zip(names, ends):
+                    fixed[field_name] = (index, 1 + end)
+                    index = 1 + end
+            else:
+                tail = segment[1]
+
+        with_tail = dict(fixed)
+        if tail is not None:
+            with_tail[tail] = (index, None)
+
+        def spans(data):
+            size = len(data)
+            if size < index:
+                _check_fixed(ends, 1, size)
+            if size > index:
+                if tail is None:
+                    raise _long(index, size)
+                return with_tail
+            return fixed
+
+        return spans
+
+    def spans(data):
+        size = len(data)
+        searchable = data.tobytes() if isinstance(data, memoryview) else data
+
+        result = {}
+        index = 1
+
+        for segment in segments:
+            kind = segment[0]
+            if kind == 'fixed':
+                _, fixed, names, ends = segment
+                if index + fixed.size > size:
+                    _check_fixed(ends, index, size)
+                start = index
+                for field_name, end in zip(names, ends):
+                    result[field_name] = (start, index + end)
+                    start = index + end
+                index += fixed.size
+            elif kind == 'null':
+                end = searchable.find(b'\x00', index)
+                if end < 0:
+                    raise _short(size + 1, size)
+                result[segment[1]] = (index, end)
+                index = end + 1
+            else:
+                if index < size:
+                    result[segment[1]] = (index, None)
+                    index = size
+
+        if index < size:
+            raise _long(index, size)
+
+        return result
+
+    return spans
+
+
+def compile_record(packet):
+    """
+    compile_record: api_responses entry -> function: xbee, data -> record
+
+    Builds a decoder which returns an instance of a ResponseRecord
+    subclass generated for the response type (see
+    xbee.backend.response.record_class). Fixed fields of one, two, four
+    or eight bytes are unpacked directly into integers, except for the
+    text fields in BINARY_FIELDS; every other field is decoded as it is
+    for dictionaries. Parsing rules receive the record, whose item
+    access returns the same binary data a dictionary would hold.
+    """
+    segments = _segments(packet, typed=True)
+
+    fields = []
+    for segment in segments:
+        if segment[0] == 'fixed':
+            fields.extend(segment[2])
+        else:
+            fields.append(segment[1])
+
+    # Structs which pack integer fields back into their binary form
+    integers = dict(
+        (field['name'], struct.Struct('>' + INTEGER_FORMATS[field['len']]))
+        for field in packet['structure']
+        if field['name'] in fields and field['name'] not in BINARY_FIELDS
+        and field['len'] in INTEGER_FORMATS
+    )
+
+    cls = record_class(packet['name'], fields, integers)
+
+    def decode(xbee, data):
+        size = len(data)
+        searchable = data
+        index = 1
+        values = []
+
+        for segment in segments:
+            kind = segment[0]
+            if kind == 'fixed':
+                _, fixed, names, ends = segment
+                if index + fixed.size > size:
+                    _check_fixed(ends, index, size)
+                values.extend(fixed.unpack_from(data, index))
+                index += fixed.size
+            elif kind == 'null':
+                if isinstance(searchable, memoryview):
+                    searchable = data.tobytes()
+                end = searchable.find(b'\x00', index)
+                if end < 0:
+                    raise _short(size + 1, size)
+                values.append(searchable[index:end])
+                index = end + 1
+            elif index < size:
+                values.append(data[index:])
+                index = size
+            else:
+                values.append(None)
+
+        if index < size:
+            raise _long(index, size)
+
+        record = cls(*values)
+        for parse_rule in packet.get('parsing', ()):
+            if parse_rule[0] in record:
+                setattr(record, parse_rule[0], parse_rule[1](xbee, record))
+        return record
+
+    return decode
@@ -0,0 +1,206 @@
+"""
+correlation.py
+
+Matches response frames to the requests which caused them.
+
+Commands which carry a frame_id field (such as 'at', 'remote_at' and
+'tx') are answered by a response frame carrying the same frame id (an
+'at_response', 'remote_at_response' or 'tx_status'). PendingRequests
+hands out frame ids to requests and finds the request waiting on each
+response as it arrives (see XBeeBase.send).
+"""
+import threading
+from xbee.python2to3 import byteToInt
+
+
+# The type of response which answers each command with a frame_id
+RESPONSE_TYPES = {
+    'at': 'at_response',
+    'queued_at': 'at_response',
+    'remote_at': 'remote_at_response',
+    'tx': 'tx_status',
+    'tx_long_addr': 'tx_status',
+    'tx_explicit': 'tx_status',
+    'register_joining_device': 'register_device_status',
+}
+
+
+class FrameIdExhaustedException(Exception):
+    pass
+
+
+class _Held(object):
+    """
+    Stands in for the future of a request whose response is not awaited
+    """
+    __slots__ = ()
+
+
+class PendingRequests(object):
+    """
+    The requests awaiting a response, by frame id
+
+    Frame ids are allocated in turn from 1 to 255, wrapping around and
+    skipping any id which is still awaiting a response; frame id 0 asks
+    the device not to respond at all, so it is never allocated. Each
+    request is represented by a future which is resolved with the
+    matching response: the first response carrying its frame id and,
+    if a response type was given for it, of that type.
+
+    The frame ids of requests whose responses are not awaited may be
+    held (see hold()), so that they are not allocated to requests which
+    are until those responses arrive.
+
+    All methods may be called from any thread.
+    """
+
+    # Frame ids which can be allocated
+    FIRST_ID = 1
+    LAST_ID = 255
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # frame id -> (future, expected response type or None)
+        self._futures = {}
+        self._next_id = self.FIRST_ID
+
+    def __len__(self):
+        return len(self._futures)
+
+    def __contains__(self, frame_id):
+        return frame_id in self._futures
+
+    def allocate(self, future, response_type=None):
+        """
+        allocate: future, string -> int
+
+        Returns the next frame id which is not awaiting a response and
+        records the given future as waiting on it for a response of the
+        given type (of any type if None). Raises
+        FrameIdExhaustedException if every frame id is in use.
+        """
+        with self._lock:
+            count = self.LAST_ID - self.FIRST_ID + 1
+            if len(self._futures) >= count:
+                raise FrameIdExhaustedException(
+                    "All {} frame ids are awaiting responses".format(count))
+
+            frame_id = self._next_id
+            while frame_id in self._futures:
+                frame_id = self._following(frame_id)
+
+            self._next_id = self._following(frame_id)
+            self._futures[frame_id] = (future, response_type)
+            return frame_id
+
+    def hold(self, frame_id, response_type=None):
+        """
+        hold: int, string -> token or None
+
+        Records that a request whose response is not awaited was sent
+        with the given frame id, so that the id is not allocated until a
+        response of the given type carrying it arrives or the returned
+        token is given to pop(). Any number of such requests may hold
+        the same id, the last one replacing the others. Returns None,
+        holding nothing, if an awaited request is waiting on the id.
+        """
+        with self._lock:
+            entry = self._futures.get(frame_id)
+            if entry is not None and not isinstance(entry[0], _Held):
+                return None
+
+            token = _Held()
+            self._futures[frame_id] = (token, response_type)
+            return token
+
+    def hold_next(self, response_type=None):
+        """
+        hold_next: string -> (int, token)
+
+        Allocates a frame id as allocate() does, holding it for a
+        request whose response is not awaited as hold() does. Returns
+        the id and the token to give to pop().
+        """
+        token = _Held()
+        return self.allocate(token, response_type), token
+
+    def add(self, frame_id, future, response_type=None):
+        """
+        add: int, future, string -> None
+
+        Records the given future as waiting on a frame id chosen by the
+        caller, as allocate() does. Raises ValueError if that id is
+        already awaiting a response.
+        """
+        if not self.FIRST_ID <= frame_id <= self.LAST_ID:
+            raise ValueError("Frame id {} cannot be awaited; expected "
+                             "{} to {}".format(frame_id, self.FIRST_ID,
+                                               self.LAST_ID))
+
+        with self._lock:
+            if frame_id in self._futures:
+                raise ValueError("Frame id {} is already awaiting a "
+                                 "response".format(frame_id))
+            self._futures[frame_id] = (future, response_type)
+
+    def pop(self, frame_id, future=None):
+        """
+        pop: int, future -> future or None
+
+        Stops waiting on the given frame id and returns the future which
+        was waiting on it, or None if there was none. If a future is
+        given, the frame id is only released if it is that future which
+        is waiting on it.
+        """
+        with self._lock:
+            entry = self._futures.get(frame_id)
+            if entry is None or (future is not None and
+                                 entry[0] is not future):
+                return None
+            del self._futures[frame_id]
+            return entry[0]
+
+    def clear(self):
+        """
+        clear: None -> [future ...]
+
+        Stops waiting on every frame id, and returns the futures of the
+        requests which were awaiting responses
+        """
+        with self._lock:
+            futures = [entry[0] for entry in self._futures.values()
+                       if not isinstance(entry[0], _Held)]
+            self._futures.clear()
+        return futures
+
+    def resolve(self, response):
+        """
+        resolve: response -> boolean
+
+        If the given response carries the frame id of a request awaiting
+        a response of its type, resolves that request's future with it
+        and returns True. A frame id held for the response instead is
+        released.
+        """
+        if not self._futures or 'frame_id' not in response:
+            return False
+
+        frame_id = byteToInt(response['frame_id'][0])
+        with self._lock:
+            entry = self._futures.get(frame_id)
+            if entry is None or (entry[1] is not None and
+                                 entry[1] != response['id']):
+                return False
+            del self._futures[frame_id]
+
+        future = entry[0]
+        if isinstance(future, _Held) or future.done():
+            return False
+
+        future.set_result(response)
+        return True
+
+    def _following(self, frame_id):
+        if frame_id >= self.LAST_ID:
+            return self.FIRST_ID
+        return frame_id + 1
@@ -0,0 +1,202 @@
+"""
+receive.py
+
+Bounded queue of received frames, shared by the backends.
+
+A device can deliver frames faster than they are handled: during a burst
+of IO samples, for example, or while a callback waits on a database. The
+frames waiting to be handled are kept in a ReceiveQueue, which holds at
+most maxsize of them and applies one of these policies once full:
+
+    'block':       the reader stops taking frames from the device until
+                   there is room, leaving further bytes in the serial
+                   port's buffers (where flow control can hold them back).
+    'drop_oldest': the frame which has waited longest is dropped.
+    'drop_newest': the frame being added is dropped.
+    'shed':        a frame of one of the shed types is dropped, the
+                   frame being added if it is one and otherwise the
+                   oldest queued; if no queued frame is of a shed type,
+                   the oldest frame is dropped.
+
+Dropped frames are counted, in total and by type.
+
+Frames may be put in a partition, so that several threads can take them
+from the same queue while each frame of a partition is taken by the same
+thread (see get()).
+"""
+from collections import deque
+import threading
+
+POLICIES = ('block', 'drop_oldest', 'drop_newest', 'shed')
+
+
+class ReceiveQueue(object):
+    """
+    A queue of received frames, each with the name of its type
+
+    The queue may be used from several threads; get() and put() with
+    wait=True block as queue.Queue's would. Single-threaded backends use
+    put(wait=False) and take(), and stop reading while the queue is
+    full() under the 'block' policy.
+
+    Constructor arguments:
+        maxsize: the most frames held at once; 0 for no limit.
+
+        policy: what to do with a frame added while the queue is full;
+                see the module documentation.
+
+        shed: the names of the frame types which may be dropped under
+              the 'shed' policy, such as ('rx_io_data_long_addr',).
+    """
+
+    def __init__(self, maxsize=0, policy='block', shed=()):
+        if policy not in POLICIES:
+            raise ValueError("Unknown queue policy '{}'; expected one of "
+                             "{}".format(policy, ', '.join(POLICIES)))
+        if maxsize < 0:
+            raise ValueError("The queue size cannot be negative")
+        if policy == 'shed' and not shed:
+            raise ValueError("The 'shed' policy needs frame types to shed")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.shed = frozenset(shed)
+
+        # Number of frames dropped, in total and by frame type
+        self.dropped = 0
+        self.dropped_types = {}
+
+        # (name, partition, frame) tuples, oldest first
+        self._items = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def full(self):
+        """
+        full: None -> boolean
+
+        Returns True if the queue holds maxsize frames or more
+        """
+        return 0 < self.maxsize <= len(self._items)
+
+    def _drop(self, name):
+        self.dropped += 1
+        self.dropped_types[name] = self.dropped_types.get(name, 0) + 1
+
+    def _drop_at(self, index):
+        name = self._items[index][0]
+        del self._items[index]
+        self._drop(name)
+
+    def put(self, item, name=None, wait=True, partition=None):
+        """
+        put: frame, string, boolean, int -> boolean
+
+        Adds a frame of the named type, in the given partition if it is
+        not None, applying the queue's policy if it is full. Under the
+        'block' policy, waits for room if wait is True, and otherwise adds
+        the frame anyway (so that a reader which has already taken it
+        from the device does not lose it). Returns False if the frame was
+        dropped or the queue has been closed.
+        """
+        with self._cond:
+            if self.full():
+                if self.policy == 'block':
+                    while wait and self.full() and not self._closed:
+                        self._cond.wait()
+
+                elif self.policy == 'drop_newest':
+                    self._drop(name)
+                    return False
+
+                elif self.policy == 'drop_oldest':
+                    self._drop_at(0)
+
+                elif name in self.shed:
+                    self._drop(name)
+                    return False
+
+                else:
+                    for index, queued in enumerate(self._items):
+                        if queued[0] in self.shed:
+                            self._drop_at(index)
+                            break
+                    else:
+                        self._drop_at(0)
+
+            if self._closed:
+                return False
+
+            self._items.append((name, partition, item))
+            self._cond.notify_all()
+            return True
+
+    def take(self, names=None):
+        """
+        take: (string ...) -> frame or None
+
+        Removes and returns the oldest frame, or the oldest frame of one
+        of the given types, without waiting. Returns None if there is no
+        such frame.
+        """
+        with self._cond:
+            for index, (name, _, item) in enumerate(self._items):
+                if names is None or name in names:
+                    del self._items[index]
+                    self._cond.notify_all()
+                    return item
+
+            return None
+
+    def _find(self, partition):
+        """
+        _find: int -> int or None
+
+        Returns the index of the oldest frame which may be taken from the
+        given partition, or None if there is none
+        """
+        for index, (_, queued, _) in enumerate(self._items):
+            if partition is None or queued is None or queued == partition:
+                return index
+
+        return None
+
+    def get(self, partition=None):
+        """
+        get: int -> frame or None
+
+        Removes and returns the oldest frame, waiting for one to be
+        added if there is none. Given a partition, only frames put in
+        that partition or in none are returned, so that if each thread
+        taking frames gets from its own partition, the frames of a
+        partition are handled in order. Returns None once the queue has
+        been closed.
+        """
+        with self._cond:
+            index = self._find(partition)
+            while index is None and not self._closed:
+                self._cond.wait()
+                index = self._find(partition)
+
+            if self._closed:
+                return None
+
+            item = self._items[index][2]
+            del self._items[index]
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """
+        close: None -> None
+
+        Discards the queued frames and wakes every thread waiting in
+        get() or put()
+        """
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
@@ -0,0 +1,172 @@
+"""
+response.py
+
+Alternative representations of responses received from an XBee device.
+
+By default, each response is returned as a dictionary of binary data
+(see XBeeBase._split_response). The classes in this module provide the
+same dictionary-style interface with different trade-offs, and are
+selected with the response_format argument of XBeeBase: LazyResponse
+for 'lazy' and generated ResponseRecord subclasses for 'record'.
+"""
+from numbers import Integral
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class LazyResponse(Mapping):
+    """
+    A response whose fields are decoded only when first accessed
+
+    The location of every field is determined when the response is
+    created, so responses of the wrong length are still rejected
+    immediately, but no field is sliced out of the frame and no parsing
+    rule (such as I/O sample parsing) is applied until the field is
+    read. Decoded fields are cached.
+
+    LazyResponse supports the read-only dictionary interface: item
+    access, 'in', get(), keys(), values(), items(), len() and comparison
+    with a dictionary. dict(response) decodes every field.
+    """
+    __slots__ = ('_xbee', '_packet', '_data', '_spans', '_fields')
+
+    def __init__(self, xbee, packet, data, spans):
+        self._xbee = xbee
+        self._packet = packet
+        self._data = data
+        self._spans = spans
+        self._fields = {'id': packet['name']}
+
+    def __getitem__(self, key):
+        try:
+            return self._fields[key]
+        except KeyError:
+            pass
+
+        start, end = self._spans[key]
+        if end is None:
+            value = self._data[start:]
+        else:
+            value = self._data[start:end]
+            if isinstance(value, memoryview):
+                value = value.tobytes()
+
+        # Parsing rules may read this field, so store its raw value first
+        self._fields[key] = value
+        for parse_rule in self._packet.get('parsing', ()):
+            if parse_rule[0] == key:
+                self._fields[key] = parse_rule[1](self._xbee, self)
+
+        return self._fields[key]
+
+    def __contains__(self, key):
+        return key == 'id' or key in self._spans
+
+    def __iter__(self):
+        yield 'id'
+        for key in sorted(self._spans, key=lambda name: self._spans[name][0]):
+            yield key
+
+    def __len__(self):
+        return len(self._spans) + 1
+
+    def __repr__(self):
+        return 'LazyResponse({0!r})'.format(dict(self))
+
+
+class ResponseRecord(object):
+    """
+    Base class of the compact records generated for each response type
+
+    Each response type is represented by a subclass with one slot per
+    field (see record_class), which uses far less memory than a
+    dictionary of bytes objects. Fields are read as attributes; fixed
+    fields of one, two, four or eight bytes, such as addresses, frame
+    ids and status codes, are unsigned integers. The variable-length
+    field is None when the response did not contain it.
+
+    For compatibility, records also support item access, 'in', get()
+    and keys(), which return fields in the binary form a dictionary
+    would hold, and to_dict() returns the equivalent dictionary.
+    """
+    __slots__ = ()
+
+    # Name of the response type
+    id = None
+
+    # Field name -> Struct which packs the integer field into bytes
+    _integers = {}
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        if key not in self.__slots__:
+            raise KeyError(key)
+
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+
+        packer = self._integers.get(key)
+        if packer is not None and isinstance(value, Integral):
+            return packer.pack(value)
+        return value
+
+    def __contains__(self, key):
+        return key == 'id' or (key in self.__slots__ and
+                               getattr(self, key) is not None)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ['id'] + [name for name in self.__slots__
+                         if getattr(self, name) is not None]
+
+    def to_dict(self):
+        """
+        to_dict: None -> dict
+
+        Returns the dictionary which would have been returned for this
+        response in the default response format.
+        """
+        return dict((key, self[key]) for key in self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, ResponseRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, ', '.join(
+            '{0}={1!r}'.format(name, getattr(self, name))
+            for name in self.__slots__))
+
+
+def record_class(name, fields, integers):
+    """
+    record_class: str, [str ...], {str: Struct} -> ResponseRecord subclass
+
+    Generates the record class of a response type. The class name is
+    the response name in CamelCase, with one slot per field name.
+    """
+    class_name = ''.join(part.capitalize() for part in name.split('_'))
+    return type(class_name, (ResponseRecord,), {
+        '__slots__': tuple(fields),
+        'id': name,
+        '_integers': integers,
+    })
@@ -0,0 +1,273 @@
+"""
+routing.py
+
+Routing state learnt from the frames received from an XBee ZB device.
+
+A ZigBee node is identified by its permanent 64-bit address, but is
+reached through a 16-bit network address which its parent assigns when
+it joins. Unless a transmission gives both, the device first has to
+discover the 16-bit address, which costs time and airtime. AddressCache
+remembers the 16-bit addresses reported in received frames so that they
+can be filled in (see ZigBee's address_cache argument).
+
+In large networks, nodes report the route their data took in route
+record indicator frames. SourceRouteCache remembers recent routes so
+that they can be given to the device with create_source_route before
+transmitting to those nodes, which spares the network route discovery
+(see ZigBee's source_routes argument).
+"""
+from collections import OrderedDict
+import struct
+import time
+from xbee.python2to3 import byteToInt
+
+# 16-bit address which asks the device to discover the real one
+UNKNOWN_ADDR = b'\xFF\xFE'
+
+# 64-bit addresses which do not identify a single node
+BROADCAST_ADDRS_LONG = frozenset([struct.pack('>Q', 0xFFFF),
+                                  struct.pack('>q', -1)])
+
+# Received frames which carry a source's 64-bit and 16-bit addresses
+_SOURCE_FRAMES = frozenset(['rx', 'rx_explicit', 'rx_io_data_long_addr',
+                            'remote_at_response', 'route_record_indicator',
+                            'many_to_one_rri'])
+
+# tx_status discover_status values showing the 16-bit address was
+# discovered again: address discovery, and address and route discovery
+_REDISCOVERED = frozenset([b'\x01', b'\x03'])
+
+# tx_status deliver_status showing the 16-bit address was not found
+_ADDRESS_NOT_FOUND = b'\x24'
+
+# tx_status deliver_status values showing a route has failed: network
+# ACK failure and route not found
+_ROUTE_FAILED = frozenset([b'\x21', b'\x25'])
+
+
+class _TransmitTracker(object):
+    """
+    Relates tx_status responses to the 64-bit address of the
+    transmission they report on, by frame id
+
+    A tx_status can only be related to a transmission if no other
+    transmission awaiting one was sent with the same frame id, as when
+    frame ids are allocated with send(..., await_response=True).
+    Transmissions which reuse a frame id (such as the default one) for
+    another address are not related to any tx_status, so that nothing is
+    learnt about the wrong node.
+    """
+
+    def __init__(self):
+        # frame id -> 64-bit address of a transmission awaiting
+        # tx_status, or None if several addresses were sent that id
+        self._sent = {}
+
+    def sent(self, frame_id, addr_long):
+        """
+        sent: binary data, binary data -> None
+
+        Records that a transmission with the given frame id was sent to
+        the given 64-bit address, so that its tx_status can be related
+        to that address
+        """
+        if frame_id == b'\x00' or addr_long in BROADCAST_ADDRS_LONG:
+            return
+
+        key = byteToInt(frame_id[0])
+        if key in self._sent and self._sent[key] != addr_long:
+            # Ambiguous until the next tx_status with this id
+            self._sent[key] = None
+        else:
+            self._sent[key] = addr_long
+
+    def _sent_to(self, status):
+        """
+        _sent_to: tx_status response -> binary data or None
+
+        Returns the 64-bit address of the transmission the given
+        tx_status reports on, if it was recorded with sent() and is not
+        ambiguous
+        """
+        return self._sent.pop(byteToInt(status['frame_id'][0]), None)
+
+
+class AddressCache(_TransmitTracker):
+    """
+    Maps the 64-bit addresses of ZigBee nodes to their 16-bit addresses
+
+    Mappings are learnt from each received frame given to observe():
+    rx frames, remote AT responses, route records and node
+    identification indicators carry both addresses of their source,
+    and a tx_status reports the 16-bit address a transmission was
+    delivered to. A mapping is replaced when a tx_status shows that the
+    address had to be discovered again, and removed when the address
+    could not be found.
+    """
+
+    def __init__(self):
+        super(AddressCache, self).__init__()
+        self._addrs = {}
+
+    def __len__(self):
+        return len(self._addrs)
+
+    def __contains__(self, addr_long):
+        return addr_long in self._addrs
+
+    def lookup(self, addr_long):
+        """
+        lookup: binary data -> binary data or None
+
+        Returns the 16-bit address of the node with the given 64-bit
+        address, or None if it is not known
+        """
+        return self._addrs.get(addr_long)
+
+    def learn(self, addr_long, addr):
+        """
+        learn: binary data, binary data -> None
+
+        Records the 16-bit address of the node with the given 64-bit
+        address; broadcast and unknown addresses are ignored
+        """
+        if addr_long in BROADCAST_ADDRS_LONG:
+            return
+
+        if addr == UNKNOWN_ADDR:
+            self.forget(addr_long)
+        else:
+            self._addrs[addr_long] = addr
+
+    def forget(self, addr_long):
+        """
+        forget: binary data -> None
+
+        Removes the 16-bit address of the node with the given 64-bit
+        address, so that it will be discovered again
+        """
+        self._addrs.pop(addr_long, None)
+
+    def observe(self, response):
+        """
+        observe: response -> None
+
+        Learns from a response received from the device
+        """
+        name = response['id']
+
+        if name in _SOURCE_FRAMES:
+            self.learn(response['source_addr_long'], response['source_addr'])
+
+        elif name == 'node_id_indicator':
+            self.learn(response['source_addr_long'], response['source_addr'])
+            self.learn(response['sender_addr_long'], response['sender_addr'])
+
+        elif name == 'tx_status':
+            addr_long = self._sent_to(response)
+            if addr_long is None:
+                return
+
+            if response['deliver_status'] == _ADDRESS_NOT_FOUND:
+                self.forget(addr_long)
+            elif response['deliver_status'] == b'\x00' or \
+                    response['discover_status'] in _REDISCOVERED:
+                self.learn(addr_long, response['dest_addr'])
+
+
+class SourceRouteCache(_TransmitTracker):
+    """
+    The most recent route to each of the nodes which reported one
+
+    Routes are learnt from the route_record_indicator frames given to
+    observe(), each of which lists the 16-bit addresses of the nodes
+    which relayed data from its source. Only routes through at least one
+    relay are kept. At most max_routes routes are kept, evicting the
+    least recently used; a route is dropped once it is older than
+    max_age seconds (unless max_age is None), and when a tx_status shows
+    a transmission along it failed.
+    """
+
+    def __init__(self, max_routes=64, max_age=300):
+        if max_routes < 1:
+            raise ValueError("At least one route must be kept")
+
+        super(SourceRouteCache, self).__init__()
+        self.max_routes = max_routes
+        self.max_age = max_age
+        # 64-bit address -> (16-bit address, hop count, relay addresses,
+        # time learnt), least recently used first
+        self._routes = OrderedDict()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, addr_long):
+        return addr_long in self._routes
+
+    def learn(self, addr_long, addr, hop_count, addresses):
+        """
+        learn: binary data, binary data, int, binary data -> None
+
+        Records the route to the node with the given addresses through
+        the given relays
+        """
+        if hop_count < 1 or addr_long in BROADCAST_ADDRS_LONG or \
+                addr == UNKNOWN_ADDR:
+            return
+
+        self._routes.pop(addr_long, None)
+        self._routes[addr_long] = (addr, hop_count, addresses, time.time())
+
+        while len(self._routes) > self.max_routes:
+            self._routes.popitem(last=False)
+
+    def forget(self, addr_long):
+        """
+        forget: binary data -> None
+
+        Removes the route to the node with the given 64-bit address
+        """
+        self._routes.pop(addr_long, None)
+
+    def route(self, addr_long):
+        """
+        route: binary data -> (binary data, int, binary data) or None
+
+        Returns the 16-bit address, hop count and relay addresses of the
+        route to the node with the given 64-bit address, as given to
+        create_source_route, or None if no current route is known
+        """
+        entry = self._routes.pop(addr_long, None)
+        if entry is None:
+            return None
+
+        if self.max_age is not None and \
+                time.time() - entry[3] > self.max_age:
+            return None
+
+        # Most recently used routes are kept last
+        self._routes[addr_long] = entry
+        return entry[:3]
+
+    def observe(self, response):
+        """
+        observe: response -> None
+
+        Learns from a response received from the device
+        """
+        name = response['id']
+
+        if name == 'route_record_indicator':
+            addresses = response['addresses']
+            if isinstance(addresses, memoryview):
+                addresses = addresses.tobytes()
+
+            self.learn(response['source_addr_long'], response['source_addr'],
+                       byteToInt(response['hop_count'][0]), addresses)
+
+        elif name == 'tx_status':
+            addr_long = self._sent_to(response)
+            if addr_long is not None and \
+                    response['deliver_status'] in _ROUTE_FAILED:
+                self.forget(addr_long)
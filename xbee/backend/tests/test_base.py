@@ -102,6 +102,15 @@ class TestNotImplementedFeatures(unittest.TestCase):
         else:
             self.fail("Shorthand call on XBeeBase base class should raise NotImplementedError")
 
+    def test_futures_and_timers(self):
+        """
+        create_future and call_later need a backend, so should raise
+        NotImplementedError
+        """
+        self.assertRaises(NotImplementedError, self.xbee.create_future)
+        self.assertRaises(NotImplementedError, self.xbee.call_later,
+                          1, lambda: None)
+
 
 class TestAsyncCallback(unittest.TestCase):
     """
@@ -0,0 +1,120 @@
+#! /usr/bin/python
+"""
+test_codec.py
+
+Tests the compiled encoders and decoders of xbee.backend.codec.
+"""
+import unittest
+from xbee.backend.codec import compiled, compile_command, \
+    compile_response
+from xbee.backend.zigbee import ZigBee
+
+
+class TestCompileCommand(unittest.TestCase):
+    """
+    Compiled command encoders must behave like the generic builder
+    """
+
+    def setUp(self):
+        self.encode = compiled(ZigBee.api_commands['tx'], compile_command)
+
+    def test_compiled_once(self):
+        """
+        a specification must only be compiled once
+        """
+        self.assertTrue(
+            compiled(ZigBee.api_commands['tx'], compile_command)
+            is self.encode)
+
+    def test_defaults_and_data(self):
+        """
+        defaults must be filled in and variable-length data appended
+        """
+        data = self.encode({'dest_addr_long': b'\x00' * 8, 'data': 'hi'})
+        self.assertEqual(
+            data, b'\x10\x01' + b'\x00' * 8 + b'\xFF\xFE\x00\x00hi')
+
+    def test_missing_field(self):
+        """
+        a required field which is not given must raise KeyError
+        """
+        encode = compiled(ZigBee.api_commands['at'], compile_command)
+        try:
+            encode({})
+        except KeyError as e:
+            self.assertTrue("command of length 2" in str(e))
+        else:
+            self.fail("KeyError not raised")
+
+    def test_wrong_length(self):
+        """
+        a field of the wrong length must raise ValueError
+        """
+        try:
+            self.encode({'dest_addr': b'\x00'})
+        except ValueError as e:
+            self.assertEqual(
+                str(e), "The data provided for 'dest_addr' was not 2 "
+                        "bytes long")
+        else:
+            self.fail("ValueError not raised")
+
+
+class TestCompileResponse(unittest.TestCase):
+    """
+    Compiled response decoders must behave like the generic parser
+    """
+
+    def decode(self, data):
+        packet = ZigBee.api_responses[data[0:1]]
+        return compiled(packet, compile_response)(None, data)
+
+    def test_fixed_and_tail(self):
+        """
+        fixed fields and the variable-length tail must be split
+        """
+        info = self.decode(b'\x90' + b'\x01' * 8 + b'\x02\x03\x04rf')
+        self.assertEqual(info, {'id': 'rx',
+                                'source_addr_long': b'\x01' * 8,
+                                'source_addr': b'\x02\x03',
+                                'options': b'\x04',
+                                'rf_data': b'rf'})
+
+    def test_empty_tail_omitted(self):
+        """
+        an empty variable-length field must not appear in the result
+        """
+        info = self.decode(b'\x90' + b'\x01' * 11)
+        self.assertFalse('rf_data' in info)
+
+    def test_memoryview_tail(self):
+        """
+        the tail of a memoryview must be a view; other fields bytes
+        """
+        info = self.decode(memoryview(b'\x90' + b'\x01' * 11 + b'rf'))
+        self.assertTrue(isinstance(info['rf_data'], memoryview))
+        self.assertTrue(isinstance(info['options'], bytes))
+
+    def test_too_short(self):
+        """
+        data shorter than the fixed fields must raise ValueError
+        """
+        self.assertRaises(ValueError, self.decode, b'\x8B\x01\x02')
+
+    def test_too_long(self):
+        """
+        data longer than a fixed-length response must raise ValueError
+        """
+        self.assertRaises(ValueError, self.decode, b'\x8A\x01\x02')
+
+    def test_missing_null_terminator(self):
+        """
+        a null-terminated field without a terminator must raise
+        ValueError
+        """
+        self.assertRaises(ValueError, self.decode,
+                          b'\x95' + b'\x01' * 21 + b'abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
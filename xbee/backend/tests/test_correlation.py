@@ -0,0 +1,145 @@
+#! /usr/bin/python
+"""
+test_correlation.py
+
+Tests the frame id allocation and response matching of
+xbee.backend.correlation.
+"""
+import unittest
+from concurrent.futures import Future
+from xbee.backend.correlation import PendingRequests, \
+    FrameIdExhaustedException
+
+
+class TestPendingRequests(unittest.TestCase):
+    """
+    Frame ids must be allocated in turn, skipping those in use
+    """
+
+    def setUp(self):
+        self.pending = PendingRequests()
+
+    def test_allocate_in_turn(self):
+        """
+        Frame ids should be allocated from 1 upwards
+        """
+        ids = [self.pending.allocate(Future()) for i in range(3)]
+        self.assertEqual(ids, [1, 2, 3])
+        self.assertEqual(len(self.pending), 3)
+
+    def test_allocate_wraps_and_skips_outstanding(self):
+        """
+        After 255, allocation should wrap around to 1 and skip any id
+        still awaiting a response
+        """
+        futures = [Future() for i in range(255)]
+        for future in futures:
+            self.pending.allocate(future)
+
+        self.pending.pop(3)
+        self.pending.pop(7)
+        self.assertEqual(self.pending.allocate(Future()), 3)
+        self.assertEqual(self.pending.allocate(Future()), 7)
+
+    def test_allocate_exhausted(self):
+        """
+        Allocation should fail when every frame id is in use
+        """
+        for i in range(255):
+            self.pending.allocate(Future())
+
+        self.assertRaises(FrameIdExhaustedException,
+                          self.pending.allocate, Future())
+
+    def test_add_outstanding(self):
+        """
+        A frame id chosen by the caller must not already be in use
+        """
+        self.pending.add(9, Future())
+        self.assertTrue(9 in self.pending)
+        self.assertRaises(ValueError, self.pending.add, 9, Future())
+        self.assertRaises(ValueError, self.pending.add, 0, Future())
+
+    def test_pop_other_future(self):
+        """
+        pop() should leave a frame id awaited by another future alone
+        """
+        future = Future()
+        frame_id = self.pending.allocate(future)
+
+        self.assertIsNone(self.pending.pop(frame_id, Future()))
+        self.assertIs(self.pending.pop(frame_id, future), future)
+        self.assertIsNone(self.pending.pop(frame_id))
+
+    def test_resolve(self):
+        """
+        A response should resolve the future awaiting its frame id and
+        release that id
+        """
+        future = Future()
+        frame_id = self.pending.allocate(future)
+        response = {'id': 'tx_status', 'frame_id': b'\x01'}
+
+        self.assertEqual(frame_id, 1)
+        self.assertTrue(self.pending.resolve(response))
+        self.assertEqual(future.result(), response)
+        self.assertFalse(1 in self.pending)
+        self.assertFalse(self.pending.resolve(response))
+
+    def test_resolve_ignores_other_responses(self):
+        """
+        Responses without an awaited frame id should be ignored
+        """
+        future = Future()
+        self.pending.allocate(future)
+
+        self.assertFalse(self.pending.resolve({'id': 'rx'}))
+        self.assertFalse(self.pending.resolve({'id': 'tx_status',
+                                               'frame_id': b'\x02'}))
+        self.assertFalse(future.done())
+
+    def test_resolve_checks_response_type(self):
+        """
+        A response of another type than the one awaited should not
+        resolve the future, even with the same frame id
+        """
+        future = Future()
+        self.pending.allocate(future, 'tx_status')
+
+        self.assertFalse(self.pending.resolve({'id': 'at_response',
+                                               'frame_id': b'\x01'}))
+        self.assertTrue(1 in self.pending)
+        self.assertTrue(self.pending.resolve({'id': 'tx_status',
+                                              'frame_id': b'\x01'}))
+
+    def test_hold(self):
+        """
+        A held frame id should not be allocated until its response
+        arrives or it is popped, and should not be held while awaited
+        """
+        token = self.pending.hold(1, 'at_response')
+        future = Future()
+        self.assertEqual(self.pending.allocate(future), 2)
+        self.assertIsNone(self.pending.hold(2))
+
+        self.assertFalse(self.pending.resolve({'id': 'at_response',
+                                               'frame_id': b'\x01'}))
+        self.assertFalse(1 in self.pending)
+        self.assertIsNone(self.pending.pop(1, token))
+
+    def test_hold_next(self):
+        """
+        hold_next() should hold a free frame id until it is popped with
+        its token
+        """
+        self.pending.allocate(Future())
+        frame_id, token = self.pending.hold_next('at_response')
+        self.assertEqual(frame_id, 2)
+        self.assertEqual(self.pending.allocate(Future()), 3)
+
+        self.assertIsNone(self.pending.pop(2, object()))
+        self.assertIs(self.pending.pop(2, token), token)
+        self.assertFalse(2 in self.pending)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#! /usr/bin/python
+"""
+test_receive.py
+
+Tests the bounded receive queue of xbee.backend.receive.
+"""
+import threading
+import time
+import unittest
+from xbee.backend.receive import ReceiveQueue
+
+
+class TestReceiveQueue(unittest.TestCase):
+    """
+    A full queue must apply its policy and count the frames it drops
+    """
+
+    def fill(self, queue, *names):
+        for index, name in enumerate(names):
+            queue.put(index, name)
+
+    def test_unbounded(self):
+        queue = ReceiveQueue()
+        self.fill(queue, *['rx'] * 100)
+        self.assertEqual(len(queue), 100)
+        self.assertFalse(queue.full())
+
+    def test_drop_oldest(self):
+        queue = ReceiveQueue(2, 'drop_oldest')
+        self.fill(queue, 'rx', 'tx_status', 'rx')
+
+        self.assertEqual([queue.take(), queue.take()], [1, 2])
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual(queue.dropped_types, {'rx': 1})
+
+    def test_drop_newest(self):
+        queue = ReceiveQueue(2, 'drop_newest')
+        self.fill(queue, 'rx', 'rx')
+        self.assertFalse(queue.put(2, 'tx_status'))
+
+        self.assertEqual([queue.take(), queue.take()], [0, 1])
+        self.assertEqual(queue.dropped_types, {'tx_status': 1})
+
+    def test_shed(self):
+        """
+        Frames of the shed types should be dropped first, whether they
+        are arriving or queued; others only when nothing can be shed
+        """
+        queue = ReceiveQueue(2, 'shed', shed=['rx_io_data_long_addr'])
+        self.fill(queue, 'tx_status', 'rx_io_data_long_addr')
+
+        self.assertFalse(queue.put(2, 'rx_io_data_long_addr'))
+        self.assertTrue(queue.put(3, 'tx_status'))
+        self.assertTrue(queue.put(4, 'tx_status'))
+
+        self.assertEqual([queue.take(), queue.take()], [3, 4])
+        self.assertEqual(queue.dropped, 3)
+        self.assertEqual(queue.dropped_types,
+                         {'rx_io_data_long_addr': 2, 'tx_status': 1})
+
+    def test_take_by_type(self):
+        queue = ReceiveQueue()
+        self.fill(queue, 'rx', 'tx_status', 'rx')
+
+        self.assertEqual(queue.take(('tx_status',)), 1)
+        self.assertIsNone(queue.take(('at_response',)))
+        self.assertEqual(len(queue), 2)
+
+    def test_partitions(self):
+        """
+        get() with a partition should skip frames put in other partitions
+        but return those put in none
+        """
+        queue = ReceiveQueue()
+        queue.put(0, 'rx', partition=1)
+        queue.put(1, 'rx', partition=0)
+        queue.put(2, 'tx_status')
+        queue.put(3, 'rx', partition=0)
+
+        self.assertEqual([queue.get(0), queue.get(0), queue.get(0)],
+                         [1, 2, 3])
+        self.assertEqual(queue.get(), 0)
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, ReceiveQueue, 1, 'drop_everything')
+        self.assertRaises(ValueError, ReceiveQueue, -1)
+        self.assertRaises(ValueError, ReceiveQueue, 1, 'shed')
+
+
+class TestBlockingReceiveQueue(unittest.TestCase):
+    """
+    Under the 'block' policy, put() must wait for room, and close() must
+    wake every waiting thread
+    """
+
+    def test_put_waits_for_room(self):
+        queue = ReceiveQueue(1)
+        queue.put(0, 'rx')
+
+        thread = threading.Thread(target=queue.put, args=(1, 'rx'))
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(len(queue), 1)
+
+        self.assertEqual(queue.get(), 0)
+        thread.join(1)
+        self.assertEqual(queue.get(), 1)
+        self.assertEqual(queue.dropped, 0)
+
+    def test_put_without_waiting(self):
+        queue = ReceiveQueue(1)
+        queue.put(0, 'rx')
+        self.assertTrue(queue.put(1, 'rx', wait=False))
+        self.assertEqual(len(queue), 2)
+
+    def test_close(self):
+        """
+        close() should make a waiting put() return False and a waiting
+        get() return None
+        """
+        full = ReceiveQueue(1)
+        full.put(0, 'rx')
+        empty = ReceiveQueue()
+        results = {}
+
+        threads = [threading.Thread(target=lambda: results.update(
+                       put=full.put(1, 'rx'))),
+                   threading.Thread(target=lambda: results.update(
+                       get=empty.get()))]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+
+        full.close()
+        empty.close()
+        for thread in threads:
+            thread.join(1)
+
+        self.assertEqual(results, {'put': False, 'get': None})
+        self.assertEqual(len(full), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#! /usr/bin/python
+"""
+test_response.py
+
+Tests the alternative response representations of xbee.backend.response.
+"""
+import unittest
+from xbee.backend.response import LazyResponse, ResponseRecord
+from xbee.thread.zigbee import ZigBee
+
+RX = b'\x90\x00\x13\xa2\x00@oG\xe4v\x1a\x01test'
+IO = b'\x92\x00\x13\xa2\x00@oG\xe4v\x1a\x01' + \
+    b'\x01\x08\x00\x0e\x08\x00\x00\x00\x02P\x02\x06'
+
+
+class TestLazyResponse(unittest.TestCase):
+    """
+    Lazy responses must behave like the dictionaries they replace
+    """
+
+    def setUp(self):
+        self.zigbee = ZigBee(None, response_format='lazy')
+        self.eager = ZigBee(None)
+
+    def test_lazy_response_returned(self):
+        """
+        _split_response must return a LazyResponse in lazy mode
+        """
+        info = self.zigbee._split_response(RX)
+        self.assertTrue(isinstance(info, LazyResponse))
+
+    def test_equal_to_dict(self):
+        """
+        a lazy response must compare equal to the eager dictionary
+        """
+        for data in (RX, IO):
+            self.assertEqual(self.zigbee._split_response(data),
+                             self.eager._split_response(data))
+
+    def test_dict_interface(self):
+        """
+        item access, 'in' and keys() must work
+        """
+        info = self.zigbee._split_response(RX)
+        self.assertEqual(info['id'], 'rx')
+        self.assertEqual(info['rf_data'], b'test')
+        self.assertTrue('source_addr_long' in info)
+        self.assertFalse('samples' in info)
+        self.assertEqual(list(info.keys()), ['id', 'source_addr_long',
+                                             'source_addr', 'options',
+                                             'rf_data'])
+
+    def test_fields_decoded_on_access(self):
+        """
+        parsing rules must only run when their field is read, once
+        """
+        calls = []
+        original = self.zigbee._parse_samples
+
+        def parse_samples(io_bytes):
+            calls.append(io_bytes)
+            return original(io_bytes)
+
+        self.zigbee._parse_samples = parse_samples
+        info = self.zigbee._split_response(IO)
+        self.assertEqual(calls, [])
+
+        info['samples']
+        info['samples']
+        self.assertEqual(len(calls), 1)
+
+    def test_bad_length_raises(self):
+        """
+        responses of the wrong length must still be rejected immediately
+        """
+        self.assertRaises(ValueError, self.zigbee._split_response,
+                          b'\x8B\x01')
+
+    def test_unknown_format(self):
+        """
+        an unknown response format must raise ValueError
+        """
+        self.assertRaises(ValueError, ZigBee, None, response_format='x')
+
+
+class TestResponseRecord(unittest.TestCase):
+    """
+    Response records must hold typed attributes and convert back to the
+    dictionaries they replace
+    """
+
+    def setUp(self):
+        self.zigbee = ZigBee(None, response_format='record')
+        self.eager = ZigBee(None)
+
+    def test_typed_attributes(self):
+        """
+        fixed fields must be integers; rf_data must stay binary
+        """
+        info = self.zigbee._split_response(RX)
+        self.assertTrue(isinstance(info, ResponseRecord))
+        self.assertEqual(info.id, 'rx')
+        self.assertEqual(info.source_addr_long, 0x0013a200406f47e4)
+        self.assertEqual(info.source_addr, 0x761a)
+        self.assertEqual(info.options, 1)
+        self.assertEqual(info.rf_data, b'test')
+
+    def test_no_instance_dict(self):
+        """
+        records must use slots rather than an instance dictionary
+        """
+        info = self.zigbee._split_response(RX)
+        self.assertFalse(hasattr(info, '__dict__'))
+
+    def test_to_dict(self):
+        """
+        to_dict() must return the default dictionary representation
+        """
+        for data in (RX, IO):
+            self.assertEqual(self.zigbee._split_response(data).to_dict(),
+                             self.eager._split_response(data))
+
+    def test_item_access(self):
+        """
+        item access must return binary data and omit missing fields
+        """
+        info = self.zigbee._split_response(RX[:12])
+        self.assertEqual(info['source_addr'], b'v\x1a')
+        self.assertEqual(info.rf_data, None)
+        self.assertFalse('rf_data' in info)
+        self.assertRaises(KeyError, lambda: info['rf_data'])
+
+    def test_parsing_rules_applied(self):
+        """
+        parsing rules must see binary data and replace the field
+        """
+        data = b'\x97A\x00\x13\xa2\x00@oG\xe4v\x1aIS\x00\x01\x1c\xc0' + \
+            b'\x06\x18\x00\x02\x8c\x03\x96'
+        info = self.zigbee._split_response(data)
+        self.assertEqual(info.command, b'IS')
+        self.assertEqual(info.parameter[0]['adc-1'], 652)
+
+
+if __name__ == '__main__':
+    unittest.main()
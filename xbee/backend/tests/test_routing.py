@@ -0,0 +1,170 @@
+#! /usr/bin/python
+"""
+test_routing.py
+
+Tests the routing state kept by xbee.backend.routing.
+"""
+import time
+import unittest
+from xbee.backend.routing import AddressCache, SourceRouteCache
+from xbee.thread.zigbee import ZigBee
+
+NODE = b'\x00\x13\xa2\x00@oG\xe4'
+RX = b'\x90' + NODE + b'v\x1a\x01test'
+
+
+class TestAddressCache(unittest.TestCase):
+    """
+    AddressCache must learn and forget 16-bit addresses
+    """
+
+    def setUp(self):
+        self.cache = AddressCache()
+        self.zigbee = ZigBee(None)
+
+    def tx_status(self, frame_id, dest_addr, deliver, discover=b'\x00'):
+        return self.zigbee._split_response(
+            b'\x8b' + frame_id + dest_addr + b'\x00' + deliver + discover)
+
+    def test_learn_from_rx(self):
+        """
+        The source addresses of received data should be learnt
+        """
+        self.cache.observe(self.zigbee._split_response(RX))
+        self.assertEqual(self.cache.lookup(NODE), b'v\x1a')
+
+    def test_learn_from_node_id_indicator(self):
+        """
+        Both the node and the sender of an identification should be
+        learnt
+        """
+        sender = b'\x00\x13\xa2\x00@oG\xe5'
+        self.cache.observe(self.zigbee._split_response(
+            b'\x95' + sender + b'\x12\x34\x02' + b'v\x1a' + NODE +
+            b'node\x00' + b'\xff\xfe\x01\x01\xc1\x05\x10\x1e'))
+
+        self.assertEqual(self.cache.lookup(NODE), b'v\x1a')
+        self.assertEqual(self.cache.lookup(sender), b'\x12\x34')
+
+    def test_broadcast_ignored(self):
+        """
+        Broadcast and unknown addresses should never be cached
+        """
+        self.cache.learn(b'\x00' * 6 + b'\xff\xff', b'\x12\x34')
+        self.cache.learn(NODE, b'\xff\xfe')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_rediscovered_address_replaced(self):
+        """
+        A tx_status showing the address was discovered again should
+        replace the cached address
+        """
+        self.cache.learn(NODE, b'v\x1a')
+        self.cache.sent(b'\x05', NODE)
+        self.cache.observe(self.tx_status(b'\x05', b'\x43\x21', b'\x00',
+                                          discover=b'\x01'))
+        self.assertEqual(self.cache.lookup(NODE), b'\x43\x21')
+
+    def test_address_not_found_forgotten(self):
+        """
+        A tx_status reporting the address could not be found should
+        remove the cached address
+        """
+        self.cache.learn(NODE, b'v\x1a')
+        self.cache.sent(b'\x05', NODE)
+        self.cache.observe(self.tx_status(b'\x05', b'\xff\xfe', b'\x24'))
+        self.assertFalse(NODE in self.cache)
+
+    def test_unrelated_tx_status_ignored(self):
+        """
+        A tx_status for a transmission not recorded with sent() should
+        change nothing
+        """
+        self.cache.learn(NODE, b'v\x1a')
+        self.cache.observe(self.tx_status(b'\x05', b'\x43\x21', b'\x00'))
+        self.assertEqual(self.cache.lookup(NODE), b'v\x1a')
+
+
+
+class TestSourceRouteCache(unittest.TestCase):
+    """
+    SourceRouteCache must keep a bounded set of recent routes
+    """
+
+    def setUp(self):
+        self.routes = SourceRouteCache(max_routes=2)
+        self.zigbee = ZigBee(None)
+
+    def node(self, n):
+        return b'\x00\x13\xa2\x00@oG' + bytes(bytearray([n]))
+
+    def test_learn_from_route_record(self):
+        """
+        The route in a route record indicator should be learnt
+        """
+        self.routes.observe(self.zigbee._split_response(
+            b'\xa1' + NODE + b'v\x1a\x01\x02\x12\x34\x56\x78'))
+        self.assertEqual(self.routes.route(NODE),
+                         (b'v\x1a', 2, b'\x12\x34\x56\x78'))
+
+    def test_direct_route_ignored(self):
+        """
+        Routes without relays need no source routing
+        """
+        self.routes.learn(NODE, b'v\x1a', 0, b'')
+        self.assertIsNone(self.routes.route(NODE))
+
+    def test_least_recently_used_evicted(self):
+        """
+        Once max_routes are kept, learning another route should evict
+        the least recently used one
+        """
+        self.routes.learn(self.node(1), b'\x00\x01', 1, b'\xaa\xaa')
+        self.routes.learn(self.node(2), b'\x00\x02', 1, b'\xaa\xaa')
+        self.routes.route(self.node(1))
+        self.routes.learn(self.node(3), b'\x00\x03', 1, b'\xaa\xaa')
+
+        self.assertTrue(self.node(1) in self.routes)
+        self.assertFalse(self.node(2) in self.routes)
+        self.assertTrue(self.node(3) in self.routes)
+
+    def test_expiry(self):
+        """
+        Routes older than max_age should not be used
+        """
+        routes = SourceRouteCache(max_age=0.01)
+        routes.learn(NODE, b'v\x1a', 1, b'\xaa\xaa')
+        time.sleep(0.02)
+
+        self.assertIsNone(routes.route(NODE))
+        self.assertEqual(len(routes), 0)
+
+    def test_failed_route_forgotten(self):
+        """
+        A tx_status showing a transmission along a route failed should
+        remove that route
+        """
+        self.routes.learn(NODE, b'v\x1a', 1, b'\xaa\xaa')
+        self.routes.sent(b'\x03', NODE)
+        self.routes.observe(self.zigbee._split_response(
+            b'\x8b\x03v\x1a\x00\x21\x00'))
+        self.assertFalse(NODE in self.routes)
+
+    def test_reused_frame_id_ignored(self):
+        """
+        A failure reported for a frame id sent to two nodes should not
+        remove either route
+        """
+        self.routes.learn(self.node(1), b'\x00\x01', 1, b'\xaa\xaa')
+        self.routes.learn(self.node(2), b'\x00\x02', 1, b'\xaa\xaa')
+        self.routes.sent(b'\x01', self.node(1))
+        self.routes.sent(b'\x01', self.node(2))
+        self.routes.observe(self.zigbee._split_response(
+            b'\x8b\x01\x00\x01\x00\x21\x00'))
+
+        self.assertTrue(self.node(1) in self.routes)
+        self.assertTrue(self.node(2) in self.routes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,9 @@ gdrapp@gmail.com
 This module implements an XBee ZB (ZigBee) API library.
 """
 import struct
-from xbee.python2to3 import byteToInt
+from xbee.backend.correlation import RESPONSE_TYPES
+from xbee.backend.routing import AddressCache, SourceRouteCache
+from xbee.python2to3 import byteToInt, intToByte
 
 
 class ZigBee(object):
@@ -17,6 +19,29 @@ class ZigBee(object):
     Provides an implementation of the XBee API for XBee ZB (ZigBee) modules
     with recent firmware.
 
+    In addition to the arguments of XBeeBase, the constructor accepts:
+
+        address_cache: True (or an AddressCache to share between devices)
+                 to learn the 16-bit network address of each node from
+                 received frames and fill it in as the dest_addr of 'tx',
+                 'tx_explicit' and 'remote_at' commands which give only a
+                 dest_addr_long, avoiding address discovery on every
+                 transmission (see xbee.backend.routing.AddressCache).
+                 The learnt addresses are available as address_cache.
+                 A tx_status is only learnt from if its frame id was not
+                 reused for another destination, as it is not when
+                 transmitting with await_response.
+
+        source_routes: True (or a SourceRouteCache, to choose its size and
+                 expiry) to remember the routes reported by route record
+                 indicator frames and send the route to a node with a
+                 'create_source_route' command before each 'tx',
+                 'tx_explicit' or 'remote_at' command to it, so that the
+                 network does not have to discover it (see
+                 xbee.backend.routing.SourceRouteCache). This is meant for
+                 use with many-to-one routing. The routes are available as
+                 source_routes.
+
     Commands may be sent to a device by instantiating this class with
     a serial port object (see PySerial) and then calling the send
     method with the proper information specified by the API. Data may
@@ -259,6 +284,9 @@ class ZigBee(object):
         }
     }
 
+    # Commands whose dest_addr may be filled in from the address cache
+    _addressed_commands = ('tx', 'tx_explicit', 'remote_at')
+
     def _parse_IS_at_response(self, packet_info):
         """
         If the given packet is a successful remote AT response for an IS
@@ -326,8 +354,90 @@ class ZigBee(object):
         """
         Call the super class constructor to save the serial port
         """
+        address_cache = kwargs.pop('address_cache', None)
+        if address_cache is True:
+            address_cache = AddressCache()
+        elif address_cache is False:
+            address_cache = None
+        self.address_cache = address_cache
+
+        source_routes = kwargs.pop('source_routes', None)
+        if source_routes is True:
+            source_routes = SourceRouteCache()
+        elif source_routes is False:
+            source_routes = None
+        self.source_routes = source_routes
+
         super(ZigBee, self).__init__(*args, **kwargs)
 
+    def send(self, cmd, **kwargs):
+        """
+        send: string param=binary data ... -> None or future
+
+        Sends the known source route to the destination of addressed
+        commands first, if source routing is enabled (see XBeeBase.send)
+        """
+        if self.source_routes is not None and \
+                cmd in self._addressed_commands and \
+                kwargs.get('dest_addr_long') is not None:
+            addr_long = kwargs['dest_addr_long']
+            route = self.source_routes.route(addr_long)
+            if route is not None:
+                addr, hop_count, addresses = route
+                super(ZigBee, self).send('create_source_route',
+                                         dest_addr_long=addr_long,
+                                         dest_addr=addr,
+                                         hop_count=intToByte(hop_count),
+                                         addresses=addresses)
+
+        return super(ZigBee, self).send(cmd, **kwargs)
+
+    def _build_command(self, cmd, **kwargs):
+        """
+        _build_command: string (binary data) ... -> binary data
+
+        Fills in the dest_addr of addressed commands from the address
+        cache, if enabled, and records them so that their tx_status can
+        update the address and route caches, before building them (see
+        XBeeBase._build_command)
+        """
+        caches = [cache for cache in (self.address_cache, self.source_routes)
+                  if cache is not None]
+
+        if caches and cmd in self._addressed_commands and \
+                kwargs.get('dest_addr_long') is not None:
+            addr_long = kwargs['dest_addr_long']
+
+            if self.address_cache is not None and \
+                    kwargs.get('dest_addr') is None:
+                addr = self.address_cache.lookup(addr_long)
+                if addr is not None:
+                    kwargs['dest_addr'] = addr
+
+            # Only transmissions are answered by a tx_status
+            if RESPONSE_TYPES.get(cmd) == 'tx_status':
+                frame_id = kwargs.get('frame_id')
+                if frame_id is None:
+                    frame_id = self.api_commands[cmd][1]['default']
+                for cache in caches:
+                    cache.sent(frame_id, addr_long)
+
+        return super(ZigBee, self)._build_command(cmd, **kwargs)
+
+    def _read_response(self, data):
+        """
+        _read_response: binary data -> response
+
+        Learns network addresses and routes from each response, if the
+        address or route caches are enabled (see XBeeBase._read_response)
+        """
+        info = super(ZigBee, self)._read_response(data)
+        if self.address_cache is not None:
+            self.address_cache.observe(info)
+        if self.source_routes is not None:
+            self.source_routes.observe(info)
+        return info
+
     def _parse_samples_header(self, io_bytes):
         """
         _parse_samples_header: binary data in XBee ZB IO data format ->
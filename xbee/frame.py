@@ -6,8 +6,9 @@ pmalmsten@gmail.com
 
 Represents an API frame for communicating with an XBee
 """
+import re
 import struct
-from xbee.python2to3 import byteToInt, intToByte
+from xbee.python2to3 import byteToInt, intToByte, byteSum
 
 
 class APIFrame:
@@ -36,16 +37,7 @@ class APIFrame:
         frame, saves the last byte of the result, and subtracts it from
         0xFF. The final result is the checksum
         """
-        total = 0
-
-        # Add together all bytes
-        for byte in self.data:
-            total += byteToInt(byte)
-
-        # Only keep the last byte
-        total = total & 0xFF
-
-        return intToByte(0xFF - total)
+        return intToByte(0xFF - (byteSum(self.data) & 0xFF))
 
     def verify(self, chksum):
         """
@@ -55,20 +47,24 @@ class APIFrame:
         determines whether the result is correct. The result should
         be 0xFF.
         """
-        total = 0
+        total = byteSum(self.data) + byteToInt(chksum)
+        return total & 0xFF == 0xFF
 
-        # Add together all bytes
-        for byte in self.data:
-            total += byteToInt(byte)
-
-        # Add checksum too
-        total += byteToInt(chksum)
-
-        # Only keep low bits
-        total &= 0xFF
+    @staticmethod
+    def verified_payload(raw, offset, length):
+        """
+        verified_payload: binary data, int, int -> binary data
 
-        # Check result
-        return total == 0xFF
+        verified_payload checksums the length bytes of payload found at
+        offset in raw together with the checksum byte which follows them,
+        in a single pass over a memoryview. If the result is correct the
+        payload is sliced out and returned; otherwise a ValueError is
+        raised.
+        """
+        end = offset + length
+        if byteSum(memoryview(raw)[offset:end + 1]) & 0xFF != 0xFF:
+            raise ValueError("Invalid checksum")
+        return raw[offset:end]
 
     def len_bytes(self):
         """
@@ -109,17 +105,47 @@ class APIFrame:
 
         When a 'special' byte is encountered in the given data string,
         it is preceded by an escape byte and XORed with 0x20.
+
+        Data which contains no special bytes is returned unchanged;
+        otherwise each special byte is replaced in a single C-level
+        pass. The escape byte itself is always replaced first so that
+        it is not escaped twice.
         """
+        if _ESCAPE_SEARCH(data) is None:
+            return data
 
-        escaped_data = b""
-        for byte in data:
-            if intToByte(byteToInt(byte)) in APIFrame.ESCAPE_BYTES:
-                escaped_data += APIFrame.ESCAPE_BYTE
-                escaped_data += intToByte(0x20 ^ byteToInt(byte))
-            else:
-                escaped_data += intToByte(byteToInt(byte))
+        if isinstance(data, memoryview):
+            data = data.tobytes()
 
-        return escaped_data
+        for byte, escaped in _ESCAPE_TABLE:
+            data = data.replace(byte, escaped)
+
+        return data
+
+    @staticmethod
+    def unescape(data):
+        """
+        unescape: byte string -> byte string
+
+        Reverses escape(): every escape byte is dropped and the byte
+        which follows it is XORed with 0x20. Data which contains no
+        escape byte is returned unchanged. A trailing escape byte,
+        whose partner has not been received yet, is left in place.
+        """
+        esc = data.find(APIFrame.ESCAPE_BYTE)
+        if esc < 0:
+            return data
+
+        parts = []
+        pos = 0
+        while 0 <= esc < len(data) - 1:
+            parts.append(data[pos:esc])
+            parts.append(_UNESCAPE_TABLE[byteToInt(data[esc + 1])])
+            pos = esc + 2
+            esc = data.find(APIFrame.ESCAPE_BYTE, pos)
+        parts.append(data[pos:])
+
+        return b''.join(parts)
 
     def fill(self, byte):
         """
@@ -171,11 +197,148 @@ class APIFrame:
         # Unpack it
         data_len = struct.unpack("> h", raw_len)[0]
 
-        # Read the data
-        data = self.raw_data[3:3 + data_len]
-        chksum = self.raw_data[-1]
+        # Read the data, checking it against the checksum which follows
+        self.data = APIFrame.verified_payload(self.raw_data, 3, data_len)
 
-        # Checksum check
-        self.data = data
-        if not self.verify(chksum):
-            raise ValueError("Invalid checksum")
+
+# (special byte, escaped replacement) pairs; the escape byte must be
+# replaced first since every replacement begins with it
+_ESCAPE_TABLE = tuple(
+    (byte, APIFrame.ESCAPE_BYTE + intToByte(0x20 ^ byteToInt(byte)))
+    for byte in (APIFrame.ESCAPE_BYTE, APIFrame.START_BYTE,
+                 APIFrame.XON_BYTE, APIFrame.XOFF_BYTE)
+)
+_ESCAPE_SEARCH = re.compile(
+    b'[' + b''.join(re.escape(b) for b in APIFrame.ESCAPE_BYTES) + b']'
+).search
+
+# Unescaped value of every byte which may follow an escape byte
+_UNESCAPE_TABLE = tuple(intToByte(i ^ 0x20) for i in range(256))
+
+
+class FrameDecoder(object):
+    """
+    Incrementally decodes API frames from a stream of raw bytes
+
+    Chunks of any size (bytes, bytearray or memoryview) are passed to
+    feed(), which returns an iterator over every complete frame whose
+    checksum is valid. Bytes belonging to a partial frame are kept in
+    a single growable buffer until the rest of the frame arrives.
+    Invalid and empty frames are silently discarded, just as they are
+    when frames are read one byte at a time through APIFrame.fill().
+
+    When zero_copy is True, the data of each decoded frame is a
+    memoryview into the decoder's receive buffer rather than a copy.
+    The decoder never modifies a buffer once it has handed out views
+    into it; instead, it moves any partial frame into a fresh buffer
+    on the next call to feed(). Frames whose payload contained escaped
+    bytes are necessarily copied while being unescaped.
+    """
+
+    def __init__(self, escaped=False, zero_copy=False):
+        self.escaped = escaped
+        self.zero_copy = zero_copy
+        self._buffer = bytearray()
+        self._pos = 0
+
+    def feed(self, buf):
+        """
+        feed: binary data -> iterator of APIFrame
+
+        Appends the given raw bytes to the receive buffer and returns an
+        iterator over the frames which could be completed. The bytes are
+        buffered immediately, even if the iterator is never consumed;
+        frames which are not consumed are returned by the next call.
+        """
+        if self.zero_copy:
+            # Views may still refer to the current buffer, so it must
+            # not be resized; carry the undecoded bytes over instead
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        elif self._pos:
+            # Drop bytes which have already been decoded before growing
+            del self._buffer[:self._pos]
+            self._pos = 0
+
+        if buf:
+            self._buffer += buf
+
+        return self._frames()
+
+    def _span(self, data, begin, count):
+        """
+        _span: buffer, int, int -> int
+
+        Returns the index just past the raw bytes which hold count
+        unescaped bytes starting at begin, or -1 if the buffer does not
+        contain enough bytes yet.
+        """
+        end = begin + count
+
+        if self.escaped:
+            pos = begin
+            while True:
+                esc = data.find(APIFrame.ESCAPE_BYTE, pos, end)
+                if esc < 0:
+                    break
+                # Each escape byte adds one raw byte to the field
+                end += 1
+                pos = esc + 2
+
+        if end > len(data):
+            return -1
+        return end
+
+    def _frames(self):
+        data = self._buffer
+        view = memoryview(data) if self.zero_copy else data
+
+        while True:
+            start = data.find(APIFrame.START_BYTE, self._pos)
+            if start < 0:
+                # Nothing but noise; none of it can start a frame
+                self._pos = len(data)
+                return
+
+            self._pos = start
+
+            # Two length bytes follow the start byte
+            header_end = self._span(data, start + 1, 2)
+            if header_end < 0:
+                return
+
+            header = data[start + 1:header_end]
+            if self.escaped:
+                header = bytearray(APIFrame.unescape(bytes(header)))
+            data_len = header[0] << 8 | header[1]
+
+            # Payload plus the trailing checksum byte
+            frame_end = self._span(data, header_end, data_len + 1)
+            if frame_end < 0:
+                return
+
+            if self.escaped and \
+                    data.find(APIFrame.ESCAPE_BYTE, header_end, frame_end) >= 0:
+                body = APIFrame.unescape(bytes(data[header_end:frame_end]))
+                if self.zero_copy:
+                    body = memoryview(body)
+            else:
+                body = view[header_end:frame_end]
+
+            try:
+                payload = APIFrame.verified_payload(body, 0, data_len)
+            except ValueError:
+                # Bad frame; resynchronize on the next start byte
+                self._pos = start + 1
+                continue
+
+            self._pos = frame_end
+
+            # Ignore empty frames
+            if data_len == 0:
+                continue
+
+            if not self.zero_copy:
+                payload = bytes(payload)
+
+            yield APIFrame(payload, self.escaped)
@@ -12,6 +12,18 @@ one arrives.
 from xbee.thread import XBee
 
 
+def _field(packet, name):
+    """
+    _field: XBee data dict, string -> binary data or None
+
+    Returns the named field of a packet, or None if it has none
+    """
+    try:
+        return packet[name]
+    except (KeyError, TypeError):
+        return None
+
+
 class Dispatch(object):
     def __init__(self, ser=None, xbee=None):
         self.xbee = None
@@ -23,10 +35,18 @@ class Dispatch(object):
         self.handlers = []
         self.names = set()
 
-    def register(self, name, callback, filter):
+        # Handlers by the packet id, source address or (packet id, source
+        # address) they require, and handlers which require neither; each
+        # list is in order of registration
+        self._by_id = {}
+        self._by_source = {}
+        self._by_id_source = {}
+        self._unindexed = []
+
+    def register(self, name, callback, filter=None, id=None, source=None):
         """
         register: string, function: string, data -> None,
-        function: data -> boolean -> None
+        function: data -> boolean, string, binary data -> None
 
         Register will save the given name, callback, and filter function
         for use when a packet arrives. When one arrives, the filter
@@ -34,16 +54,34 @@ class Dispatch(object):
         callback function. If the filter method returns true, the callback
         method will be called with its associated name string and the packet
         which triggered the call.
+
+        Instead of (or as well as) a filter function, the packet id (such
+        as 'rx') and the source address (64-bit or 16-bit) of the packets
+        a callback is for may be given. Handlers registered this way are
+        looked up by those values, so dispatching a packet costs the same
+        however many handlers for other packets are registered. Handlers
+        are always called in the order they were registered.
         """
         if name in self.names:
             raise ValueError("A callback has already been registered with \
                              the name '%s'" % name)
 
-        self.handlers.append({
+        handler = {
             'name': name,
             'callback': callback,
-            'filter': filter
-        })
+            'filter': filter,
+            'order': len(self.handlers)
+        }
+        self.handlers.append(handler)
+
+        if id is not None and source is not None:
+            self._by_id_source.setdefault((id, source), []).append(handler)
+        elif id is not None:
+            self._by_id.setdefault(id, []).append(handler)
+        elif source is not None:
+            self._by_source.setdefault(source, []).append(handler)
+        else:
+            self._unindexed.append(handler)
 
         self.names.add(name)
 
@@ -71,9 +109,30 @@ class Dispatch(object):
         When called, dispatch checks the given packet against each
         registered callback method and calls each callback whose filter
         function returns true.
+
+        Only the handlers registered for the packet's id and source
+        address, and those registered without either, are checked.
         """
-        for handler in self.handlers:
-            if handler['filter'](packet):
+        packet_id = _field(packet, 'id')
+        sources = [source for source in (_field(packet, 'source_addr_long'),
+                                         _field(packet, 'source_addr'))
+                   if source is not None]
+
+        matches = [self._by_id.get(packet_id)]
+        for source in sources:
+            matches.append(self._by_source.get(source))
+            matches.append(self._by_id_source.get((packet_id, source)))
+
+        handlers = self._unindexed
+        matches = [match for match in matches if match]
+        if matches:
+            matches.append(handlers)
+            handlers = sorted((handler for match in matches
+                               for handler in match),
+                              key=lambda handler: handler['order'])
+
+        for handler in handlers:
+            if handler['filter'] is None or handler['filter'](packet):
                 # Call the handler method with its associated
                 # name and the packet which passed its filter check
                 handler['callback'](handler['name'], packet)
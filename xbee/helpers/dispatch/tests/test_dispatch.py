@@ -79,6 +79,88 @@ class TestDispatch(unittest.TestCase):
                           "test", None, None)
 
 
+class TestIndexedDispatch(unittest.TestCase):
+    """
+    Handlers registered by packet id and source address must only be
+    called for matching packets, in registration order
+    """
+
+    def setUp(self):
+        self.dispatch = Dispatch()
+        self.calls = []
+        self.node = b'\x00\x13\xa2\x00@oG\xe4'
+
+    def register(self, name, **kwargs):
+        self.dispatch.register(
+            name, lambda name, packet: self.calls.append(name), **kwargs)
+
+    def rx(self, source_addr_long, source_addr=b'v\x1a'):
+        return {'id': 'rx', 'source_addr_long': source_addr_long,
+                'source_addr': source_addr, 'rf_data': b'hi'}
+
+    def test_register_by_id(self):
+        """
+        A handler for a packet id should only be called for packets
+        with that id
+        """
+        self.register('rx', id='rx')
+        self.register('status', id='tx_status')
+
+        self.dispatch.dispatch(self.rx(self.node))
+        self.assertEqual(self.calls, ['rx'])
+
+    def test_register_by_source(self):
+        """
+        A handler for a source address should be called for packets from
+        that source, by either address
+        """
+        self.register('long', source=self.node)
+        self.register('short', source=b'v\x1a')
+        self.register('other', source=b'\x00\x01')
+
+        self.dispatch.dispatch(self.rx(self.node))
+        self.assertEqual(self.calls, ['long', 'short'])
+
+    def test_register_by_id_and_source(self):
+        """
+        A handler for a packet id and source address should only be
+        called for packets matching both
+        """
+        self.register('both', id='rx', source=self.node)
+
+        self.dispatch.dispatch({'id': 'tx_status', 'frame_id': b'\x01'})
+        self.dispatch.dispatch(self.rx(b'\x00' * 8))
+        self.assertEqual(self.calls, [])
+
+        self.dispatch.dispatch(self.rx(self.node))
+        self.assertEqual(self.calls, ['both'])
+
+    def test_registration_order(self):
+        """
+        Indexed and filtered handlers should be called in the order they
+        were registered
+        """
+        self.register('first', filter=lambda packet: True)
+        self.register('second', id='rx')
+        self.register('third', source=self.node)
+        self.register('fourth', id='rx', source=self.node)
+        self.register('fifth')
+
+        self.dispatch.dispatch(self.rx(self.node))
+        self.assertEqual(self.calls,
+                         ['first', 'second', 'third', 'fourth', 'fifth'])
+
+    def test_filter_with_index(self):
+        """
+        A filter given with a packet id should also be satisfied
+        """
+        self.register('long', id='rx',
+                      filter=lambda packet: len(packet['rf_data']) > 10)
+
+        self.dispatch.dispatch(self.rx(self.node))
+        self.assertEqual(self.calls, [])
+
+
 class TestHeadlessDispatch(unittest.TestCase):
     """
     Tests Dispatch functionality when it is not constructed with a serial
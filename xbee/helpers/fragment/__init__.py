@@ -0,0 +1,2 @@
+from xbee.helpers.fragment.fragment import FragmentSender, Reassembler, \
+    FragmentException, max_payload
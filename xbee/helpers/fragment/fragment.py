@@ -0,0 +1,241 @@
+"""
+fragment.py
+
+Provides the FragmentSender and Reassembler classes, which carry
+messages larger than the maximum RF payload of an XBee device by
+splitting them into numbered fragments and joining them again at the
+receiving end.
+
+Each fragment is sent as the data of its own transmission, behind a
+four byte header: the message id (two bytes), the index of the
+fragment and the number of fragments in the message. Both ends must
+use this module for the data they exchange.
+"""
+from collections import OrderedDict
+import struct
+import threading
+import time
+from xbee.helpers.transmit import delivery_status
+
+# message id, fragment index, fragment count
+HEADER = struct.Struct('>HBB')
+
+MAX_FRAGMENTS = 255
+
+
+class FragmentException(Exception):
+    pass
+
+
+def max_payload(response):
+    """
+    max_payload: AT response -> int
+
+    Returns the maximum RF payload in bytes reported by the response to
+    an 'NP' AT command, for use as the max_payload of a FragmentSender
+    """
+    return struct.unpack_from('>H', response['parameter'])[0]
+
+
+class FragmentSender(object):
+    """
+    Sends messages of any length up to MAX_FRAGMENTS fragments
+
+    Fragments are transmitted through the given sender, which may be a
+    TransmitScheduler (so that the fragments of a message are pipelined
+    within its windows) or a ReliableSender (so that fragments are also
+    retransmitted when delivery fails).
+
+    Constructor arguments:
+        sender: the TransmitScheduler or ReliableSender to transmit each
+                fragment with.
+
+        max_payload: the maximum RF payload of the device in bytes,
+                including the fragment header (see max_payload()).
+    """
+
+    def __init__(self, sender, max_payload=84):
+        if max_payload <= HEADER.size:
+            raise ValueError("The maximum payload must be larger than the "
+                             "{} byte fragment header".format(HEADER.size))
+
+        self.sender = sender
+        self.max_payload = max_payload
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def fragments(self, data, msg_id):
+        """
+        fragments: binary data, int -> [binary data ...]
+
+        Splits a message into fragments, each with its header
+        """
+        size = self.max_payload - HEADER.size
+        count = max(1, (len(data) + size - 1) // size)
+        if count > MAX_FRAGMENTS:
+            raise ValueError("A message of {} bytes needs {} fragments; at "
+                             "most {} can be sent".format(len(data), count,
+                                                          MAX_FRAGMENTS))
+
+        return [HEADER.pack(msg_id, index, count) +
+                data[index * size:(index + 1) * size]
+                for index in range(count)]
+
+    def send(self, data, **kwargs):
+        """
+        send: binary data param=binary data ... -> future
+
+        Sends a message in fragments, giving each transmission the given
+        named arguments (such as dest_addr_long) besides its data.
+        Returns a future resolved with the list of the fragments' tx_status
+        responses once every fragment has been delivered, or failed with
+        a FragmentException (or the exception which prevented a fragment
+        from being sent) as soon as one has not.
+        """
+        with self._lock:
+            msg_id = self._next_id
+            self._next_id = (self._next_id + 1) & 0xFFFF
+
+        fragments = self.fragments(data, msg_id)
+        results = [None] * len(fragments)
+        finished = self.sender.xbee.create_future()
+        state = {'left': len(fragments)}
+
+        def delivered(index, sent):
+            try:
+                status = sent.result()
+            except Exception as e:
+                fail(e)
+                return
+
+            if delivery_status(status) != b'\x00':
+                fail(FragmentException(
+                    "Fragment {} of message {} was not delivered (status "
+                    "{!r})".format(index, msg_id, delivery_status(status))))
+                return
+
+            results[index] = status
+            with self._lock:
+                state['left'] -= 1
+                done = state['left'] == 0
+
+            if done:
+                finished.set_result(results)
+
+        def fail(error):
+            with self._lock:
+                first = state['left'] > 0
+                state['left'] = 0
+
+            if first:
+                finished.set_exception(error)
+
+        for index, fragment in enumerate(fragments):
+            fields = dict(kwargs)
+            fields['data'] = fragment
+            try:
+                sent = self.sender.send(**fields)
+            except Exception as e:
+                fail(e)
+                break
+
+            sent.add_done_callback(
+                lambda sent, index=index: delivered(index, sent))
+
+        return finished
+
+
+class Reassembler(object):
+    """
+    Joins the fragments of messages received from any number of sources
+
+    At most max_messages messages are reassembled at once; when another
+    begins, the one which began first is abandoned. A message whose
+    fragments have not all arrived within timeout seconds of its first
+    is abandoned too. Repeated fragments are ignored.
+
+    Constructor arguments:
+        max_messages: the number of partial messages kept at once.
+
+        timeout: seconds after which a partial message is abandoned.
+    """
+
+    def __init__(self, max_messages=16, timeout=30):
+        if max_messages < 1:
+            raise ValueError("At least one message must be kept")
+
+        self.max_messages = max_messages
+        self.timeout = timeout
+        # (source, message id) -> [fragments, fragments missing, time
+        # begun], in the order messages began
+        self._messages = OrderedDict()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def expire(self, now=None):
+        """
+        expire: float -> None
+
+        Abandons partial messages which began longer than timeout ago
+        """
+        if now is None:
+            now = time.time()
+
+        for key, message in list(self._messages.items()):
+            if now - message[2] <= self.timeout:
+                break
+            del self._messages[key]
+
+    def receive(self, packet):
+        """
+        receive: rx response -> (binary data, binary data) or None
+
+        Takes a received frame carrying a fragment (such as an 'rx'
+        frame) and, if it completes a message, returns the 64-bit
+        address of the message's source and the message. Returns None
+        for fragments of incomplete messages. Raises FragmentException
+        for data which is not a fragment.
+        """
+        data = packet['rf_data']
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+
+        if len(data) < HEADER.size:
+            raise FragmentException("Received {} bytes; too short for a "
+                                    "fragment".format(len(data)))
+
+        msg_id, index, count = HEADER.unpack_from(data)
+        if index >= count:
+            raise FragmentException("Received fragment {} of a message of "
+                                    "{}".format(index, count))
+
+        source = packet['source_addr_long']
+        body = data[HEADER.size:]
+
+        if count == 1:
+            return source, body
+
+        now = time.time()
+        self.expire(now)
+
+        key = (source, msg_id)
+        message = self._messages.get(key)
+        if message is None or len(message[0]) != count:
+            # A new message, or one with a reused id
+            self._messages.pop(key, None)
+            message = self._messages[key] = [[None] * count, count, now]
+
+            while len(self._messages) > self.max_messages:
+                self._messages.popitem(last=False)
+
+        fragments = message[0]
+        if fragments[index] is None:
+            fragments[index] = body
+            message[1] -= 1
+
+        if message[1]:
+            return None
+
+        del self._messages[key]
+        return source, b''.join(fragments)
@@ -0,0 +1,146 @@
+"""
+test_fragment.py
+
+Tests the fragmentation helpers.
+"""
+import unittest
+from xbee.helpers.fragment import FragmentSender, Reassembler, \
+    FragmentException, max_payload
+from xbee.helpers.transmit import TransmitScheduler
+from xbee.tests.fixtures import FakeZigBeeTestCase
+
+NODE = b'\x00\x13\xa2\x00@oG\xe4'
+OTHER = b'\x00\x13\xa2\x00@oG\xe5'
+
+
+def rx(source, data):
+    return {'id': 'rx', 'source_addr_long': source, 'rf_data': data}
+
+
+class TestFragmentSender(FakeZigBeeTestCase):
+    """
+    FragmentSender must split messages and report their delivery
+    """
+
+    def setUp(self):
+        super(TestFragmentSender, self).setUp()
+        self.scheduler = TransmitScheduler(self.zigbee, window=2,
+                                           destination_window=2)
+        self.sender = FragmentSender(self.scheduler, max_payload=8)
+
+    def test_fragments(self):
+        """
+        Messages should be split into numbered fragments which fit the
+        maximum payload
+        """
+        self.assertEqual(self.sender.fragments(b'abcdefghij', 7),
+                         [b'\x00\x07\x00\x03abcd', b'\x00\x07\x01\x03efgh',
+                          b'\x00\x07\x02\x03ij'])
+        self.assertEqual(self.sender.fragments(b'', 7), [b'\x00\x07\x00\x01'])
+        self.assertRaises(ValueError, self.sender.fragments, b'x' * 1021, 0)
+
+    def test_send_pipelined(self):
+        """
+        Fragments should be sent within the scheduler's window, and the
+        message reported delivered once all of them are
+        """
+        future = self.sender.send(b'abcdefghij', dest_addr_long=NODE)
+        self.assertEqual(self.sent_frame_id(), b'\x02')
+
+        self.acknowledge(b'\x01')
+        self.acknowledge(b'\x02')
+        self.assertEqual(self.sent_frame_id(), b'\x03')
+        self.assertFalse(future.done())
+
+        self.acknowledge(b'\x03')
+        self.assertEqual(len(future.result(0)), 3)
+
+    def test_send_failure(self):
+        """
+        A fragment which is not delivered should fail the message
+        """
+        future = self.sender.send(b'abcdefghij', dest_addr_long=NODE)
+        self.acknowledge(b'\x02', deliver_status=b'\x21')
+
+        self.assertRaises(FragmentException, future.result, 0)
+
+    def test_max_payload(self):
+        """
+        The maximum payload should be read from an NP response
+        """
+        self.assertEqual(max_payload({'parameter': b'\x00\x54'}), 84)
+
+
+class TestReassembler(unittest.TestCase):
+    """
+    Reassembler must join fragments per source and message
+    """
+
+    def setUp(self):
+        self.reassembler = Reassembler(max_messages=2)
+
+    def test_reassemble_out_of_order(self):
+        """
+        A message should be returned once all of its fragments arrive,
+        in whatever order
+        """
+        self.assertIsNone(self.reassembler.receive(
+            rx(NODE, b'\x00\x07\x01\x02efgh')))
+        self.assertIsNone(self.reassembler.receive(
+            rx(NODE, b'\x00\x07\x01\x02efgh')))
+        self.assertEqual(self.reassembler.receive(
+            rx(NODE, b'\x00\x07\x00\x02abcd')), (NODE, b'abcdefgh'))
+        self.assertEqual(len(self.reassembler), 0)
+
+    def test_single_fragment(self):
+        """
+        A message of one fragment should be returned at once
+        """
+        self.assertEqual(self.reassembler.receive(
+            rx(NODE, memoryview(b'\x00\x01\x00\x01hi'))), (NODE, b'hi'))
+
+    def test_sources_kept_apart(self):
+        """
+        Fragments with the same message id from different sources
+        should not be mixed
+        """
+        self.reassembler.receive(rx(NODE, b'\x00\x01\x00\x02ab'))
+        self.assertIsNone(self.reassembler.receive(
+            rx(OTHER, b'\x00\x01\x01\x02cd')))
+        self.assertEqual(self.reassembler.receive(
+            rx(OTHER, b'\x00\x01\x00\x02xy')), (OTHER, b'xycd'))
+
+    def test_bounded(self):
+        """
+        Beginning more than max_messages messages should abandon the
+        oldest
+        """
+        for msg_id in range(3):
+            self.reassembler.receive(
+                rx(NODE, bytes(bytearray([0, msg_id, 0, 2])) + b'ab'))
+
+        self.assertEqual(len(self.reassembler), 2)
+        self.assertIsNone(self.reassembler.receive(
+            rx(NODE, b'\x00\x00\x01\x02cd')))
+
+    def test_timeout(self):
+        """
+        Partial messages older than the timeout should be abandoned
+        """
+        self.reassembler.receive(rx(NODE, b'\x00\x01\x00\x02ab'))
+        self.reassembler.expire(now=self.reassembler._messages[
+            (NODE, 1)][2] + 31)
+        self.assertEqual(len(self.reassembler), 0)
+
+    def test_not_a_fragment(self):
+        """
+        Data which cannot be a fragment should be rejected
+        """
+        self.assertRaises(FragmentException, self.reassembler.receive,
+                          rx(NODE, b'\x00\x01'))
+        self.assertRaises(FragmentException, self.reassembler.receive,
+                          rx(NODE, b'\x00\x01\x02\x02ab'))
+
+
+if __name__ == '__main__':
+    unittest.main()
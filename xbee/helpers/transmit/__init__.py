@@ -0,0 +1,4 @@
+from xbee.helpers.transmit.transmit import TransmitScheduler, \
+    delivery_status
+from xbee.helpers.transmit.reliable import ReliableSender, \
+    DeliveryFailedException, RETRYABLE_STATUSES
@@ -0,0 +1,177 @@
+"""
+reliable.py
+
+Provides the ReliableSender class, which retransmits data whose
+delivery failed for a reason that may be temporary, backing off
+exponentially between attempts.
+"""
+import random
+import time
+from xbee.backend.base import TimeoutException
+from xbee.helpers.transmit.transmit import delivery_status
+
+# Delivery status codes (see delivery_status) of failures which may not
+# recur: MAC ACK failure, CCA/collision avoidance failure, indirect
+# message purged, network ACK failure, not joined to network, address
+# not found, route not found, broadcast relay not heard and the
+# resource errors.
+RETRYABLE_STATUSES = frozenset([b'\x01', b'\x02', b'\x03', b'\x21', b'\x22',
+                                b'\x24', b'\x25', b'\x26', b'\x2c', b'\x31',
+                                b'\x32'])
+
+
+class DeliveryFailedException(Exception):
+    """
+    Raised through the future of a message which could not be delivered.
+    status is the last tx_status response received for it (None if its
+    last attempt was never acknowledged) and attempts is the number of
+    times it was transmitted.
+    """
+
+    def __init__(self, message, status=None, attempts=0):
+        super(DeliveryFailedException, self).__init__(message)
+        self.status = status
+        self.attempts = attempts
+
+
+class ReliableSender(object):
+    """
+    Transmits messages, retrying those whose delivery fails
+
+    A message is retransmitted when its tx_status response reports a
+    delivery status in retryable, or when no tx_status response arrives
+    within response_timeout. Before each retry, it waits for a delay
+    which starts at initial_delay and is multiplied by multiplier after
+    every attempt, up to max_delay. Up to the fraction jitter of each
+    delay is randomly taken off, so that senders which failed together
+    do not retry together. A message is given up on after max_attempts
+    transmissions, or when retrying it would take longer than max_time
+    seconds from when it was first sent.
+
+    The XBee instance must be reading responses, either with a callback
+    or through calls to wait_read_frame(), for transmissions to be
+    acknowledged.
+
+    Constructor arguments:
+        xbee:   The XBee instance (of any backend) to transmit with.
+
+        scheduler: optional TransmitScheduler to send every attempt
+                through, so that retries are subject to its windows.
+                Its command and response timeout are used instead of
+                command and response_timeout.
+
+        command, response_timeout: the command used to transmit ('tx'
+                by default), and the seconds to wait for each tx_status
+                response.
+
+        The remaining arguments control retrying as described above.
+    """
+
+    def __init__(self, xbee, max_attempts=5, max_time=None, initial_delay=0.1,
+                 max_delay=5.0, multiplier=2.0, jitter=0.5,
+                 retryable=RETRYABLE_STATUSES, scheduler=None, command='tx',
+                 response_timeout=5.0):
+        if max_attempts < 1:
+            raise ValueError("At least one attempt must be allowed")
+        if not 0 <= jitter <= 1:
+            raise ValueError("Jitter must be between 0 and 1")
+
+        self.xbee = xbee
+        self.max_attempts = max_attempts
+        self.max_time = max_time
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retryable = retryable
+        self.scheduler = scheduler
+        self.command = command
+        self.response_timeout = response_timeout
+
+    def backoff(self, attempts):
+        """
+        backoff: int -> float
+
+        Returns the number of seconds to wait before retrying a message
+        which has been transmitted the given number of times
+        """
+        delay = min(self.max_delay,
+                    self.initial_delay * self.multiplier ** (attempts - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def send(self, **kwargs):
+        """
+        send: param=binary data ... -> future
+
+        Transmits a message with the given named arguments, as would be
+        given to XBee.send() with this sender's command, retrying it as
+        needed. Returns a future resolved with the tx_status response
+        reporting its delivery, or failed with a DeliveryFailedException
+        once it has been given up on. A message which cannot be built or
+        sent at all fails with the exception raised when sending it.
+        """
+        future = self.xbee.create_future()
+        state = {'attempts': 0, 'deadline': None}
+        if self.max_time is not None:
+            state['deadline'] = time.time() + self.max_time
+
+        def attempt():
+            state['attempts'] += 1
+            try:
+                sent = self._transmit(dict(kwargs))
+            except Exception as e:
+                future.set_exception(e)
+                return
+
+            sent.add_done_callback(acknowledged)
+
+        def acknowledged(sent):
+            attempts = state['attempts']
+            try:
+                status = sent.result()
+            except TimeoutException:
+                status = None
+            except Exception as e:
+                future.set_exception(e)
+                return
+
+            if status is not None:
+                code = delivery_status(status)
+                if code == b'\x00':
+                    future.set_result(status)
+                    return
+
+                if code not in self.retryable:
+                    future.set_exception(DeliveryFailedException(
+                        "Delivery failed with status {!r}".format(code),
+                        status, attempts))
+                    return
+
+            delay = self.backoff(attempts)
+            deadline = state['deadline']
+
+            if attempts >= self.max_attempts or \
+                    (deadline is not None and time.time() + delay > deadline):
+                future.set_exception(DeliveryFailedException(
+                    "Delivery failed after {} attempts".format(attempts),
+                    status, attempts))
+                return
+
+            self.xbee.call_later(delay, attempt)
+
+        attempt()
+        return future
+
+    def _transmit(self, kwargs):
+        """
+        _transmit: {string: binary data} -> future
+
+        Transmits a message once, returning a future resolved with its
+        tx_status response
+        """
+        if self.scheduler is not None:
+            return self.scheduler.send(**kwargs)
+
+        return self.xbee.send(self.command, await_response=True,
+                              response_timeout=self.response_timeout,
+                              **kwargs)
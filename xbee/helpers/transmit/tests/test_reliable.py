@@ -0,0 +1,108 @@
+"""
+test_reliable.py
+
+Tests the ReliableSender helper.
+"""
+import time
+import unittest
+from xbee.helpers.transmit import ReliableSender, TransmitScheduler, \
+    DeliveryFailedException
+from xbee.tests.fixtures import FakeZigBeeTestCase
+
+NODE = b'\x00\x13\xa2\x00@oG\xe4'
+
+
+class TestReliableSender(FakeZigBeeTestCase):
+    """
+    ReliableSender must retry temporary delivery failures only
+    """
+
+    def wait_sent(self, frame_id):
+        deadline = time.time() + 1
+        while self.sent_frame_id() != frame_id and time.time() < deadline:
+            time.sleep(0.001)
+        self.assertEqual(self.sent_frame_id(), frame_id)
+
+    def test_retry_until_delivered(self):
+        """
+        A retryable failure should be retransmitted with a new frame id
+        """
+        sender = ReliableSender(self.zigbee, initial_delay=0.01, jitter=0)
+        future = sender.send(dest_addr_long=NODE, data=b'hello')
+
+        self.acknowledge(b'\x01', deliver_status=b'\x21')
+        self.wait_sent(b'\x02')
+        self.assertFalse(future.done())
+
+        self.acknowledge(b'\x02')
+        self.assertEqual(future.result(0)['frame_id'], b'\x02')
+
+    def test_fatal_status(self):
+        """
+        A failure which would recur should not be retried
+        """
+        sender = ReliableSender(self.zigbee, initial_delay=0.01)
+        future = sender.send(dest_addr_long=NODE, data=b'hello')
+
+        self.acknowledge(b'\x01', deliver_status=b'\x74')
+        error = future.exception(0)
+        self.assertTrue(isinstance(error, DeliveryFailedException))
+        self.assertEqual(error.attempts, 1)
+        self.assertEqual(error.status['deliver_status'], b'\x74')
+        self.assertEqual(self.sent_frame_id(), b'\x01')
+
+    def test_max_attempts(self):
+        """
+        A message should be given up on after max_attempts, including
+        attempts which were never acknowledged
+        """
+        sender = ReliableSender(self.zigbee, max_attempts=2,
+                                initial_delay=0.01, response_timeout=0.01)
+        future = sender.send(dest_addr_long=NODE, data=b'hello')
+
+        error = future.exception(1)
+        self.assertTrue(isinstance(error, DeliveryFailedException))
+        self.assertEqual(error.attempts, 2)
+        self.assertIsNone(error.status)
+        self.assertEqual(self.sent_frame_id(), b'\x02')
+
+    def test_max_time(self):
+        """
+        A retry which would end after max_time should not be made
+        """
+        sender = ReliableSender(self.zigbee, max_time=0.05,
+                                initial_delay=1, jitter=0)
+        future = sender.send(dest_addr_long=NODE, data=b'hello')
+
+        self.acknowledge(b'\x01', deliver_status=b'\x25')
+        self.assertEqual(future.exception(0).attempts, 1)
+
+    def test_through_scheduler(self):
+        """
+        Attempts should be sent through a given TransmitScheduler
+        """
+        scheduler = TransmitScheduler(self.zigbee, window=1)
+        sender = ReliableSender(self.zigbee, scheduler=scheduler)
+        future = sender.send(dest_addr_long=NODE, data=b'hello')
+
+        self.assertEqual(scheduler.in_flight, 1)
+        self.acknowledge(b'\x01')
+        self.assertEqual(future.result(0)['deliver_status'], b'\x00')
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_backoff(self):
+        """
+        Delays should grow exponentially up to max_delay, less jitter
+        """
+        sender = ReliableSender(self.zigbee, initial_delay=0.1,
+                                max_delay=0.5, jitter=0)
+        self.assertEqual([sender.backoff(n) for n in range(1, 5)],
+                         [0.1, 0.2, 0.4, 0.5])
+
+        sender.jitter = 0.5
+        for i in range(20):
+            self.assertTrue(0.2 <= sender.backoff(3) <= 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
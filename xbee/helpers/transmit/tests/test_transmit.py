@@ -0,0 +1,111 @@
+"""
+test_transmit.py
+
+Tests the TransmitScheduler helper.
+"""
+import unittest
+from xbee.backend.base import TimeoutException
+from xbee.helpers.transmit import TransmitScheduler, delivery_status
+from xbee.tests.fixtures import FakeZigBeeTestCase
+from xbee.thread import XBee, ZigBee
+
+NODE_A = b'\x00\x13\xa2\x00@oG\xe4'
+NODE_B = b'\x00\x13\xa2\x00@oG\xe5'
+
+
+class TestTransmitScheduler(FakeZigBeeTestCase):
+    """
+    TransmitScheduler must hold transmissions back until earlier ones
+    are acknowledged
+    """
+
+    def test_destination_window(self):
+        """
+        Only destination_window transmissions to one destination should
+        await acknowledgement at once, while others may proceed
+        """
+        scheduler = TransmitScheduler(self.zigbee, window=4,
+                                      destination_window=1)
+        first = scheduler.send(dest_addr_long=NODE_A, data=b'1')
+        second = scheduler.send(dest_addr_long=NODE_A, data=b'2')
+        other = scheduler.send(dest_addr_long=NODE_B, data=b'3')
+
+        self.assertEqual(self.sent_frame_id(), b'\x02')
+        self.assertEqual(scheduler.in_flight, 2)
+        self.assertEqual(scheduler.queued, 1)
+
+        self.acknowledge(b'\x01')
+        self.assertEqual(first.result(0)['deliver_status'], b'\x00')
+        self.assertEqual(self.sent_frame_id(), b'\x03')
+        self.assertEqual(self.sent_data(), b'2')
+        self.assertFalse(second.done())
+        self.assertFalse(other.done())
+
+    def test_global_window(self):
+        """
+        Only window transmissions should await acknowledgement at once,
+        with the rest sent in turn as the window opens
+        """
+        scheduler = TransmitScheduler(self.zigbee, window=2,
+                                      destination_window=2)
+        futures = [scheduler.send(dest_addr_long=NODE_A, data=b'a'),
+                   scheduler.send(dest_addr_long=NODE_A, data=b'b'),
+                   scheduler.send(dest_addr_long=NODE_A, data=b'c'),
+                   scheduler.send(dest_addr_long=NODE_B, data=b'd')]
+
+        self.assertEqual(self.sent_frame_id(), b'\x02')
+
+        self.acknowledge(b'\x02')
+        self.assertEqual(self.sent_frame_id(), b'\x03')
+        self.assertEqual(self.sent_data(), b'c')
+
+        self.acknowledge(b'\x01', deliver_status=b'\x24')
+        self.assertEqual(delivery_status(futures[0].result(0)), b'\x24')
+        self.assertEqual(self.sent_data(), b'd')
+        self.assertEqual(self.sent_frame_id(), b'\x04')
+
+    def test_timeout_releases_window(self):
+        """
+        A transmission which is never acknowledged should fail once its
+        timeout passes and let the next one be sent
+        """
+        scheduler = TransmitScheduler(self.zigbee, window=1,
+                                      response_timeout=0.01)
+        first = scheduler.send(dest_addr_long=NODE_A, data=b'1')
+        second = scheduler.send(dest_addr_long=NODE_B, data=b'2')
+
+        self.assertRaises(TimeoutException, first.result, 1)
+        self.assertRaises(TimeoutException, second.result, 1)
+        self.assertEqual(self.sent_frame_id(), b'\x02')
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_send_error(self):
+        """
+        A transmission which cannot be built should fail without using
+        up the window
+        """
+        scheduler = TransmitScheduler(self.zigbee, window=1)
+        future = scheduler.send(dest_addr_long=b'\x00', data=b'1')
+
+        self.assertRaises(ValueError, future.result, 0)
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+class TestDeliveryStatus(unittest.TestCase):
+    """
+    delivery_status must find the status of each kind of tx_status
+    """
+
+    def test_ieee(self):
+        xbee = XBee(None)
+        status = xbee._split_response(b'\x89\x01\x02')
+        self.assertEqual(delivery_status(status), b'\x02')
+
+    def test_zigbee(self):
+        zigbee = ZigBee(None)
+        status = zigbee._split_response(b'\x8b\x01\xff\xfe\x00\x21\x00')
+        self.assertEqual(delivery_status(status), b'\x21')
+
+
+if __name__ == '__main__':
+    unittest.main()
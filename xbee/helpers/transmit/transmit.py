@@ -0,0 +1,210 @@
+"""
+transmit.py
+
+Provides the TransmitScheduler class, which limits the number of
+transmissions from an XBee device which are awaiting a tx_status
+response, so that data can be sent as fast as the device can deliver
+it without overrunning its buffers.
+"""
+from collections import deque, OrderedDict
+import threading
+
+
+def delivery_status(status):
+    """
+    delivery_status: tx_status response -> binary data
+
+    Returns the delivery status byte of a tx_status response; b'\\x00'
+    means success. ZigBee and DigiMesh devices report it as
+    'deliver_status', 802.15.4 devices as 'status'.
+    """
+    if 'deliver_status' in status:
+        return status['deliver_status']
+    return status['status']
+
+
+class TransmitScheduler(object):
+    """
+    Queues transmissions and sends them as earlier ones are acknowledged
+
+    At most window transmissions are awaiting a tx_status response from
+    the device at once, and at most destination_window of those are to
+    any one destination. Further transmissions are queued and sent as
+    tx_status responses arrive (or time out), taking turns between
+    destinations.
+
+    The XBee instance must be reading responses, either with a callback
+    or through calls to wait_read_frame(), for transmissions to be
+    acknowledged.
+
+    Constructor arguments:
+        xbee:   The XBee instance (of any backend) to transmit with.
+
+        window: the number of transmissions which may await a tx_status
+                response at once.
+
+        destination_window: the number of transmissions to a single
+                destination which may await a tx_status response at once.
+
+        command: the command used to transmit; 'tx' by default.
+
+        response_timeout: seconds to wait for each tx_status response
+                before giving up on it; None to wait forever.
+    """
+
+    def __init__(self, xbee, window=4, destination_window=1, command='tx',
+                 response_timeout=None):
+        if window < 1 or destination_window < 1:
+            raise ValueError("Transmit windows must be at least 1")
+
+        self.xbee = xbee
+        self.window = window
+        self.destination_window = destination_window
+        self.command = command
+        self.response_timeout = response_timeout
+
+        self._lock = threading.Lock()
+        # destination -> deque of (arguments, future) waiting to be sent,
+        # in the order destinations take turns
+        self._queues = OrderedDict()
+        # destination -> number of transmissions awaiting tx_status
+        self._in_flight = {}
+        self._in_flight_total = 0
+
+    @property
+    def in_flight(self):
+        """
+        The number of transmissions awaiting a tx_status response
+        """
+        return self._in_flight_total
+
+    @property
+    def queued(self):
+        """
+        The number of transmissions waiting to be sent
+        """
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def send(self, **kwargs):
+        """
+        send: param=binary data ... -> future
+
+        Queues a transmission with the given named arguments, as would
+        be given to XBee.send() with this scheduler's command, and sends
+        it as soon as the windows allow. Returns a future resolved with
+        the tx_status response (see delivery_status) once the device
+        has acknowledged the transmission, or failed with the exception
+        which prevented it from being sent or acknowledged.
+        """
+        future = self.xbee.create_future()
+        destination = self._destination(kwargs)
+
+        with self._lock:
+            queue = self._queues.get(destination)
+            if queue is None:
+                queue = self._queues[destination] = deque()
+            queue.append((kwargs, future))
+
+        self._pump()
+        return future
+
+    def _destination(self, kwargs):
+        """
+        _destination: {string: binary data} -> binary data
+
+        Returns the address which identifies the destination of a
+        transmission for the per-destination window
+        """
+        destination = kwargs.get('dest_addr_long')
+        if destination is None:
+            destination = kwargs.get('dest_addr')
+        return destination
+
+    def _take(self):
+        """
+        _take: None -> (binary data, dictionary, future) or None
+
+        Removes and returns the next transmission which the windows
+        allow to be sent, counting it as in flight. Must be called with
+        the lock held.
+        """
+        if self._in_flight_total >= self.window:
+            return None
+
+        for destination, queue in self._queues.items():
+            in_flight = self._in_flight.get(destination, 0)
+            if in_flight < self.destination_window:
+                break
+        else:
+            return None
+
+        kwargs, future = queue.popleft()
+
+        # Destinations take turns, so move this one to the back
+        del self._queues[destination]
+        if queue:
+            self._queues[destination] = queue
+
+        self._in_flight[destination] = in_flight + 1
+        self._in_flight_total += 1
+        return destination, kwargs, future
+
+    def _pump(self):
+        """
+        _pump: None -> None
+
+        Sends every queued transmission which the windows allow
+        """
+        while True:
+            with self._lock:
+                item = self._take()
+
+            if item is None:
+                return
+
+            destination, kwargs, future = item
+            try:
+                sent = self.xbee.send(self.command, await_response=True,
+                                      response_timeout=self.response_timeout,
+                                      **kwargs)
+            except Exception as e:
+                self._settle(destination)
+                future.set_exception(e)
+                continue
+
+            sent.add_done_callback(
+                lambda sent, destination=destination, future=future:
+                self._acknowledged(destination, future, sent))
+
+    def _acknowledged(self, destination, future, sent):
+        """
+        _acknowledged: binary data, future, future -> None
+
+        Passes on the outcome of a transmission and sends whatever its
+        acknowledgement allows
+        """
+        self._settle(destination)
+
+        try:
+            status = sent.result()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(status)
+
+        self._pump()
+
+    def _settle(self, destination):
+        """
+        _settle: binary data -> None
+
+        Stops counting a transmission to the given destination as in
+        flight
+        """
+        with self._lock:
+            self._in_flight_total -= 1
+            if self._in_flight[destination] == 1:
+                del self._in_flight[destination]
+            else:
+                self._in_flight[destination] -= 1
@@ -32,4 +32,15 @@ def stringToBytes(s):
 
     Converts a string into an appropriate bytes object
     """
-    return s.encode('ascii') if sys.version_info >= (3, 0) else s
\ No newline at end of file
+    return s.encode('ascii') if sys.version_info >= (3, 0) else s
+
+def byteSum(data):
+    """
+    binary data -> int
+
+    Adds together the values of all bytes in the given bytes, bytearray
+    or memoryview object without looping over them in Python.
+    """
+    if sys.version_info >= (3, 0):
+        return sum(data)
+    return sum(bytearray(data))
@@ -0,0 +1,56 @@
+"""
+fixtures.py
+
+Test cases shared by the tests of the helpers.
+"""
+import unittest
+from xbee.frame import APIFrame
+from xbee.tests.Fake import Serial
+from xbee.thread import ZigBee
+
+
+class FakeZigBeeTestCase(unittest.TestCase):
+    """
+    Connects a thread ZigBee instance to a fake serial device, on which
+    the helper under test sends transmit requests and tx_status frames
+    acknowledge them
+    """
+
+    def setUp(self):
+        self.device = Serial()
+        self.zigbee = ZigBee(self.device)
+
+    def tearDown(self):
+        self.zigbee.halt()
+
+    def acknowledge(self, frame_id, deliver_status=b'\x00'):
+        """
+        acknowledge: binary data, binary data -> None
+
+        Receives a tx_status for the given frame id with the given
+        delivery status
+        """
+        self.device.set_read_data(APIFrame(
+            b'\x8b' + frame_id + b'\xff\xfe\x00' + deliver_status +
+            b'\x00').output())
+        self.zigbee.wait_read_frame()
+
+    def sent_frame_id(self):
+        """
+        sent_frame_id: None -> binary data or None
+
+        Returns the frame id of the last frame written to the device, or
+        None if nothing has been written. Frame ids are allocated from 1
+        in turn, so this is also the number of frames sent.
+        """
+        data = self.device.get_data_written()
+        return data[4:5] if data else None
+
+    def sent_data(self):
+        """
+        sent_data: None -> binary data
+
+        Returns the last byte of the RF data of the last frame written
+        to the device
+        """
+        return self.device.get_data_written()[-2:-1]
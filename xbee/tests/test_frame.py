@@ -8,7 +8,7 @@ pmalmsten@gmail.com
 Tests frame module for proper behavior
 """
 import unittest
-from xbee.frame import APIFrame
+from xbee.frame import APIFrame, FrameDecoder
 from xbee.python2to3 import byteToInt, intToByte
 
 
@@ -81,6 +81,33 @@ class TestAPIFrameParsing(unittest.TestCase):
         self.assertRaises(ValueError, api_frame.parse)
 
 
+class TestAPIFrameChecksum(unittest.TestCase):
+    """
+    APIFrame must compute and verify checksums over whole buffers
+    """
+
+    def test_checksum_memoryview(self):
+        """
+        checksum() must accept memoryview data
+        """
+        frame = APIFrame(memoryview(b'\x08\x01MY'))
+        self.assertEqual(frame.checksum(), b'P')
+
+    def test_verified_payload(self):
+        """
+        verified_payload() must return the payload of a valid frame
+        """
+        raw = b'\x7E\x00\x04\x08\x01MYP'
+        self.assertEqual(APIFrame.verified_payload(raw, 3, 4), b'\x08\x01MY')
+
+    def test_verified_payload_invalid(self):
+        """
+        verified_payload() must raise ValueError on a bad checksum
+        """
+        raw = b'\x7E\x00\x04\x08\x01MYQ'
+        self.assertRaises(ValueError, APIFrame.verified_payload, raw, 3, 4)
+
+
 class TestEscaping(unittest.TestCase):
     """
     APIFrame class must properly escape and unescape data
@@ -94,6 +121,29 @@ class TestEscaping(unittest.TestCase):
         new_data = APIFrame.escape(test_data)
         self.assertEqual(new_data, APIFrame.ESCAPE_BYTE + b'\x5e')
 
+    def test_escape_all_special_bytes(self):
+        """
+        APIFrame.escape() must escape every special byte exactly once
+        """
+        test_data = b'\x7E\x01\x7D\x11\x13'
+        new_data = APIFrame.escape(test_data)
+        self.assertEqual(new_data, b'\x7D\x5E\x01\x7D\x5D\x7D\x31\x7D\x33')
+
+    def test_escape_without_special_bytes(self):
+        """
+        APIFrame.escape() must return data without special bytes unchanged
+        """
+        test_data = b'\x00\x01\x02'
+        self.assertTrue(APIFrame.escape(test_data) is test_data)
+
+    def test_unescape_method(self):
+        """
+        APIFrame.unescape() must reverse APIFrame.escape()
+        """
+        test_data = b'\x7E\x01\x7D\x11\x13\xFF'
+        new_data = APIFrame.unescape(APIFrame.escape(test_data))
+        self.assertEqual(new_data, test_data)
+
     def test_unescape_input(self):
         """
         APIFrame must properly unescape escaped input
@@ -105,3 +155,123 @@ class TestEscaping(unittest.TestCase):
         for byte in [test_data[x:x+1] for x in range(0, len(test_data))]:
             frame.fill(byte)
         self.assertEqual(frame.raw_data, expected_data)
+
+
+class TestFrameDecoder(unittest.TestCase):
+    """
+    FrameDecoder must extract complete frames from arbitrary chunks
+    of raw data
+    """
+
+    def test_single_frame(self):
+        """
+        a whole frame in one chunk is decoded
+        """
+        decoder = FrameDecoder()
+        frames = list(decoder.feed(b'\x7E\x00\x01\x00\xFF'))
+
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0].data, b'\x00')
+
+    def test_many_frames_in_one_chunk(self):
+        """
+        every complete frame in a chunk is decoded, in order
+        """
+        decoder = FrameDecoder()
+        data = APIFrame(b'\x01\x02').output() + APIFrame(b'\x03').output()
+
+        frames = [f.data for f in decoder.feed(data)]
+        self.assertEqual(frames, [b'\x01\x02', b'\x03'])
+
+    def test_frame_split_across_chunks(self):
+        """
+        partial frames are kept until the rest of the frame arrives
+        """
+        decoder = FrameDecoder()
+        data = APIFrame(b'\x88DMY\x01ABCDEF').output()
+
+        for byte in [data[x:x+1] for x in range(0, len(data) - 1)]:
+            self.assertEqual(list(decoder.feed(byte)), [])
+
+        frames = list(decoder.feed(bytearray(data[-1:])))
+        self.assertEqual(frames[0].data, b'\x88DMY\x01ABCDEF')
+
+    def test_memoryview_chunk(self):
+        """
+        memoryview chunks are accepted
+        """
+        decoder = FrameDecoder()
+        data = memoryview(b'\x00\x00' + APIFrame(b'\x05').output())
+
+        frames = list(decoder.feed(data))
+        self.assertEqual(frames[0].data, b'\x05')
+
+    def test_invalid_followed_by_valid(self):
+        """
+        frames with a bad checksum are skipped
+        """
+        decoder = FrameDecoder()
+        data = b'\x7E\x00\x01\x00\xFA' + b'\x7E\x00\x01\x05\xFA'
+
+        frames = list(decoder.feed(data))
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0].data, b'\x05')
+
+    def test_empty_frame_ignored(self):
+        """
+        empty frames are not returned
+        """
+        decoder = FrameDecoder()
+        data = b'\x7E\x00\x00\xFF' + b'\x7E\x00\x01\x05\xFA'
+
+        frames = [f.data for f in decoder.feed(data)]
+        self.assertEqual(frames, [b'\x05'])
+
+    def test_unconsumed_frames_kept(self):
+        """
+        frames which were not iterated over are returned by the next call
+        """
+        decoder = FrameDecoder()
+        decoder.feed(APIFrame(b'\x01').output())
+
+        frames = [f.data for f in decoder.feed(APIFrame(b'\x02').output())]
+        self.assertEqual(frames, [b'\x01', b'\x02'])
+
+    def test_escaped_split_inside_escape(self):
+        """
+        escaped frames are decoded even when a chunk ends between an
+        escape byte and the byte it escapes
+        """
+        decoder = FrameDecoder(escaped=True)
+        data = b'\x7E\x00\x04\x7D\x5E\x7D\x5D\x7D\x31\x7D\x33\xE0'
+
+        self.assertEqual(list(decoder.feed(data[:4])), [])
+        self.assertEqual(list(decoder.feed(data[4:10])), [])
+        frames = list(decoder.feed(data[10:]))
+        self.assertEqual(frames[0].data, b'\x7E\x7D\x11\x13')
+
+    def test_zero_copy_views_survive_feed(self):
+        """
+        in zero-copy mode frame data is a view which stays valid after
+        more data is fed to the decoder
+        """
+        decoder = FrameDecoder(zero_copy=True)
+        data = APIFrame(b'\x01\x02').output() + \
+            APIFrame(b'\x03\x04').output()[:3]
+
+        frames = list(decoder.feed(data))
+        self.assertTrue(isinstance(frames[0].data, memoryview))
+
+        more = list(decoder.feed(APIFrame(b'\x03\x04').output()[3:]))
+        self.assertEqual(frames[0].data.tobytes(), b'\x01\x02')
+        self.assertEqual(more[0].data.tobytes(), b'\x03\x04')
+
+    def test_zero_copy_escaped(self):
+        """
+        in zero-copy mode escaped frames are unescaped
+        """
+        decoder = FrameDecoder(escaped=True, zero_copy=True)
+        data = b'\x7E\x00\x04\x7D\x5E\x7D\x5D\x7D\x31\x7D\x33\xE0'
+
+        frames = list(decoder.feed(data))
+        self.assertEqual(frames[0].data.tobytes(), b'\x7E\x7D\x11\x13')
@@ -11,9 +11,14 @@ This class defines data and methods common to all XBee modules.
 This class should be subclassed in order to provide
 series-specific functionality.
 """
-from xbee.frame import APIFrame
 from xbee.backend.base import XBeeBase as _XBeeBase
 from xbee.backend.base import TimeoutException as _TimeoutException
+from xbee.backend.base import HaltedException as _HaltedException
+from xbee.thread.scheduler import Scheduler
+from collections import deque
+from concurrent.futures import Future
+import os
+import select
 import threading
 import time
 
@@ -52,29 +57,107 @@ class XBeeBase(_XBeeBase):
                  whenever an exception is raised while waiting for data from
                  the serial port. This will only take affect if the callback
                  argument is also used.
+
+        zero_copy: boolean flag which determines whether the variable-length
+                 field of a received frame (such as 'rf_data' or 'samples')
+                 is returned as a memoryview into the receive buffer instead
+                 of a copy. Call bytes() or tobytes() on the field to obtain
+                 a copy which outlives the buffer.
+
+        response_format: how received frames are returned. 'dict' (the
+                 default) returns a dictionary of binary data. 'lazy'
+                 returns a read-only mapping with the same contents whose
+                 fields are only decoded when first accessed (see
+                 xbee.backend.response.LazyResponse). 'record' returns a
+                 compact record object per frame whose fixed fields are
+                 attributes, with integers for addresses, frame ids and
+                 status codes (see xbee.backend.response.ResponseRecord).
+
+        columnar_samples: boolean flag which determines whether IO sample
+                 data is returned as a dictionary of one array of values
+                 per channel instead of a list of one dictionary per
+                 sample.
+
+        queue_size, queue_policy, shed_types: bound the queue of frames
+                 read by the background thread which have not yet been
+                 given to the callback; see xbee.backend.base.XBeeBase.
+                 Under the 'block' policy, the thread stops reading the
+                 serial port while the queue is full.
+
+        workers: the number of threads which call the callback, so that
+                 frames are handled concurrently when it blocks (on I/O,
+                 for example). 1 by default, which calls it with one
+                 frame at a time, in the order they arrive.
+
+        order_by_source: boolean flag which determines whether the frames
+                 from each source address are given to the callback in
+                 order, and never concurrently, when there are several
+                 workers. Each source address is assigned to one worker;
+                 frames without a source address may be handled by any.
     """
 
     def __init__(self, *args, **kwargs):
+        self._workers = kwargs.pop('workers', 1)
+        self._order_by_source = kwargs.pop('order_by_source', False)
+        if self._workers < 1:
+            raise ValueError("At least one worker is needed")
+
         super(XBeeBase, self).__init__(*args, **kwargs)
         self._thread_continue = False
 
+        # Frames decoded from the port but not yet returned
+        self._frames = deque()
+
+        # Pipe used by halt() to wake a reader blocked in select()
+        self._wakeup = None
+
+        # Runs response timeouts; its thread is started when first used
+        self._scheduler = Scheduler(self.__class__.__name__ + 'Scheduler',
+                                    error_callback=self._error_callback)
+
         if self._callback:
             self._thread_continue = True
+            if self._fileno() is not None:
+                self._wakeup = os.pipe()
             self._thread = threading.Thread(target=self.run,
                                             name=self.__class__.__name__)
+            self._worker_threads = [
+                threading.Thread(
+                    target=self._run_callbacks,
+                    args=(index if self._order_by_source else None,),
+                    name='{}Worker-{}'.format(self.__class__.__name__, index))
+                for index in range(self._workers)]
             self._thread.start()
+            for thread in self._worker_threads:
+                thread.start()
 
     def halt(self):
         """
         halt: None -> None
 
-        If this instance has a separate thread running, it will be
-        halted. This method will wait until the thread has cleaned
-        up before returning.
+        If this instance has separate threads running, they will be
+        halted. This method will wait until the threads have cleaned
+        up before returning. Received frames not yet given to the
+        callback are discarded.
+
+        Requests still awaiting a response fail with a HaltedException.
         """
+        self._scheduler.stop()
+        self._fail_pending(_HaltedException())
+
         if self._callback:
             self._thread_continue = False
+            if self._wakeup:
+                os.write(self._wakeup[1], b'\x00')
+            self.receive_queue.close()
             self._thread.join()
+            for thread in self._worker_threads:
+                thread.join()
+
+            if self._wakeup:
+                for fd in self._wakeup:
+                    os.close(fd)
+                self._wakeup = None
 
     def run(self):
         """
@@ -82,10 +165,16 @@ class XBeeBase(_XBeeBase):
 
         This method overrides threading.Thread.run() and is automatically
         called when an instance is created with threading enabled.
+
+        Reads frames from the serial port into the receive queue, from
+        which the worker threads give them to the callback, so that a
+        slow callback does not stop the port from being read. Responses
+        to requests sent with await_response are resolved as they are
+        read.
         """
         while True:
             try:
-                self._callback(self.wait_read_frame())
+                info = self.wait_read_frame()
             except ThreadQuitException:
                 # Expected termintation of thread due to self.halt()
                 break
@@ -93,6 +182,49 @@ class XBeeBase(_XBeeBase):
                 # Unexpected thread quit.
                 if self._error_callback:
                     self._error_callback(e)
+                continue
+
+            self.receive_queue.put(info, info['id'],
+                                   partition=self._partition(info))
+
+    def _partition(self, info):
+        """
+        _partition: frame info dictionary -> int or None
+
+        Returns the index of the worker which must handle the given
+        frame, or None if any worker may
+        """
+        if not self._order_by_source:
+            return None
+
+        for field in ('source_addr_long', 'source_addr'):
+            try:
+                source = info[field]
+            except (KeyError, TypeError):
+                continue
+            if source is not None:
+                return hash(source) % self._workers
+
+        return None
+
+    def _run_callbacks(self, partition=None):
+        """
+        _run_callbacks: int -> None
+
+        Calls the callback with each frame in the receive queue (or, given
+        a partition, each frame assigned to this worker), until the queue
+        is closed by halt()
+        """
+        while True:
+            info = self.receive_queue.get(partition)
+            if info is None:
+                break
+
+            try:
+                self._callback(info)
+            except Exception as e:
+                if self._error_callback:
+                    self._error_callback(e)
 
     def wait_read_frame(self, timeout=None):
         """
@@ -104,7 +236,59 @@ class XBeeBase(_XBeeBase):
         and returns the resulting dictionary
         """
         frame = self._wait_for_frame(timeout)
-        return self._split_response(frame.data)
+        return self._read_response(frame.data)
+
+    def _create_future(self):
+        return Future()
+
+    def _call_later(self, delay, callback):
+        return self._scheduler.call_later(delay, callback)
+
+    def _cancel_call(self, handle):
+        self._scheduler.cancel(handle)
+
+    def _fileno(self):
+        """
+        _fileno: None -> int or None
+
+        Returns the file descriptor of the serial port, or None if it
+        does not have one (as on Windows) and must be polled instead.
+        """
+        try:
+            return self.serial.fileno()
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+
+    def _wait_readable(self, deadline):
+        """
+        _wait_readable: float -> boolean
+
+        Blocks until data is available on the serial port, the given
+        deadline (0 for none) passes, or halt() is called. Returns True
+        if data is available.
+
+        Ports with a file descriptor are waited on with select(), so no
+        CPU time is used while the port is idle and data is seen as
+        soon as it arrives. Other ports are polled every 10 ms.
+        """
+        fileno = self._fileno()
+
+        if fileno is None:
+            if self.serial.inWaiting() == 0:
+                time.sleep(.01)
+                return False
+            return True
+
+        timeout = None
+        if deadline:
+            timeout = max(0, deadline - time.time())
+
+        fds = [fileno]
+        if self._wakeup:
+            fds.append(self._wakeup[0])
+
+        readable = select.select(fds, [], [], timeout)[0]
+        return fileno in readable
 
     def _wait_for_frame(self, timeout=None):
         """
@@ -114,51 +298,28 @@ class XBeeBase(_XBeeBase):
         API frame arrives. It will then return the binary data
         contained within the frame.
 
+        Every byte waiting on the port is read at once, and all of the
+        frames it completes are decoded together; frames beyond the
+        first are returned by the following calls without reading.
+
         If this method is called as a separate thread
         and self.thread_continue is set to False, the thread will
         exit by raising a ThreadQuitException.
         """
-        frame = APIFrame(escaped=self._escaped)
-
         deadline = 0
         if timeout is not None and timeout > 0:
             deadline = time.time() + timeout
 
         while True:
-                if self._callback and not self._thread_continue:
-                    raise ThreadQuitException
-
-                if self.serial.inWaiting() == 0:
-                    if deadline and time.time() > deadline:
-                        raise _TimeoutException
-                    time.sleep(.01)
-                    continue
-
-                byte = self.serial.read()
-
-                if byte != APIFrame.START_BYTE:
-                    continue
-
-                # Save all following bytes, if they are not empty
-                if len(byte) == 1:
-                    frame.fill(byte)
-
-                while(frame.remaining_bytes() > 0):
-                    byte = self.serial.read()
-
-                    if len(byte) == 1:
-                        frame.fill(byte)
+            if self._frames:
+                return self._frames.popleft()
 
-                try:
-                    # Try to parse and return result
-                    frame.parse()
+            if self._callback and not self._thread_continue:
+                raise ThreadQuitException
 
-                    # Ignore empty frames
-                    if len(frame.data) == 0:
-                        frame = APIFrame()
-                        continue
+            if not self._wait_readable(deadline):
+                if deadline and time.time() > deadline:
+                    raise _TimeoutException
+                continue
 
-                    return frame
-                except ValueError:
-                    # Bad frame, so restart
-                    frame = APIFrame(escaped=self._escaped)
+            self._frames.extend(self._decoder.feed(self._read_available()))
@@ -0,0 +1,108 @@
+"""
+scheduler.py
+
+Runs delayed calls, such as request timeouts, for the thread backend.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class Scheduler(object):
+    """
+    Calls functions after a delay from a single background thread
+
+    The thread is started by the first call to call_later() and runs
+    until stop() is called; it is a daemon thread, so it never keeps
+    the interpreter alive. Calls are made in order of their due time.
+    If a function raises an exception, it is passed to error_callback
+    (when given) and the thread carries on.
+    """
+
+    def __init__(self, name='Scheduler', error_callback=None):
+        self._name = name
+        self._error_callback = error_callback
+        self._condition = threading.Condition()
+        self._calls = []
+        self._sequence = itertools.count()
+        self._thread = None
+        self._running = False
+
+    def call_later(self, delay, callback):
+        """
+        call_later: float, function -> handle
+
+        Arranges for the given function to be called with no arguments
+        after the given number of seconds. Returns a handle which can be
+        given to cancel().
+        """
+        # [due time, sequence, function]; the sequence keeps calls due at
+        # the same time in order and functions from being compared
+        call = [time.time() + delay, next(self._sequence), callback]
+
+        with self._condition:
+            heapq.heappush(self._calls, call)
+
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run,
+                                                name=self._name)
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._condition.notify()
+
+        return call
+
+    def cancel(self, handle):
+        """
+        cancel: handle -> None
+
+        Prevents a call arranged by call_later() from being made, if it
+        has not been made already
+        """
+        # Cancelled calls are left in place and skipped when due
+        handle[2] = None
+
+    def stop(self):
+        """
+        stop: None -> None
+
+        Stops the background thread, abandoning any calls not yet made,
+        and waits for it to exit unless called from that thread
+        """
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._calls = []
+            self._condition.notify()
+
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    if not self._calls:
+                        self._condition.wait()
+                        continue
+
+                    delay = self._calls[0][0] - time.time()
+                    if delay > 0:
+                        self._condition.wait(delay)
+                        continue
+
+                    callback = heapq.heappop(self._calls)[2]
+                    if callback is not None:
+                        break
+                else:
+                    return
+
+            try:
+                callback()
+            except Exception as e:
+                if self._error_callback:
+                    self._error_callback(e)
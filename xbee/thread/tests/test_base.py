@@ -7,11 +7,44 @@ pmalmsten@gmail.com
 
 Tests the XBeeBase superclass module for XBee API conformance.
 """
+import os
+import struct
+import threading
+import time
 import unittest
 from xbee.thread.base import XBeeBase
+from xbee.thread.zigbee import ZigBee
+from xbee.backend.base import TimeoutException
+from xbee.frame import APIFrame
 from xbee.tests.Fake import Serial
 
 
+class PipeSerial(object):
+    """
+    Serial port stand-in backed by an OS pipe, so that it has a file
+    descriptor which can be waited on with select()
+    """
+
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+
+    def fileno(self):
+        return self._read_fd
+
+    def read(self, length=1):
+        return os.read(self._read_fd, length)
+
+    def inWaiting(self):
+        return 0
+
+    def feed(self, data):
+        os.write(self._write_fd, data)
+
+    def close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+
 class TestReadFromDevice(unittest.TestCase):
     """
     XBeeBase class should properly read and extract data from a valid
@@ -55,5 +88,218 @@ class TestReadFromDevice(unittest.TestCase):
         self.assertEqual(frame.data, b'\x7E\x7D\x11\x13')
 
 
+    def test_read_all_waiting_bytes_at_once(self):
+        """
+        _wait_for_frame should read every waiting byte with one call and
+        return each frame decoded from them in turn
+        """
+        device = Serial()
+        device.set_read_data(b'\x7E\x00\x01\x00\xFF' * 2 +
+                             b'\x7E\x00\x01\x05\xFA')
+        reads = []
+        read = device.read
+        device.read = lambda length=1: reads.append(length) or read(length)
+        xbee = XBeeBase(device)
+
+        frames = [xbee._wait_for_frame() for i in range(3)]
+        self.assertEqual([frame.data for frame in frames],
+                         [b'\x00', b'\x00', b'\x05'])
+        self.assertEqual(reads, [15])
+
+
+@unittest.skipUnless(hasattr(os, 'pipe') and os.name == 'posix',
+                     "select() on pipes requires a POSIX system")
+class TestEventDrivenRead(unittest.TestCase):
+    """
+    Ports with a file descriptor should be waited on rather than polled
+    """
+
+    def setUp(self):
+        self.device = PipeSerial()
+
+    def tearDown(self):
+        self.device.close()
+
+    def test_read_waits_for_data(self):
+        """
+        _wait_for_frame should return a frame which arrives while it is
+        waiting on the port
+        """
+        xbee = XBeeBase(self.device)
+        timer = threading.Timer(
+            0.05, self.device.feed, [b'\x7E\x00\x01\x00\xFF'])
+        timer.start()
+
+        frame = xbee._wait_for_frame(timeout=5)
+        timer.join()
+        self.assertEqual(frame.data, b'\x00')
+
+    def test_read_timeout(self):
+        """
+        _wait_for_frame should raise TimeoutException once its timeout
+        expires without a frame
+        """
+        xbee = XBeeBase(self.device)
+
+        start = time.time()
+        self.assertRaises(TimeoutException, xbee._wait_for_frame, 0.1)
+        self.assertTrue(time.time() - start >= 0.1)
+
+    def test_halt_wakes_reader(self):
+        """
+        halt() should stop a background thread blocked on an idle port
+        """
+        frames = []
+        xbee = XBeeBase(self.device, callback=frames.append)
+        time.sleep(0.05)
+
+        start = time.time()
+        xbee.halt()
+        self.assertFalse(xbee._thread.is_alive())
+        self.assertTrue(time.time() - start < 1)
+        self.assertIsNone(xbee._wakeup)
+
+
+class TestReceiveQueue(unittest.TestCase):
+    """
+    The background thread should keep reading frames into the receive
+    queue while the callback is busy
+    """
+
+    def setUp(self):
+        self.device = PipeSerial()
+        self.busy = threading.Event()
+        self.release = threading.Event()
+        self.frames = []
+
+    def tearDown(self):
+        self.release.set()
+        self.xbee.halt()
+        self.device.close()
+
+    def slow_callback(self, frame):
+        self.busy.set()
+        self.release.wait(5)
+        self.frames.append(frame['rf_data'])
+
+    def rx(self, data):
+        return APIFrame(b'\x90\x00\x13\xa2\x00@oG\xe4\x12\x34\x01' +
+                        data).output()
+
+    def test_slow_callback_does_not_stop_reading(self):
+        self.xbee = ZigBee(self.device, callback=self.slow_callback,
+                           queue_size=2, queue_policy='drop_oldest')
+
+        self.device.feed(self.rx(b'0'))
+        self.assertTrue(self.busy.wait(5))
+
+        self.device.feed(b''.join(self.rx(data)
+                                  for data in (b'1', b'2', b'3', b'4')))
+        deadline = time.time() + 5
+        while self.xbee.receive_queue.dropped < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.xbee.receive_queue.dropped_types, {'rx': 2})
+        self.release.set()
+        while len(self.frames) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.frames, [b'0', b'3', b'4'])
+
+
+class TestCallLater(unittest.TestCase):
+    """
+    Calls arranged with call_later() should happen once their delay
+    passes, unless cancelled first
+    """
+
+    def setUp(self):
+        self.xbee = XBeeBase(Serial())
+
+    def tearDown(self):
+        self.xbee.halt()
+
+    def test_call_later(self):
+        future = self.xbee.create_future()
+        self.xbee.call_later(0.01, lambda: future.set_result(True))
+        self.assertTrue(future.result(5))
+
+    def test_cancel_call(self):
+        called = threading.Event()
+        handle = self.xbee.call_later(0.05, called.set)
+        self.xbee.cancel_call(handle)
+        self.assertFalse(called.wait(0.1))
+
+
+class TestWorkers(unittest.TestCase):
+    """
+    Several worker threads should call the callback, optionally keeping
+    the frames from each source in order
+    """
+
+    NODES = [struct.pack('>Q', 0x0013a200406f4700 + index)
+             for index in range(4)]
+
+    def setUp(self):
+        self.device = PipeSerial()
+        self.xbee = None
+
+    def tearDown(self):
+        if self.xbee is not None:
+            self.xbee.halt()
+        self.device.close()
+
+    def rx(self, source, data):
+        return APIFrame(b'\x90' + source + b'\x12\x34\x01' + data).output()
+
+    def test_blocked_worker(self):
+        """
+        While one worker blocks, another should handle the next frame
+        """
+        release = threading.Event()
+        handled = threading.Event()
+
+        def callback(frame):
+            if frame['rf_data'] == b'slow':
+                release.wait(5)
+            else:
+                handled.set()
+
+        self.xbee = ZigBee(self.device, callback=callback, workers=2)
+        self.device.feed(self.rx(self.NODES[0], b'slow') +
+                         self.rx(self.NODES[1], b'fast'))
+
+        self.assertTrue(handled.wait(5))
+        release.set()
+
+    def test_order_by_source(self):
+        """
+        The frames from each source should be handled in order, by one
+        worker
+        """
+        lock = threading.Lock()
+        seen = {}
+        done = threading.Event()
+
+        def callback(frame):
+            time.sleep(0.001 * (len(frame['rf_data']) % 3))
+            with lock:
+                seen.setdefault(frame['source_addr_long'], []).append(
+                    (frame['rf_data'], threading.current_thread().name))
+                if sum(len(frames) for frames in seen.values()) == 40:
+                    done.set()
+
+        self.xbee = ZigBee(self.device, callback=callback, workers=3,
+                           order_by_source=True)
+        self.device.feed(b''.join(
+            self.rx(self.NODES[index % 4], str(index).encode())
+            for index in range(40)))
+
+        self.assertTrue(done.wait(5))
+        for source, frames in seen.items():
+            data = [int(data) for data, _ in frames]
+            self.assertEqual(data, sorted(data))
+            self.assertEqual(len(set(name for _, name in frames)), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
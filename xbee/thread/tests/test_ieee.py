@@ -441,6 +441,54 @@ class TestParseIOData(InitXBee):
         self.assertEqual(results, expected_results)
 
 
+    def test_parse_short_samples(self):
+        """
+        _parse_samples should raise ValueError if sample data is missing
+        """
+        # Two samples, ADC 0 enabled, only one sample present
+        data = b'\x02\x02\x00' + b'\x00\x05'
+
+        self.assertRaises(ValueError, self.xbee._parse_samples, data)
+
+    def test_parse_no_channels(self):
+        """
+        _parse_samples should return empty samples when no channel is
+        enabled
+        """
+        self.assertEqual(self.xbee._parse_samples(b'\x01\x00\x00'), [{}])
+        self.assertEqual(self.xbee._parse_samples(b'\x02\x00\x00'),
+                         [{}, {}])
+
+
+class TestParseIODataColumns(unittest.TestCase):
+    """
+    XBee class should return IO data per channel when asked to
+    """
+
+    def setUp(self):
+        self.xbee = XBee(None, columnar_samples=True)
+
+    def test_parse_multiple_dio_adc_columns(self):
+        """
+        _parse_samples should return one array per enabled channel
+        """
+        # Three samples, ADC 0 enabled, DIO 0 and 1 enabled
+        header = b'\x03\x02\x03'
+        sample = b'\x00\x01\x00\x10' + b'\x00\x02\x00\x20' + \
+            b'\x00\x03\x03\xFF'
+        data = header + sample
+
+        results = self.xbee._parse_samples(data)
+
+        self.assertEqual(sorted(results), ['adc-0', 'dio-0', 'dio-1'])
+        self.assertEqual(list(results['dio-0']), [1, 0, 1])
+        self.assertEqual(list(results['dio-1']), [0, 1, 1])
+        self.assertEqual(list(results['adc-0']), [0x10, 0x20, 0x3FF])
+
+    def test_parse_no_channels_columns(self):
+        self.assertEqual(self.xbee._parse_samples(b'\x01\x00\x00'), {})
+
+
 class TestWriteToDevice(unittest.TestCase):
     """
     XBee class should properly write binary data in a valid API
@@ -0,0 +1,76 @@
+#! /usr/bin/python
+"""
+test_scheduler.py
+
+Tests the delayed calls of xbee.thread.scheduler.
+"""
+import threading
+import unittest
+from xbee.thread.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    """
+    Scheduler must make calls in order of their due time
+    """
+
+    def setUp(self):
+        self.errors = []
+        self.scheduler = Scheduler(error_callback=self.errors.append)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_calls_in_due_order(self):
+        """
+        Calls should be made in order of their due time, not the order
+        in which they were arranged
+        """
+        calls = []
+        done = threading.Event()
+        self.scheduler.call_later(0.04, lambda: done.set())
+        self.scheduler.call_later(0.02, lambda: calls.append(2))
+        self.scheduler.call_later(0.01, lambda: calls.append(1))
+
+        self.assertTrue(done.wait(1))
+        self.assertEqual(calls, [1, 2])
+
+    def test_cancel(self):
+        """
+        A cancelled call should not be made
+        """
+        calls = []
+        done = threading.Event()
+        handle = self.scheduler.call_later(0.01, lambda: calls.append(1))
+        self.scheduler.call_later(0.02, lambda: done.set())
+        self.scheduler.cancel(handle)
+
+        self.assertTrue(done.wait(1))
+        self.assertEqual(calls, [])
+
+    def test_error_reported(self):
+        """
+        An exception raised by a call should be passed to the error
+        callback without stopping later calls
+        """
+        done = threading.Event()
+        self.scheduler.call_later(0, lambda: 1 / 0)
+        self.scheduler.call_later(0.01, lambda: done.set())
+
+        self.assertTrue(done.wait(1))
+        self.assertEqual(len(self.errors), 1)
+        self.assertTrue(isinstance(self.errors[0], ZeroDivisionError))
+
+    def test_stop(self):
+        """
+        stop() should end the background thread
+        """
+        self.scheduler.call_later(10, lambda: None)
+        thread = self.scheduler._thread
+
+        self.scheduler.stop()
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,12 @@ pmalmsten@gmail.com
 
 Tests the XBee ZB (ZigBee) implementation class for API compliance
 """
+import struct
+import time
 import unittest
+from xbee.frame import APIFrame
+from xbee.backend import base
+from xbee.backend.base import TimeoutException, HaltedException
 from xbee.thread.zigbee import ZigBee
 from xbee.tests.Fake import Serial
 
@@ -221,6 +226,409 @@ class TestZigBee(unittest.TestCase):
             self.assertEqual(info, expected_info)
 
 
+class TestAwaitResponse(unittest.TestCase):
+    """
+    send(..., await_response=True) must return a future resolved by the
+    response carrying the frame id it was sent with
+    """
+
+    def setUp(self):
+        self.device = Serial()
+        self.zigbee = ZigBee(self.device)
+
+    def tearDown(self):
+        self.zigbee.halt()
+
+    def test_response_resolves_future(self):
+        """
+        The matching response should resolve the future and still be
+        returned by wait_read_frame
+        """
+        future = self.zigbee.send('at', command=b'MY', await_response=True)
+        self.assertEqual(self.device.get_data_written(),
+                         b'~\x00\x04\x08\x01MYP')
+
+        self.device.set_read_data(
+            APIFrame(b'\x88\x01MY\x00\x12\x34').output())
+        info = self.zigbee.wait_read_frame()
+
+        self.assertEqual(future.result(0), info)
+        self.assertEqual(info['parameter'], b'\x12\x34')
+
+    def test_frame_ids_allocated_in_turn(self):
+        """
+        Requests awaiting responses should use different frame ids, and
+        responses should resolve only their own request
+        """
+        first = self.zigbee.at(command=b'MY', await_response=True)
+        second = self.zigbee.at(command=b'ID', await_response=True)
+        self.assertEqual(self.device.get_data_written()[4:5], b'\x02')
+
+        self.device.set_read_data(
+            APIFrame(b'\x88\x02ID\x00').output())
+        self.zigbee.wait_read_frame()
+
+        self.assertFalse(first.done())
+        self.assertEqual(second.result(0)['command'], b'ID')
+
+    def test_unawaited_send_with_default_frame_id(self):
+        """
+        The response to a command sent without await_response, whose
+        default frame id is awaited by another request, should not
+        resolve that request
+        """
+        future = self.zigbee.send('tx', dest_addr_long=b'\x00' * 8,
+                                  data=b'hi', await_response=True)
+        self.assertEqual(self.device.get_data_written()[4:5], b'\x01')
+
+        self.zigbee.send('at', command=b'MY')
+        frame_id = self.device.get_data_written()[4:5]
+        self.assertNotEqual(frame_id, b'\x01')
+
+        for response in (b'\x88\x01MY\x00\x12\x34',
+                         b'\x88' + frame_id + b'MY\x00\x12\x34'):
+            self.device.set_read_data(APIFrame(response).output())
+            self.zigbee.wait_read_frame()
+        self.assertFalse(future.done())
+
+        self.device.set_read_data(
+            APIFrame(b'\x8b\x01\xff\xfe\x00\x00\x00').output())
+        self.zigbee.wait_read_frame()
+        self.assertEqual(future.result(0)['id'], 'tx_status')
+
+    def test_unawaited_send_then_awaited(self):
+        """
+        An awaited request should not be given the frame id of an
+        unawaited command whose response has not arrived
+        """
+        self.zigbee.send('at', command=b'MY')
+        self.assertEqual(self.device.get_data_written()[4:5], b'\x01')
+
+        future = self.zigbee.send('at', command=b'NI', await_response=True)
+        frame_id = self.device.get_data_written()[4:5]
+        self.assertNotEqual(frame_id, b'\x01')
+
+        self.device.set_read_data(
+            APIFrame(b'\x88\x01MY\x00\x12\x34').output())
+        self.zigbee.wait_read_frame()
+        self.assertFalse(future.done())
+
+        self.device.set_read_data(
+            APIFrame(b'\x88' + frame_id + b'NI\x00node').output())
+        self.zigbee.wait_read_frame()
+        self.assertEqual(future.result(0)['parameter'], b'node')
+
+    def test_rerouted_frame_id_held(self):
+        """
+        The frame id an unawaited command is moved to should not be
+        given to the next awaited request
+        """
+        first = self.zigbee.send('at', command=b'ID', await_response=True)
+        self.zigbee.send('at', command=b'MY')
+        frame_id = self.device.get_data_written()[4:5]
+        self.assertEqual(frame_id, b'\x02')
+
+        second = self.zigbee.send('at', command=b'NI', await_response=True)
+        self.assertEqual(self.device.get_data_written()[4:5], b'\x03')
+
+        self.device.set_read_data(
+            APIFrame(b'\x88\x02MY\x00\x12\x34').output())
+        self.zigbee.wait_read_frame()
+        self.assertFalse(first.done())
+        self.assertFalse(second.done())
+
+    def test_held_frame_id_released(self):
+        """
+        The frame id of an unawaited command should be released once
+        response_timeout passes
+        """
+        self.zigbee.send('at', command=b'MY', response_timeout=0.01)
+        self.assertTrue(1 in self.zigbee._pending)
+
+        deadline = time.time() + 1
+        while 1 in self.zigbee._pending and time.time() < deadline:
+            time.sleep(0.001)
+        self.assertEqual(len(self.zigbee._pending), 0)
+
+    def test_given_frame_id(self):
+        """
+        A frame id given by the caller should be awaited, and may not be
+        awaited twice at once
+        """
+        future = self.zigbee.at(command=b'MY', frame_id=b'\x2a',
+                                await_response=True)
+        self.assertEqual(self.device.get_data_written()[4:5], b'\x2a')
+        self.assertRaises(ValueError, self.zigbee.at, command=b'ID',
+                          frame_id=b'\x2a', await_response=True)
+
+        self.device.set_read_data(
+            APIFrame(b'\x88\x2aMY\x00').output())
+        self.zigbee.wait_read_frame()
+        self.assertTrue(future.done())
+
+    def test_response_timeout(self):
+        """
+        The future should fail with a TimeoutException if no response
+        arrives in time, releasing its frame id
+        """
+        future = self.zigbee.at(command=b'MY', await_response=True,
+                                response_timeout=0.01)
+
+        self.assertRaises(TimeoutException, future.result, 1)
+        self.assertEqual(len(self.zigbee._pending), 0)
+
+    def test_halt(self):
+        """
+        Requests awaiting a response should fail when halted, whether
+        or not they have a timeout
+        """
+        futures = [self.zigbee.at(command=b'MY', await_response=True,
+                                  response_timeout=5),
+                   self.zigbee.at(command=b'ID', await_response=True)]
+        self.zigbee.halt()
+
+        for future in futures:
+            self.assertRaises(HaltedException, future.result, 0)
+        self.assertEqual(len(self.zigbee._pending), 0)
+
+
+class TestRemoteATBatch(unittest.TestCase):
+    """
+    remote_at_batch() must keep a window of requests in flight and
+    collect their responses
+    """
+
+    def setUp(self):
+        self.device = Serial()
+        self.written = []
+        self.device.write = self.written.append
+        self.zigbee = ZigBee(self.device)
+
+    def tearDown(self):
+        self.zigbee.halt()
+
+    def respond(self, frame_id, command, parameter=b''):
+        self.device.set_read_data(APIFrame(
+            b'\x97' + frame_id + b'\x00\x13\xa2\x00@oG\xe4v\x1a' +
+            command + b'\x00' + parameter).output())
+        return self.zigbee.wait_read_frame()
+
+    def test_window(self):
+        """
+        No more than window requests should await a response at once,
+        and each response should release the next request
+        """
+        addr = b'\x00\x13\xa2\x00@oG\xe4'
+        completed = []
+        batch = self.zigbee.remote_at_batch(
+            [(addr, b'NI'), (addr, b'DB'), (addr, b'D0', b'\x05')],
+            window=2, callback=lambda i, info: completed.append(i))
+
+        self.assertEqual(len(self.written), 2)
+        self.respond(b'\x02', b'DB', b'\x28')
+        self.assertEqual(len(self.written), 3)
+        self.assertEqual(self.written[2][4:5], b'\x03')
+        self.assertEqual(self.written[2][-4:-1], b'D0\x05')
+        self.assertFalse(batch.done())
+
+        self.respond(b'\x01', b'NI', b'node')
+        self.respond(b'\x03', b'D0')
+
+        results = batch.result(0)
+        self.assertEqual(completed, [1, 0, 2])
+        self.assertEqual([info['command'] for info in results],
+                         [b'NI', b'DB', b'D0'])
+        self.assertEqual(results[0]['parameter'], b'node')
+
+    def test_timeout_result(self):
+        """
+        A request which times out should have a TimeoutException as its
+        result without holding up the rest of the batch
+        """
+        addr = b'\x00\x13\xa2\x00@oG\xe4'
+        batch = self.zigbee.remote_at_batch(
+            [(addr, b'NI'), (addr, b'DB')], window=1, response_timeout=0.01)
+
+        results = batch.result(1)
+        self.assertTrue(isinstance(results[0], TimeoutException))
+        self.assertTrue(isinstance(results[1], TimeoutException))
+        self.assertEqual(len(self.written), 2)
+
+    def test_empty_batch(self):
+        """
+        An empty batch should complete immediately
+        """
+        self.assertEqual(self.zigbee.remote_at_batch([]).result(0), [])
+
+    def test_bad_window(self):
+        """
+        A window of less than one request should be refused
+        """
+        addr = b'\x00\x13\xa2\x00@oG\xe4'
+        self.assertRaises(ValueError, self.zigbee.remote_at_batch,
+                          [(addr, b'NI')], window=0)
+        self.assertEqual(self.written, [])
+
+
+class TestAddressCache(unittest.TestCase):
+    """
+    With address_cache enabled, known 16-bit addresses must be filled in
+    """
+
+    def setUp(self):
+        self.device = Serial()
+        self.zigbee = ZigBee(self.device, address_cache=True)
+        self.node = b'\x00\x13\xa2\x00@oG\xe4'
+
+    def test_disabled_by_default(self):
+        """
+        The address cache should only be used when asked for
+        """
+        self.assertIsNone(ZigBee(None).address_cache)
+
+    def test_dest_addr_filled_in(self):
+        """
+        After a frame from a node arrives, transmissions to it should
+        carry its 16-bit address instead of 0xFFFE
+        """
+        self.zigbee.tx(dest_addr_long=self.node, data=b'1')
+        self.assertEqual(self.device.get_data_written()[13:15], b'\xff\xfe')
+
+        self.device.set_read_data(APIFrame(
+            b'\x90' + self.node + b'v\x1a\x01test').output())
+        self.zigbee.wait_read_frame()
+
+        self.zigbee.tx(dest_addr_long=self.node, data=b'2')
+        self.assertEqual(self.device.get_data_written()[13:15], b'v\x1a')
+
+        self.zigbee.tx(dest_addr_long=self.node, dest_addr=b'\x00\x01',
+                       data=b'3')
+        self.assertEqual(self.device.get_data_written()[13:15],
+                         b'\x00\x01')
+
+    def test_learn_from_tx_status(self):
+        """
+        The 16-bit address in the tx_status of a transmission should be
+        learnt for its destination
+        """
+        self.zigbee.tx(dest_addr_long=self.node, frame_id=b'\x07',
+                       data=b'1')
+        self.device.set_read_data(APIFrame(
+            b'\x8b\x07\x43\x21\x00\x00\x01').output())
+        self.zigbee.wait_read_frame()
+
+        self.assertEqual(self.zigbee.address_cache.lookup(self.node),
+                         b'\x43\x21')
+
+    def test_default_frame_id_to_two_nodes(self):
+        """
+        A tx_status for the default frame id, used by transmissions to
+        two nodes, should not be learnt for either
+        """
+        other = b'\x00\x13\xa2\x00@oG\xe5'
+        self.zigbee.tx(dest_addr_long=self.node, data=b'1')
+        self.zigbee.tx(dest_addr_long=other, data=b'2')
+        self.device.set_read_data(APIFrame(
+            b'\x8b\x01\x11\x11\x00\x00\x01').output())
+        self.zigbee.wait_read_frame()
+
+        self.assertIsNone(self.zigbee.address_cache.lookup(other))
+        self.assertIsNone(self.zigbee.address_cache.lookup(self.node))
+
+        self.zigbee.tx(dest_addr_long=other, data=b'3')
+        self.assertEqual(self.device.get_data_written()[13:15], b'\xff\xfe')
+
+    def test_awaited_transmissions(self):
+        """
+        Transmissions sent with await_response have frame ids of their
+        own, so each tx_status should be learnt for its destination
+        """
+        other = b'\x00\x13\xa2\x00@oG\xe5'
+        self.zigbee.tx(dest_addr_long=self.node, data=b'1',
+                       await_response=True)
+        self.zigbee.tx(dest_addr_long=other, data=b'2', await_response=True)
+        self.device.set_read_data(
+            APIFrame(b'\x8b\x01\x11\x11\x00\x00\x01').output() +
+            APIFrame(b'\x8b\x02\x22\x22\x00\x00\x01').output())
+        self.zigbee.wait_read_frame()
+        self.zigbee.wait_read_frame()
+
+        self.assertEqual(self.zigbee.address_cache.lookup(self.node),
+                         b'\x11\x11')
+        self.assertEqual(self.zigbee.address_cache.lookup(other),
+                         b'\x22\x22')
+
+
+class TestSourceRoutes(unittest.TestCase):
+    """
+    With source_routes enabled, known routes must be sent before
+    transmissions along them
+    """
+
+    def setUp(self):
+        self.device = Serial()
+        self.written = []
+        self.device.write = self.written.append
+        self.zigbee = ZigBee(self.device, source_routes=True)
+        self.node = b'\x00\x13\xa2\x00@oG\xe4'
+
+    def test_create_source_route_sent(self):
+        """
+        A transmission to a node which reported a route should be
+        preceded by a create_source_route command with that route
+        """
+        self.zigbee.tx(dest_addr_long=self.node, data=b'1')
+        self.assertEqual(len(self.written), 1)
+
+        self.device.set_read_data(APIFrame(
+            b'\xa1' + self.node + b'v\x1a\x01\x02\x12\x34\x56\x78').output())
+        self.zigbee.wait_read_frame()
+
+        self.zigbee.tx(dest_addr_long=self.node, dest_addr=b'v\x1a',
+                       data=b'2')
+        self.assertEqual(len(self.written), 3)
+        self.assertEqual(
+            self.written[1],
+            APIFrame(b'\x21\x00' + self.node + b'v\x1a\x00\x02' +
+                     b'\x12\x34\x56\x78').output())
+        self.assertEqual(self.written[2][3:4], b'\x10')
+
+
+class TestZeroCopy(unittest.TestCase):
+    """
+    In zero-copy mode, variable-length fields must be views
+    """
+
+    def setUp(self):
+        self.zigbee = ZigBee(None, zero_copy=True)
+
+    def test_rf_data_is_view(self):
+        """
+        rf_data must be a memoryview into the frame; fixed fields
+        must still be bytes
+        """
+        data = b'\x90\x00\x13\xa2\x00@oG\xe4v\x1a\x01test'
+        info = self.zigbee._split_response(data)
+
+        self.assertTrue(isinstance(info['rf_data'], memoryview))
+        self.assertEqual(info['rf_data'].tobytes(), b'test')
+        self.assertEqual(info['source_addr'], b'v\x1a')
+        self.assertTrue(isinstance(info['source_addr'], bytes))
+
+    def test_io_samples_parsed_from_view(self):
+        """
+        IO samples must still be parsed when they are a view
+        """
+        data = b'\x92\x00\x13\xa2\x00@oG\xe4v\x1a\x01' + \
+            b'\x01\x08\x00\x0e\x08\x00\x00\x00\x02P\x02\x06'
+        info = self.zigbee._split_response(memoryview(data))
+
+        self.assertEqual(info['samples'], [{'dio-11': True,
+                                            'adc-1': 0,
+                                            'adc-2': 592,
+                                            'adc-3': 518}])
+
+
 class TestParseZigBeeIOData(unittest.TestCase):
     """
     Test parsing ZigBee specific IO data
@@ -228,6 +636,15 @@ class TestParseZigBeeIOData(unittest.TestCase):
 
     def setUp(self):
         self.zigbee = ZigBee(None)
+        # Layouts cached by other tests would skip the header parser
+        base._samples_layouts.clear()
+
+    def test_parse_no_channels(self):
+        """
+        A header with no channels enabled should give empty samples
+        """
+        self.assertEqual(self.zigbee._parse_samples(b'\x01\x00\x00\x00'),
+                         [{}])
 
     def test_parse_dio_adc(self):
             data = b'\x01\x08\x00\x0e\x08\x00\x00\x00\x02P\x02\x06'
@@ -279,3 +696,39 @@ class TestParseZigBeeIOData(unittest.TestCase):
         expected_results = [{'adc-7': 0xD18}]
         results = self.zigbee._parse_samples(data)
         self.assertEqual(results, expected_results)
+
+    def test_samples_header_parsed_once_per_mask(self):
+        """
+        The channel masks of IO data should only be parsed the first
+        time each combination of masks is seen
+        """
+        calls = []
+        original = self.zigbee._parse_samples_header
+
+        def parse_samples_header(io_bytes):
+            calls.append(io_bytes)
+            return original(io_bytes)
+
+        self.zigbee._parse_samples_header = parse_samples_header
+
+        data = b'\x01\x04\x01\x81\x04\x01\x00\x01\x0D\x18'
+        self.zigbee._parse_samples(data)
+        results = self.zigbee._parse_samples(data)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'dio-0': True,
+                                    'dio-10': True,
+                                    'adc-0': 1,
+                                    'adc-7': 0xD18}])
+
+    def test_samples_layouts_bounded(self):
+        """
+        Headers with ever different mask bytes should not grow the
+        layout cache without limit
+        """
+        for masks in range(base._SAMPLES_LAYOUTS_SIZE + 10):
+            data = b'\x01' + struct.pack('>I', masks)[1:] + b'\x00' * 18
+            self.zigbee._parse_samples(data)
+
+        self.assertTrue(
+            len(base._samples_layouts) <= base._SAMPLES_LAYOUTS_SIZE)
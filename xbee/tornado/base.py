@@ -9,9 +9,9 @@ This class defines data and methods common to all XBee modules.
 This class should be subclassed in order to provide
 series-specific functionality.
 """
-from xbee.frame import APIFrame
 from xbee.backend.base import XBeeBase as _XBeeBase
 from xbee.backend.base import TimeoutException as _TimeoutException
+from xbee.backend.base import HaltedException as _HaltedException
 from tornado import ioloop, gen
 from tornado.locks import Event
 from tornado.concurrent import Future
@@ -44,6 +44,34 @@ class XBeeBase(_XBeeBase):
                  whenever an exception is raised while waiting for data from
                  the serial port. This will only take affect if the callback
                  argument is also used.
+
+        zero_copy: boolean flag which determines whether the variable-length
+                 field of a received frame (such as 'rf_data' or 'samples')
+                 is returned as a memoryview into the receive buffer instead
+                 of a copy. Call bytes() or tobytes() on the field to obtain
+                 a copy which outlives the buffer.
+
+        response_format: how received frames are returned. 'dict' (the
+                 default) returns a dictionary of binary data. 'lazy'
+                 returns a read-only mapping with the same contents whose
+                 fields are only decoded when first accessed (see
+                 xbee.backend.response.LazyResponse). 'record' returns a
+                 compact record object per frame whose fixed fields are
+                 attributes, with integers for addresses, frame ids and
+                 status codes (see xbee.backend.response.ResponseRecord).
+
+        columnar_samples: boolean flag which determines whether IO sample
+                 data is returned as a dictionary of one array of values
+                 per channel instead of a list of one dictionary per
+                 sample.
+
+        queue_size, queue_policy, shed_types: bound the queue of frames
+                 received but not yet taken by wait_read_frame() or the
+                 callback; see xbee.backend.base.XBeeBase. Under the
+                 'block' policy, the serial port is not watched while the
+                 queue is full and no call is waiting for a frame. A call
+                 waiting for frame types which are not queued keeps the
+                 port watched, so the queue may then grow past queue_size.
     """
     def __init__(self, *args, **kwargs):
         if 'io_loop' in kwargs:
@@ -56,31 +84,70 @@ class XBeeBase(_XBeeBase):
         self._running = Event()
         self._running.set()
 
-        self._frame_future = None
-        self._frame_queue = deque()
+        # Frames not yet taken by a waiter are kept in receive_queue;
+        # these are the (future, frame types) of each call waiting for a
+        # frame, longest waiting first
+        self._frame_waiters = deque()
+
+        # Make Non-Blocking, so that reading in the read handler never
+        # stalls the IOLoop; partial frames are kept by the decoder
+        self.serial.timeout = 0
 
         if self._callback:
-            # Make Non-Blocking
-            self.serial.timeout = 0
             self.process_frames()
 
-        self._ioloop.add_handler(self.serial.fd,
-                                 self._process_input,
-                                 ioloop.IOLoop.READ)
+        self._reading = False
+        self._resume_reading()
+
+    def _resume_reading(self):
+        if not self._reading:
+            self._ioloop.add_handler(self.serial.fd,
+                                     self._process_input,
+                                     ioloop.IOLoop.READ)
+            self._reading = True
+
+    def _pause_reading(self):
+        if self._reading:
+            self._ioloop.remove_handler(self.serial.fd)
+            self._reading = False
+
+    def _update_reading(self):
+        """
+        _update_reading: None -> None
+
+        Watches the serial port unless halted, or the queue is full under
+        the 'block' policy and no call is waiting for a frame. A call
+        waiting for frame types which are not queued would otherwise
+        never take one, and reading would not resume.
+        """
+        if not self._running.is_set():
+            return
+
+        if self.receive_queue.policy == 'block' and \
+                self.receive_queue.full() and \
+                not any(not future.done()
+                        for future, _ in self._frame_waiters):
+            # Leave further data on the port until frames are taken
+            self._pause_reading()
+        else:
+            self._resume_reading()
 
     def halt(self):
         """
         halt: None -> None
 
-        Stop the event, and remove the FD from the loop handler
+        Stop the event, remove the FD from the loop handler, and resolve
+        every call still waiting for a frame with None. Requests still
+        awaiting a response fail with a HaltedException.
         """
-        if self._callback:
-            self._running.clear()
-            self._ioloop.remove_handler(self.serial.fd)
+        self._running.clear()
+        self._pause_reading()
+        self._fail_pending(_HaltedException())
 
-            if self._frame_future is not None:
-                self._frame_future.set_result(None)
-                self._frame_future = None
+        while self._frame_waiters:
+            future, _ = self._frame_waiters.popleft()
+            if not future.done():
+                future.set_result(None)
 
     @gen.coroutine
     def process_frames(self):
@@ -92,7 +159,10 @@ class XBeeBase(_XBeeBase):
         while self._running.is_set():
             try:
                 frame = yield self._get_frame()
-                info = self._split_response(frame.data)
+                if frame is None:
+                    # Halted
+                    break
+                info = self._read_response(frame.data)
                 if info is not None:
                     self._callback(info)
             except Exception as e:
@@ -101,67 +171,126 @@ class XBeeBase(_XBeeBase):
                     self._error_callback(e)
 
     @gen.coroutine
-    def wait_read_frame(self, timeout=None):
-        frame = yield self._get_frame(timeout=timeout)
-        raise gen.Return(self._split_response(frame.data))
+    def wait_read_frame(self, timeout=None, frame_type=None):
+        """
+        wait_read_frame: float, string or (string ...) -> frame info
+                         dictionary
+
+        Waits for a frame to arrive, and returns the parsed response.
+        Any number of coroutines may wait at once; each frame is given to
+        the one which has waited longest among those it is wanted by.
+        With frame_type, a response name (such as 'rx' or 'tx_status')
+        or a collection of them, only frames of those types are
+        returned, leaving other frames for other callers. Raises a
+        TimeoutException if no frame arrives within timeout seconds (if
+        not None), and returns None if the instance is halted first.
+        """
+        frame = yield self._get_frame(timeout=timeout, frame_type=frame_type)
+        if frame is None:
+            raise gen.Return(None)
+        raise gen.Return(self._read_response(frame.data))
+
+    def _create_future(self):
+        return Future()
+
+    def _call_later(self, delay, callback):
+        return self._ioloop.call_later(delay, callback)
+
+    def _cancel_call(self, handle):
+        self._ioloop.remove_timeout(handle)
+
+    def _frame_name(self, frame):
+        """
+        _frame_name: APIFrame -> string or None
+
+        Returns the name of the response carried by a frame, without
+        parsing the rest of it
+        """
+        packet_id = frame.data[0:1]
+        if isinstance(packet_id, memoryview):
+            packet_id = packet_id.tobytes()
+
+        packet = getattr(type(self), 'api_responses', {}).get(packet_id)
+        return packet['name'] if packet else None
+
+    def _get_frame(self, timeout=None, frame_type=None):
+        if isinstance(frame_type, str):
+            frame_type = (frame_type,)
 
-    def _get_frame(self, timeout=None):
         future = Future()
-        if self._frame_queue:
-            future.set_result(self._frame_queue.popleft())
-        else:
-            if timeout is not None:
-                def on_timeout():
+        frame = self.receive_queue.take(frame_type)
+        if frame is not None:
+            self._update_reading()
+            future.set_result(frame)
+            return future
+
+        waiter = (future, frame_type)
+        self._frame_waiters.append(waiter)
+        self._update_reading()
+
+        if timeout is not None:
+            def on_timeout():
+                if not future.done():
+                    self._frame_waiters.remove(waiter)
                     future.set_exception(_TimeoutException())
 
-                handle = self._ioloop.add_timeout(
-                    self._ioloop.time() + timeout, on_timeout
-                )
-                future.add_done_callback(lambda _:
-                                         self._ioloop.remove_timeout(handle))
-
-            self._frame_future = future
+            handle = self._ioloop.add_timeout(
+                self._ioloop.time() + timeout, on_timeout
+            )
+            future.add_done_callback(lambda _:
+                                     self._ioloop.remove_timeout(handle))
 
         return future
 
-    def _process_input(self, data, events):
+    def _deliver_frame(self, frame):
         """
-        _process_input:
+        _deliver_frame: APIFrame -> None
 
-        _process_input will be notified when there is data ready on the
-        serial connection to be read.  It will read and process the data
-        into an API Frame and then either resolve a frame future, or push
-        the frame into the queue of frames needing to be processed
+        Resolves the future of the longest waiting call which wants the
+        given frame, or queues the frame if none does
         """
-        frame = APIFrame(escaped=self._escaped)
-
-        byte = self.serial.read()
-
-        if byte != APIFrame.START_BYTE:
+        name = self._frame_name(frame)
+        for waiter in list(self._frame_waiters):
+            future, frame_type = waiter
+            if future.done():
+                # Cancelled
+                self._frame_waiters.remove(waiter)
+                continue
+
+            if frame_type is not None and name not in frame_type:
+                continue
+
+            self._frame_waiters.remove(waiter)
+            future.set_result(frame)
             return
 
-        # Save all following bytes, if they are not empty
-        if len(byte) == 1:
-            frame.fill(byte)
-
-        while(frame.remaining_bytes() > 0):
-            byte = self.serial.read()
+        self.receive_queue.put(frame, name, wait=False)
 
-            if len(byte) == 1:
-                frame.fill(byte)
+    def _process_input(self, data, events):
+        """
+        _process_input:
 
+        _process_input will be notified when there is data ready on the
+        serial connection to be read.  It will read all of the available
+        data and decode every API frame it completes, then either resolve
+        the future of a call waiting for it, or push each frame into the
+        queue of frames needing to be processed. It never waits for more
+        data: the bytes of an incomplete frame are kept until the next
+        notification.
+
+        Once the queue is full under the 'block' queue policy, the serial
+        port is no longer watched until a frame is taken from it or a
+        call waits for one.
+        """
         try:
-            # Try to parse and return result
-            frame.parse()
-
-            # Ignore empty frames
-            if len(frame.data) == 0:
+            data = self._read_available()
+        except Exception as e:
+            if self._error_callback:
+                self._error_callback(e)
                 return
+            raise
 
-            if self._frame_future is not None:
-                self._frame_future.set_result(frame)
-                self._frame_future = None
-            else:
-                self._frame_queue.append(frame)
-        except ValueError:
-            return
+        for frame in self._decoder.feed(data):
+            self._deliver_frame(frame)
+
+        self._update_reading()
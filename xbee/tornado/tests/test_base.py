@@ -81,6 +81,67 @@ class TestReadFromDevice(AsyncTestCase):
         frame = yield xbee._get_frame()
         self.assertEqual(frame.data, b'\x7E\x7D\x11\x13')
 
+    @gen_test
+    def test_read_multiple_frames_at_once(self):
+        """
+        _process_input should read every waiting byte with one call and
+        queue each frame decoded from them
+        """
+        device = Serial()
+        device.set_read_data(b'\x7E\x00\x01\x00\xFF' +
+                             b'\x7E\x00\x01\x05\xFA')
+        device.read = Mock(side_effect=device.read)
+        xbee = XBeeBase(device, io_loop=self._patch_io)
+
+        xbee._process_input(None, None)
+        first = yield xbee._get_frame()
+        second = yield xbee._get_frame()
+        self.assertEqual(first.data, b'\x00')
+        self.assertEqual(second.data, b'\x05')
+        device.read.assert_called_once_with(10)
+
+    @gen_test
+    def test_read_frame_split_across_notifications(self):
+        """
+        _process_input should return without waiting for the rest of a
+        frame, and deliver it once a later notification completes it
+        """
+        device = Serial()
+        device.set_read_data(b'\x7E\x00\x02')
+        xbee = XBeeBase(device, io_loop=self._patch_io)
+        self.assertEqual(device.timeout, 0)
+
+        xbee._process_input(None, None)
+        self.assertEqual(len(xbee.receive_queue), 0)
+
+        # A notification with nothing to read must not block either
+        xbee._process_input(None, None)
+        self.assertEqual(len(xbee.receive_queue), 0)
+
+        device.set_read_data(b'\x01\x02\xFC' + b'\x7E\x00\x01')
+        xbee._process_input(None, None)
+        device.set_read_data(b'\x05\xFA')
+        xbee._process_input(None, None)
+
+        first = yield xbee._get_frame()
+        second = yield xbee._get_frame()
+        self.assertEqual(first.data, b'\x01\x02')
+        self.assertEqual(second.data, b'\x05')
+
+    def test_read_error(self):
+        """
+        An error reading the port should be given to the error callback
+        """
+        device = Serial()
+        device.read = Mock(side_effect=IOError('port closed'))
+        errors = []
+        xbee = XBeeBase(device, io_loop=self._patch_io,
+                        error_callback=errors.append)
+
+        xbee._process_input(None, None)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], IOError)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -748,7 +748,9 @@ class TestReadFromDevice(InitXBee):
         xbee = XBee(badDevice, io_loop=self._patch_io)
 
         try:
-            xbee._process_input(None, None)
+            # The IOLoop calls the handler for as long as data is waiting
+            while badDevice._read_data:
+                xbee._process_input(None, None)
             yield xbee.wait_read_frame()
         except Exception:
             exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -16,7 +16,10 @@ from xbee.tornado import has_tornado
 if not has_tornado:
     raise unittest.SkipTest("Requires Tornado")
 
-from tornado import ioloop  # noqa
+from tornado import ioloop, gen  # noqa
+from tornado.testing import AsyncTestCase, gen_test  # noqa
+from xbee.frame import APIFrame  # noqa
+from xbee.backend.base import TimeoutException, HaltedException  # noqa
 from xbee.tornado.zigbee import ZigBee  # noqa
 from xbee.tests.Fake import Serial  # noqa
 
@@ -238,6 +241,240 @@ class TestZigBee(unittest.TestCase):
             self.assertEqual(info, expected_info)
 
 
+class TestAwaitResponse(AsyncTestCase):
+    """
+    send(..., await_response=True) must return a future resolved by the
+    response carrying the frame id it was sent with
+    """
+
+    def setUp(self):
+        super(TestAwaitResponse, self).setUp()
+        self.io_loop.add_handler = Mock()
+        self.device = Serial()
+        self.zigbee = ZigBee(self.device, io_loop=self.io_loop)
+
+    @gen_test
+    def test_response_resolves_future(self):
+        """
+        The matching response should resolve the future
+        """
+        future = self.zigbee.at(command=b'MY', await_response=True)
+        self.assertEqual(self.device.get_data_written(),
+                         b'~\x00\x04\x08\x01MYP')
+
+        self.device.set_read_data(
+            APIFrame(b'\x88\x01MY\x00\x12\x34').output())
+        self.zigbee._process_input(None, None)
+        info = yield self.zigbee.wait_read_frame()
+
+        response = yield future
+        self.assertEqual(response, info)
+        self.assertEqual(response['parameter'], b'\x12\x34')
+
+    @gen_test
+    def test_response_timeout(self):
+        """
+        The future should fail with a TimeoutException if no response
+        arrives in time, releasing its frame id
+        """
+        future = self.zigbee.at(command=b'MY', await_response=True,
+                                response_timeout=0.01)
+
+        with self.assertRaises(TimeoutException):
+            yield future
+        self.assertEqual(len(self.zigbee._pending), 0)
+
+    @gen_test
+    def test_halt(self):
+        """
+        Requests awaiting a response should fail when halted
+        """
+        self.io_loop.remove_handler = Mock()
+        future = self.zigbee.at(command=b'MY', await_response=True)
+        self.zigbee.halt()
+
+        with self.assertRaises(HaltedException):
+            yield future
+        self.assertEqual(len(self.zigbee._pending), 0)
+
+    @gen_test
+    def test_remote_at_batch(self):
+        """
+        remote_at_batch() should keep a window of requests in flight and
+        resolve with every response in request order
+        """
+        written = []
+        self.device.write = written.append
+        addr = b'\x00\x13\xa2\x00@oG\xe4'
+        batch = self.zigbee.remote_at_batch(
+            [(addr, b'NI'), (addr, b'DB'), (addr, b'D0')], window=2)
+        self.assertEqual(len(written), 2)
+
+        for frame_id, command in ((b'\x01', b'NI'), (b'\x02', b'DB'),
+                                  (b'\x03', b'D0')):
+            self.device.set_read_data(APIFrame(
+                b'\x97' + frame_id + b'\x00\x13\xa2\x00@oG\xe4v\x1a' +
+                command + b'\x00').output())
+            self.zigbee._process_input(None, None)
+            yield self.zigbee.wait_read_frame()
+            # Let the IOLoop run the callback which sends the next request
+            yield gen.moment
+
+        results = yield batch
+        self.assertEqual(len(written), 3)
+        self.assertEqual([info['command'] for info in results],
+                         [b'NI', b'DB', b'D0'])
+
+
+class TestConcurrentWaiters(AsyncTestCase):
+    """
+    Any number of coroutines may wait for frames at once, each receiving
+    its own
+    """
+
+    RX = b'\x90\x00\x13\xa2\x00@oG\xe4\x12\x34\x01hi'
+    TX_STATUS = b'\x8b\x01\xff\xfe\x00\x00\x00'
+
+    def setUp(self):
+        super(TestConcurrentWaiters, self).setUp()
+        self.io_loop.add_handler = Mock()
+        self.io_loop.remove_handler = Mock()
+        self.device = Serial()
+        self.zigbee = ZigBee(self.device, io_loop=self.io_loop)
+
+    def receive(self, *frames):
+        self.device.set_read_data(
+            b''.join(APIFrame(data).output() for data in frames))
+        self.zigbee._process_input(None, None)
+
+    @gen_test
+    def test_waiters_served_in_order(self):
+        """
+        Frames should be given to waiting coroutines in the order they
+        began waiting
+        """
+        first = self.zigbee.wait_read_frame()
+        second = self.zigbee.wait_read_frame()
+
+        self.receive(self.TX_STATUS, self.RX)
+        self.assertEqual((yield first)['id'], 'tx_status')
+        self.assertEqual((yield second)['id'], 'rx')
+
+    @gen_test
+    def test_frame_type(self):
+        """
+        A waiter should only be given frames of the types it asked for,
+        whether they arrive later or were already queued
+        """
+        status = self.zigbee.wait_read_frame(frame_type='tx_status')
+        received = self.zigbee.wait_read_frame(frame_type=('rx',
+                                                           'rx_explicit'))
+
+        self.receive(self.RX, self.TX_STATUS, self.RX)
+        self.assertEqual((yield received)['id'], 'rx')
+        self.assertEqual((yield status)['id'], 'tx_status')
+        self.assertEqual(len(self.zigbee.receive_queue), 1)
+
+        queued = yield self.zigbee.wait_read_frame(frame_type='rx')
+        self.assertEqual(queued['rf_data'], b'hi')
+
+    @gen_test
+    def test_timeout_removes_waiter(self):
+        """
+        A waiter which times out should not be given a later frame
+        """
+        with self.assertRaises(TimeoutException):
+            yield self.zigbee.wait_read_frame(timeout=0.01)
+        self.assertEqual(len(self.zigbee._frame_waiters), 0)
+
+        waiting = self.zigbee.wait_read_frame()
+        self.receive(self.RX)
+        self.assertEqual((yield waiting)['id'], 'rx')
+
+    @gen_test
+    def test_halt_resolves_waiters(self):
+        first = self.zigbee.wait_read_frame()
+        second = self.zigbee.wait_read_frame(frame_type='rx')
+
+        self.zigbee.halt()
+        self.assertIsNone((yield first))
+        self.assertIsNone((yield second))
+        self.assertEqual(len(self.zigbee._frame_waiters), 0)
+
+
+class TestReceiveQueue(AsyncTestCase):
+    """
+    Frames nobody is waiting for must be held in a bounded queue
+    """
+
+    RX_IO = (b'\x92\x00\x13\xa2\x00@oG\xe4\x12\x34\x01' +
+             b'\x01\x00\x00\x01\x02\x00')
+    TX_STATUS = b'\x8b\x01\xff\xfe\x00\x00\x00'
+
+    def setUp(self):
+        super(TestReceiveQueue, self).setUp()
+        self.io_loop.add_handler = Mock()
+        self.io_loop.remove_handler = Mock()
+        self.device = Serial()
+
+    def receive(self, zigbee, *frames):
+        self.device.set_read_data(
+            b''.join(APIFrame(data).output() for data in frames))
+        zigbee._process_input(None, None)
+
+    @gen_test
+    def test_block_stops_reading(self):
+        """
+        Under the 'block' policy, the port should not be watched while
+        the queue is full
+        """
+        zigbee = ZigBee(self.device, io_loop=self.io_loop, queue_size=2)
+        self.receive(zigbee, self.TX_STATUS, self.TX_STATUS)
+        self.io_loop.remove_handler.assert_called_once_with(self.device.fd)
+
+        yield zigbee.wait_read_frame()
+        self.assertEqual(self.io_loop.add_handler.call_count, 2)
+        self.assertEqual(zigbee.receive_queue.dropped, 0)
+
+    @gen_test
+    def test_block_reads_for_filtered_waiter(self):
+        """
+        A call waiting for a frame type which is not queued should keep
+        the port watched while the queue is full
+        """
+        zigbee = ZigBee(self.device, io_loop=self.io_loop, queue_size=1)
+        self.receive(zigbee, self.RX_IO)
+        self.io_loop.remove_handler.assert_called_once_with(self.device.fd)
+
+        waiting = zigbee.wait_read_frame(frame_type='tx_status')
+        self.assertEqual(self.io_loop.add_handler.call_count, 2)
+
+        self.receive(zigbee, self.TX_STATUS)
+        self.assertEqual((yield waiting)['id'], 'tx_status')
+
+        # Nobody waits any more, so reading stops again
+        self.assertEqual(self.io_loop.remove_handler.call_count, 2)
+        self.assertEqual(len(zigbee.receive_queue), 1)
+
+    @gen_test
+    def test_shed(self):
+        """
+        Under the 'shed' policy, the named frame types should be dropped
+        and counted
+        """
+        zigbee = ZigBee(self.device, io_loop=self.io_loop, queue_size=2,
+                        queue_policy='shed',
+                        shed_types=['rx_io_data_long_addr'])
+        self.receive(zigbee, self.RX_IO, self.TX_STATUS, self.RX_IO,
+                     self.TX_STATUS)
+
+        self.assertEqual(zigbee.receive_queue.dropped_types,
+                         {'rx_io_data_long_addr': 2})
+        self.assertEqual((yield zigbee.wait_read_frame())['id'], 'tx_status')
+        self.assertEqual((yield zigbee.wait_read_frame())['id'], 'tx_status')
+        self.io_loop.remove_handler.assert_not_called()
+
+
 class TestParseZigBeeIOData(unittest.TestCase):
     """
     Test parsing ZigBee specific IO data